@@ -0,0 +1,63 @@
+"""interest segment indexes
+
+Revision ID: 3f1a9c2e7b40
+Revises: 
+Create Date: 2026-10-19 09:00:00
+
+为兴趣分群查询添加索引：
+- ix_user_interests_tenant_user   (tenant_id, user_id)，键集分页
+- ix_user_interests_segment       (tenant_id, primary_category, preferred_format, schema_version, user_id)，过滤与仅索引计数
+- ix_user_interests_data_path     GIN (interest_data jsonb_path_ops)，@> 包含查询，仅PostgreSQL
+PostgreSQL上使用 CREATE INDEX CONCURRENTLY，不阻塞写入
+
+这是第一个迁移，但不创建基础表：user_core / user_profile / user_interests / user_app_usage
+由应用启动时的 Base.metadata.create_all 创建（迁移之前的部署方式），本迁移要求这些表已存在
+- 已有数据库（由早期版本建表）：直接执行 alembic upgrade head
+- 新数据库：先以当前模型建表（开发环境启动应用即可），再执行 alembic stamp head 标记为最新版本
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2e7b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+SEGMENT_COLUMNS = ["tenant_id", "primary_category", "preferred_format", "schema_version", "user_id"]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index("ix_user_interests_tenant_user", "user_interests", ["tenant_id", "user_id"], if_not_exists=True)
+        op.create_index("ix_user_interests_segment", "user_interests", SEGMENT_COLUMNS, if_not_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_user_interests_tenant_user", "user_interests", ["tenant_id", "user_id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_user_interests_segment", "user_interests", SEGMENT_COLUMNS,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_user_interests_data_path", "user_interests", ["interest_data"],
+            postgresql_using="gin",
+            postgresql_ops={"interest_data": "jsonb_path_ops"},
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        # 更新可见性映射与统计信息，计数查询才能走仅索引扫描
+        op.execute("VACUUM (ANALYZE) user_interests")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index("ix_user_interests_segment", table_name="user_interests", if_exists=True)
+        op.drop_index("ix_user_interests_tenant_user", table_name="user_interests", if_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        for name in ("ix_user_interests_data_path", "ix_user_interests_segment", "ix_user_interests_tenant_user"):
+            op.drop_index(name, table_name="user_interests", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,50 @@
+"""user listing indexes
+
+Revision ID: 8b2d4e6f1a93
+Revises: 3f1a9c2e7b40
+Create Date: 2026-10-19 10:00:00
+
+为管理端用户列表添加索引：
+- ix_user_core_tenant_register      (tenant_id, register_time, user_id)，键集分页
+- ix_user_core_tenant_email_prefix  (tenant_id, email text_pattern_ops)，邮箱前缀搜索，仅PostgreSQL
+- ix_user_core_tenant_phone_prefix  (tenant_id, phone text_pattern_ops)，手机号前缀搜索，仅PostgreSQL
+PostgreSQL上使用 CREATE INDEX CONCURRENTLY，不阻塞写入
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4e6f1a93'
+down_revision = '3f1a9c2e7b40'
+branch_labels = None
+depends_on = None
+
+REGISTER_COLUMNS = ["tenant_id", "register_time", "user_id"]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        op.create_index("ix_user_core_tenant_register", "user_core", REGISTER_COLUMNS, if_not_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_user_core_tenant_register", "user_core", REGISTER_COLUMNS,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        for column in ("email", "phone"):
+            op.create_index(
+                f"ix_user_core_tenant_{column}_prefix", "user_core", ["tenant_id", column],
+                postgresql_ops={column: "text_pattern_ops"},
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index("ix_user_core_tenant_register", table_name="user_core", if_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        for name in ("ix_user_core_tenant_phone_prefix", "ix_user_core_tenant_email_prefix", "ix_user_core_tenant_register"):
+            op.drop_index(name, table_name="user_core", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,42 @@
+"""tenant registry
+
+Revision ID: c47e19a05d2b
+Revises: 8b2d4e6f1a93
+Create Date: 2026-10-19 11:00:00
+
+新增 tenant 表（租户注册表，位于默认库）
+登记租户请使用管理接口 PUT /api/admin/tenants/{tenant_id}，首次登记时统计已有用户数
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e19a05d2b'
+down_revision = '8b2d4e6f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "tenant",
+        sa.Column("tenant_id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("allowed_providers", sa.JSON().with_variant(postgresql.JSONB(), "postgresql"), nullable=True),
+        sa.Column("access_token_expire_minutes", sa.Integer(), nullable=True),
+        sa.Column("login_rate_per_minute", sa.Integer(), nullable=True),
+        sa.Column("max_users", sa.Integer(), nullable=True),
+        sa.Column("cache_ttl_seconds", sa.Integer(), nullable=True),
+        sa.Column("user_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("tenant_id"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("tenant", if_exists=True)
@@ -0,0 +1,109 @@
+"""user identity
+
+Revision ID: 5d8e2a7c1f36
+Revises: c47e19a05d2b
+Create Date: 2026-10-19 12:00:00
+
+新增 user_identity 表（一个用户可绑定多个第三方登录身份），
+唯一索引 (tenant_id, provider, provider_user_id) 用于登录身份解析
+
+回填：由 user_core.provider_user_id / register_channel 生成每个用户的注册身份，
+按 user_id 键集分块写入，每块单独提交，避免长事务；回填的 identity_id 直接使用 user_id。
+历史上通过邮箱/手机号绑定时被覆盖的 provider_user_id 无法还原渠道，这部分身份在用户下次登录时重新绑定。
+分片部署需对每个分片库分别执行
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e2a7c1f36'
+down_revision = 'c47e19a05d2b'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 5000
+
+user_core = sa.table(
+    "user_core",
+    sa.column("user_id", sa.String),
+    sa.column("tenant_id", sa.String),
+    sa.column("register_channel", sa.String),
+    sa.column("provider_user_id", sa.String),
+    sa.column("provider_data", sa.JSON),
+    sa.column("register_time", sa.DateTime),
+)
+
+IDENTITY_COLUMNS = ["identity_id", "tenant_id", "provider", "provider_user_id", "user_id", "provider_data", "created_at"]
+
+
+def _backfill_insert(dialect_name: str, user_ids=None):
+    """INSERT ... SELECT 生成注册身份，已存在的身份跳过"""
+    # register_channel 以枚举名存储（如 WECHAT），转为小写即为认证提供商名
+    query = sa.select(
+        user_core.c.user_id,
+        user_core.c.tenant_id,
+        sa.func.lower(sa.cast(user_core.c.register_channel, sa.String)),
+        user_core.c.provider_user_id,
+        user_core.c.user_id,
+        user_core.c.provider_data,
+        user_core.c.register_time,
+    ).where(user_core.c.provider_user_id.isnot(None))
+    if user_ids is not None:
+        query = query.where(user_core.c.user_id.in_(user_ids))
+
+    identity = sa.table("user_identity", *[sa.column(name) for name in IDENTITY_COLUMNS])
+    if dialect_name == "postgresql":
+        return postgresql.insert(identity).from_select(IDENTITY_COLUMNS, query).on_conflict_do_nothing()
+    if dialect_name == "sqlite":
+        return sqlite.insert(identity).from_select(IDENTITY_COLUMNS, query).on_conflict_do_nothing()
+    return sa.insert(identity).from_select(IDENTITY_COLUMNS, query)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_identity",
+        sa.Column("identity_id", sa.String(), nullable=False),
+        sa.Column("tenant_id", sa.String(), nullable=False),
+        sa.Column("provider", sa.String(), nullable=False),
+        sa.Column("provider_user_id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("provider_data", sa.JSON().with_variant(postgresql.JSONB(), "postgresql"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user_core.user_id"]),
+        sa.PrimaryKeyConstraint("identity_id"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ux_user_identity_provider", "user_identity",
+        ["tenant_id", "provider", "provider_user_id"], unique=True, if_not_exists=True
+    )
+    op.create_index("ix_user_identity_user_id", "user_identity", ["user_id"], if_not_exists=True)
+
+    dialect_name = op.get_context().dialect.name
+    if context.is_offline_mode():
+        # 离线生成SQL时无法分块，输出一条整体回填语句
+        op.execute(_backfill_insert(dialect_name))
+        return
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        last_user_id = ""
+        while True:
+            user_ids = conn.execute(
+                sa.select(user_core.c.user_id)
+                .where(user_core.c.provider_user_id.isnot(None), user_core.c.user_id > last_user_id)
+                .order_by(user_core.c.user_id)
+                .limit(BACKFILL_CHUNK_SIZE)
+            ).scalars().all()
+            if not user_ids:
+                break
+            conn.execute(_backfill_insert(dialect_name, user_ids))
+            last_user_id = user_ids[-1]
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_identity_user_id", table_name="user_identity", if_exists=True)
+    op.drop_index("ux_user_identity_provider", table_name="user_identity", if_exists=True)
+    op.drop_table("user_identity", if_exists=True)
@@ -0,0 +1,59 @@
+"""account purge
+
+Revision ID: 9a4c6b2d8e17
+Revises: 5d8e2a7c1f36
+Create Date: 2026-10-19 13:00:00
+
+注销数据清理：
+- user_core.deleted_at                 注销时间；已是 deleted 状态的用户记为迁移时间，保留期从此开始计算
+- ix_user_core_status_deleted          (status, deleted_at, user_id)，清理任务按注销时间键集扫描
+- ix_user_app_usage_user_id            (user_id)，按用户分批删除会话
+PostgreSQL上使用 CREATE INDEX CONCURRENTLY，不阻塞写入；分片部署需对每个分片库分别执行
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c6b2d8e17'
+down_revision = '5d8e2a7c1f36'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_user_core_status_deleted", "user_core", ["status", "deleted_at", "user_id"]),
+    ("ix_user_app_usage_user_id", "user_app_usage", ["user_id"]),
+]
+
+
+def upgrade() -> None:
+    op.add_column("user_core", sa.Column("deleted_at", sa.DateTime(), nullable=True))
+    user_core = sa.table("user_core", sa.column("status", sa.String), sa.column("deleted_at", sa.DateTime))
+    # 状态列以枚举名存储
+    op.execute(
+        user_core.update()
+        .where(sa.cast(user_core.c.status, sa.String) == "DELETED", user_core.c.deleted_at.is_(None))
+        .values(deleted_at=datetime.utcnow())
+    )
+
+    if op.get_context().dialect.name != "postgresql":
+        for name, table_name, columns in INDEXES:
+            op.create_index(name, table_name, columns, if_not_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, table_name, columns in INDEXES:
+            op.create_index(name, table_name, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        for name, table_name, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table_name, if_exists=True)
+    else:
+        with op.get_context().autocommit_block():
+            for name, table_name, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table_name, postgresql_concurrently=True, if_exists=True)
+    op.drop_column("user_core", "deleted_at")
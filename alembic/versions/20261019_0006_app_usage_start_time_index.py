@@ -0,0 +1,44 @@
+"""app usage start time index
+
+Revision ID: 2e7f9b3c5a61
+Revises: 9a4c6b2d8e17
+Create Date: 2026-10-19 14:00:00
+
+App使用记录归档按会话开始时间扫描：
+- ix_user_app_usage_session_start_time  (session_start_time)
+PostgreSQL上使用 CREATE INDEX CONCURRENTLY，不阻塞写入；分片部署需对每个分片库分别执行
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2e7f9b3c5a61'
+down_revision = '9a4c6b2d8e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        op.create_index(
+            "ix_user_app_usage_session_start_time", "user_app_usage", ["session_start_time"], if_not_exists=True
+        )
+        return
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_user_app_usage_session_start_time", "user_app_usage", ["session_start_time"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != "postgresql":
+        op.drop_index("ix_user_app_usage_session_start_time", table_name="user_app_usage", if_exists=True)
+        return
+
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_user_app_usage_session_start_time", table_name="user_app_usage",
+            postgresql_concurrently=True, if_exists=True
+        )
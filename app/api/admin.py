@@ -0,0 +1,104 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..core.database import get_db
+from ..core.revocation import get_revocation_cache
+from ..core.security import require_admin
+from ..core.serialization import dumps
+from ..core.sharding import tenant_session
+from ..models import user as user_model
+from ..services import tenant_service, usage_archive, user_directory
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/users", response_model=user_model.UserListResponse, response_model_exclude_unset=True)
+def list_users(
+    tenant_id: str = Query(..., description="租户标识"),
+    status: Optional[user_model.UserStatus] = None,
+    register_channel: Optional[user_model.RegisterChannel] = None,
+    product_id: Optional[str] = None,
+    registered_from: Optional[datetime] = Query(None, description="注册时间下限（含）"),
+    registered_to: Optional[datetime] = Query(None, description="注册时间上限（不含）"),
+    email_prefix: Optional[str] = Query(None, min_length=1),
+    phone_prefix: Optional[str] = Query(None, min_length=1),
+    limit: int = Query(50, ge=1, le=settings.admin_user_list_max_page_size),
+    cursor: Optional[str] = Query(None, description="上一页返回的next_cursor"),
+    with_total: bool = Query(False, description="是否返回估算总数")
+):
+    """
+    按租户列出用户（注册时间倒序）
+
+    - 键集分页，翻页耗时与页码无关
+    - email_prefix / phone_prefix 为前缀匹配
+    - with_total=true 时返回估算总数（PostgreSQL取执行计划估算，不执行COUNT）
+    """
+    filters = user_model.UserListFilter(
+        status=status,
+        register_channel=register_channel,
+        product_id=product_id,
+        registered_from=registered_from,
+        registered_to=registered_to,
+        email_prefix=email_prefix,
+        phone_prefix=phone_prefix,
+    )
+    with tenant_session(tenant_id) as db:
+        try:
+            items, next_cursor = user_directory.list_users(db, tenant_id, filters, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        response = {"items": items, "next_cursor": next_cursor}
+        if with_total:
+            response["total_estimate"] = user_directory.estimate_total(db, tenant_id, filters)
+        return response
+
+
+@router.post("/users/{user_id}/revoke_tokens", response_model=user_model.TokenRevocationResponse)
+def revoke_user_tokens(user_id: str):
+    """吊销用户此前签发的全部令牌（冻结、账号泄露时使用），各进程通过广播即时生效"""
+    try:
+        watermark = get_revocation_cache().revoke_user(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Revocation unavailable: {e}")
+    return {"user_id": user_id, "revoked_before": datetime.utcfromtimestamp(watermark)}
+
+
+@router.get("/tenants", response_model=List[user_model.TenantResponse])
+def list_tenants(db: Session = Depends(get_db)):
+    """已登记的租户及当前用户数"""
+    return tenant_service.list_tenants(db)
+
+
+@router.get("/tenants/{tenant_id}", response_model=user_model.TenantResponse)
+def get_tenant(tenant_id: str, db: Session = Depends(get_db)):
+    tenant = tenant_service.get_tenant(db, tenant_id)
+    if tenant is None:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return tenant
+
+
+@router.put("/tenants/{tenant_id}", response_model=user_model.TenantResponse)
+def save_tenant(tenant_id: str, tenant_settings: user_model.TenantSettings, db: Session = Depends(get_db)):
+    """
+    登记或更新租户配置（整体替换，未提供的字段恢复为全局配置）
+
+    - 首次登记时统计一次已有用户数，之后由注册与删除增量维护
+    - 各进程在 tenant_registry_poll_seconds 内生效
+    """
+    return tenant_service.save_tenant(db, tenant_id, tenant_settings)
+
+
+@router.get("/app_usage/archive")
+def read_archived_app_usage(
+    tenant_id: str = Query(..., description="租户标识"),
+    user_id: Optional[str] = None,
+    start: Optional[date] = Query(None, description="会话开始日期下限（含，UTC）"),
+    end: Optional[date] = Query(None, description="会话开始日期上限（含，UTC）")
+):
+    """流式读取已归档的App使用记录（NDJSON，每行一条会话；归档位于执行归档任务的主机磁盘）"""
+    records = usage_archive.iter_archived_sessions(tenant_id, user_id, start, end)
+    return StreamingResponse((dumps(record) + b"\n" for record in records), media_type="application/x-ndjson")
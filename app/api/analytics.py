@@ -0,0 +1,72 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from ..core.config import settings
+from ..core.security import require_admin
+from ..models import user as user_model
+from ..services import analytics
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+def _resolve_providers(provider: Optional[List[str]]) -> List[str]:
+    """校验渠道参数，未指定时统计全部渠道"""
+    if not provider:
+        return analytics.ALL_PROVIDERS
+    unknown = sorted(set(provider) - set(analytics.ALL_PROVIDERS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown provider: {', '.join(unknown)}")
+    return provider
+
+
+@router.get("/active", response_model=user_model.ActiveUsersResponse)
+def active_users(
+    tenant_id: str = Query("default"),
+    start: Optional[date] = Query(None, description="开始日期（UTC），默认与结束日期相同"),
+    end: Optional[date] = Query(None, description="结束日期（UTC），默认今天"),
+    provider: Optional[List[str]] = Query(None, description="认证渠道，可重复，默认全部")
+):
+    """
+    区间去重活跃用户数与登录/注册次数
+
+    - 对区间内所有日期的HyperLogLog键执行一次PFCOUNT，耗时只与天数相关
+    - 区间不能超过统计保留天数
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days + 1 > settings.analytics_retention_days:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range exceeds {settings.analytics_retention_days} days"
+        )
+    providers = _resolve_providers(provider)
+    try:
+        active = analytics.count_active_users(tenant_id, start, end, providers)
+        events = analytics.count_events(tenant_id, start, end)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Analytics unavailable: {e}")
+    return {
+        "tenant_id": tenant_id,
+        "start": start,
+        "end": end,
+        "providers": providers,
+        "active_users": active,
+        **events,
+    }
+
+
+@router.get("/summary", response_model=user_model.AnalyticsSummaryResponse)
+def activity_summary(
+    tenant_id: str = Query("default"),
+    day: Optional[date] = Query(None, alias="date", description="统计日期（UTC），默认今天"),
+    provider: Optional[List[str]] = Query(None, description="认证渠道，可重复，默认全部")
+):
+    """指定日期的 DAU / WAU / MAU 及当天登录、注册次数"""
+    providers = _resolve_providers(provider)
+    try:
+        return analytics.summary(tenant_id, day or datetime.utcnow().date(), providers)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Analytics unavailable: {e}")
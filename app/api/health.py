@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from datetime import datetime
 from typing import Dict, Any
 
-from ..core.database import get_db
+from ..core.database import get_db, replica_router
 from ..core.cache import get_cache, CacheService
 from ..core.config import settings
+from ..core.metrics import render_metrics
+from ..core import lifecycle
+from ..core.admission import get_admission_controller
 
 router = APIRouter()
 
@@ -26,7 +29,7 @@ def health_check(
         "checks": {}
     }
     
-    # 数据库健康检查
+    # 主库健康检查（副本在下方单独报告）
     try:
         db.execute(text("SELECT 1"))
         health_status["checks"]["database"] = {
@@ -40,6 +43,17 @@ def health_check(
         }
         health_status["status"] = "unhealthy"
     
+    # 只读副本检查（副本不可用时读请求回退主库，服务降级但可用）
+    if replica_router.engines:
+        replicas = replica_router.status()
+        lagging = [r for r in replicas if r["lag_seconds"] is None or r["lag_seconds"] > settings.replica_max_lag_seconds]
+        health_status["checks"]["replicas"] = {
+            "status": "degraded" if lagging else "healthy",
+            "replicas": replicas
+        }
+        if lagging and health_status["status"] == "healthy":
+            health_status["status"] = "degraded"
+    
     # Redis缓存健康检查
     try:
         if cache.health_check():
@@ -70,7 +84,13 @@ def health_check(
 def readiness_check(db: Session = Depends(get_db)) -> Dict[str, str]:
     """
     就绪检查 - 用于K8s readiness probe
+    连接预热完成前、以及收到关闭信号后返回503
     """
+    if not lifecycle.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail={"status": "not ready", "reason": "warming up"}
+        )
     try:
         db.execute(text("SELECT 1"))
         return {"status": "ready"}
@@ -104,6 +124,7 @@ def get_metrics(db: Session = Depends(get_db)) -> Dict[str, Any]:
                 "checked_out": pool.checkedout(),
                 "overflow": pool.overflow()
             },
+            "admission": get_admission_controller().snapshot(),
             "service": {
                 "version": settings.app_version,
                 "environment": settings.environment
@@ -116,3 +137,11 @@ def get_metrics(db: Session = Depends(get_db)) -> Dict[str, Any]:
             status_code=500,
             detail={"error": "Failed to collect metrics", "message": str(e)}
         )
+
+@router.get("/metrics/prometheus")
+def get_prometheus_metrics() -> Response:
+    """
+    Prometheus格式指标接口（请求延迟、认证提供商、数据库、缓存、连接池）
+    """
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
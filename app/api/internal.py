@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..core.config import settings
+from ..core.security import require_internal
+from ..core.sharding import tenant_session
+from ..models import user as user_model
+from ..services import user_service
+
+router = APIRouter(dependencies=[Depends(require_internal)])
+
+
+@router.post("/users/batch", response_model=user_model.UserCardBatchResponse)
+def batch_user_cards(request: user_model.UserCardBatchRequest):
+    """
+    批量获取用户昵称与头像（供信息流、排行榜等内部服务使用）
+
+    - 结果顺序与请求的user_ids一致，不存在或已删除的用户 found=false
+    - 缓存命中部分一次MGET，未命中部分一次IN查询
+    """
+    if len(request.user_ids) > settings.user_batch_max_ids:
+        raise HTTPException(status_code=400, detail=f"At most {settings.user_batch_max_ids} user_ids per request")
+    with tenant_session(request.tenant_id) as db:
+        cards = user_service.get_user_cards(db, request.user_ids, request.tenant_id)
+    return {"items": [
+        {"user_id": user_id, "found": card is not None, **(card or {})}
+        for user_id, card in zip(request.user_ids, cards)
+    ]}
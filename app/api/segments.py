@@ -0,0 +1,59 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from ..core.config import settings
+from ..core.security import require_admin
+from ..core.sharding import tenant_session
+from ..models import user as user_model
+from ..services import segments
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.post("/query", response_model=user_model.SegmentPageResponse)
+def query_segment(
+    query: user_model.SegmentQuery,
+    limit: int = Query(100, ge=1, le=settings.segment_max_page_size),
+    cursor: Optional[str] = Query(None, description="上一页返回的next_cursor")
+):
+    """
+    按兴趣条件分页查询租户内用户
+
+    - 键集分页，翻页耗时与页码无关
+    - interest_contains 为JSON包含条件，如 {"topics": ["ai"]}
+    """
+    with tenant_session(query.tenant_id) as db:
+        try:
+            items, next_cursor = segments.query_segment(db, query, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"items": items, "next_cursor": next_cursor}
+
+
+@router.post("/count", response_model=user_model.SegmentCountResponse)
+def count_segment(query: user_model.SegmentQuery):
+    """统计分群人数（不返回成员）"""
+    with tenant_session(query.tenant_id) as db:
+        try:
+            return {"tenant_id": query.tenant_id, "count": segments.count_segment(db, query)}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/export")
+def export_segment(query: user_model.SegmentQuery):
+    """流式导出分群成员（NDJSON，每行一个用户）"""
+    stream = segments.stream_segment(query, settings.segment_stream_batch_size)
+    try:
+        # 先取第一行，条件错误时返回400而不是中断的200响应
+        first = next(stream, "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def body():
+        if first:
+            yield first
+            yield from stream
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session, joinedload
 from ..services import user_service
 from ..services.auth_service import get_auth_service
 from ..models import user as user_model
-from ..core.database import get_db
-from ..core.security import get_current_user
+from ..core.database import get_read_db, mark_primary_write
+from ..core.config import settings
+from ..core.revocation import get_revocation_cache
+from ..core.serialization import FastJSONResponse, RowSerializer
+from ..core.sharding import get_tenant_db, tenant_session
+from ..core.tenants import TenantQuotaExceeded, get_tenant_registry
+from ..core.security import authenticate, get_current_user, get_current_reader, oauth2_scheme
 
 router = APIRouter()
 
+# fast_serialization 开启时热点接口直接编码，跳过响应模型校验
+_core_row = RowSerializer(user_model.UserCoreResponse)
+
 @router.post("/login", response_model=user_model.UserLoginResponse)
-def login_or_register(request: user_model.UserLoginRequest, db: Session = Depends(get_db)):
+def login_or_register(request: user_model.UserLoginRequest):
     """
     根据设备ID处理用户登录或注册（支持租户隔离）
 
@@ -18,19 +27,28 @@ def login_or_register(request: user_model.UserLoginRequest, db: Session = Depend
     - 无论哪种情况，都会签发一个新的 JWT 令牌。
     - 支持多租户和产品隔离
     """
-    try:
-        response = user_service.login_or_register_user(
-            db=db, 
-            device_id=request.device_id,
-            tenant_id=request.tenant_id,
-            product_id=request.product_id
-        )
-        return response
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    get_tenant_registry().check_login(request.tenant_id, user_model.RegisterChannel.DEVICE_ID.value)
+    with tenant_session(request.tenant_id) as db:
+        try:
+            response = user_service.login_or_register_user(
+                db=db, 
+                device_id=request.device_id,
+                tenant_id=request.tenant_id,
+                product_id=request.product_id
+            )
+            mark_primary_write(response.user_id, request.tenant_id)
+            if settings.fast_serialization:
+                return FastJSONResponse(response.model_dump())
+            return response
+        except TenantQuotaExceeded:
+            raise HTTPException(status_code=403, detail="Tenant user quota exceeded")
+        except user_service.AccountFrozen:
+            raise HTTPException(status_code=403, detail="Account is frozen")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/auth", response_model=user_model.UserLoginResponse)
-async def auth_login(request: user_model.AuthLoginRequest, db: Session = Depends(get_db)):
+async def auth_login(request: user_model.AuthLoginRequest):
     """
     多种认证方式的统一登录接口
     
@@ -38,21 +56,28 @@ async def auth_login(request: user_model.AuthLoginRequest, db: Session = Depends
     - 中国大陆：微信、QQ、手机号
     - 海外：Google、邮箱、Apple（待实现）
     """
-    try:
-        auth_service = get_auth_service()
-        response = await auth_service.authenticate_user(
-            db=db,
-            provider=request.provider,
-            credentials=request.credentials,
-            tenant_id=request.tenant_id,
-            product_id=request.product_id,
-            region=request.region
-        )
-        return response
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    get_tenant_registry().check_login(request.tenant_id, request.provider)
+    with tenant_session(request.tenant_id) as db:
+        try:
+            auth_service = get_auth_service()
+            response = await auth_service.authenticate_user(
+                db=db,
+                provider=request.provider,
+                credentials=request.credentials,
+                tenant_id=request.tenant_id,
+                product_id=request.product_id,
+                region=request.region
+            )
+            mark_primary_write(response.user_id, request.tenant_id)
+            return response
+        except TenantQuotaExceeded:
+            raise HTTPException(status_code=403, detail="Tenant user quota exceeded")
+        except user_service.AccountFrozen:
+            raise HTTPException(status_code=403, detail="Account is frozen")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/auth/providers")
 async def get_auth_providers(region: str = "global"):
@@ -76,59 +101,124 @@ async def get_auth_providers(region: str = "global"):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/verify", response_model=user_model.UserCoreResponse)
-def verify_token(current_user: user_model.UserCore = Depends(get_current_user)):
+def verify_token(current_user: user_model.UserCore = Depends(get_current_reader)):
+    if settings.fast_serialization:
+        return FastJSONResponse(_core_row(current_user))
     return current_user
 
+@router.post("/logout", status_code=204)
+def logout(request: Request, current_user: user_model.UserCore = Depends(get_current_reader)):
+    """退出登录：吊销当前令牌"""
+    claims = request.state.token_claims
+    try:
+        if "jti" in claims:
+            get_revocation_cache().revoke_token(claims["jti"], claims["exp"])
+        else:
+            # 升级前签发的令牌没有jti，只能按签发时间整体吊销
+            get_revocation_cache().revoke_user(current_user.user_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Revocation unavailable: {e}")
+
+@router.post("/logout_all", response_model=user_model.TokenRevocationResponse)
+def logout_all(current_user: user_model.UserCore = Depends(get_current_reader)):
+    """退出所有设备：吊销当前用户此前签发的全部令牌"""
+    try:
+        watermark = get_revocation_cache().revoke_user(current_user.user_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Revocation unavailable: {e}")
+    return {"user_id": current_user.user_id, "revoked_before": datetime.utcfromtimestamp(watermark)}
+
+@router.delete("/account", response_model=user_model.AccountDeletionResponse)
+def delete_account(current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_tenant_db)):
+    """注销账号：立即停用并吊销全部令牌，同一设备或登录方式再次登录时注册为新用户；数据在保留期满后清理"""
+    deleted_at = user_service.delete_account(db, current_user)
+    if deleted_at is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        get_revocation_cache().revoke_user(current_user.user_id)
+    except Exception:
+        # 账号已停用，令牌校验会拒绝非active用户，吊销失败不影响注销
+        pass
+    return {
+        "user_id": current_user.user_id,
+        "deleted_at": deleted_at,
+        "purge_after": deleted_at + timedelta(days=settings.account_purge_grace_days),
+    }
+
+@router.get("/me", response_model=user_model.UserMeResponse, response_model_exclude_unset=True)
+def get_me(
+    request: Request,
+    fields: str = Query(",".join(user_model.USER_ME_FIELD_GROUPS), description="字段组，逗号分隔：core/profile/interests"),
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
+):
+    """
+    获取当前用户的核心信息、资料与兴趣画像。
+    令牌校验与所需关联数据在同一次JOIN查询中完成。
+    """
+    groups = [group.strip() for group in fields.split(",") if group.strip()]
+    unknown = set(groups) - set(user_model.USER_ME_FIELD_GROUPS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field groups: {', '.join(sorted(unknown))}")
+
+    relations = [group for group in groups if group != "core"]
+    options = [joinedload(getattr(user_model.UserCore, relation)) for relation in relations]
+    current_user = authenticate(request, token, db, options)
+
+    result = {}
+    if "core" in groups:
+        result["core"] = current_user
+    for relation in relations:
+        result[relation] = getattr(current_user, relation)
+    return user_model.UserMeResponse.model_validate(result, from_attributes=True)
+
 @router.get("/profile", response_model=user_model.UserProfileResponse)
-def get_user_profile(current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_profile = db.query(user_model.UserProfile).filter(user_model.UserProfile.user_id == current_user.user_id).first()
+def get_user_profile(current_user: user_model.UserCore = Depends(get_current_reader), db: Session = Depends(get_read_db)):
+    user_profile = user_service.get_cached_user_profile(db=db, user_id=current_user.user_id, tenant_id=current_user.tenant_id)
     if not user_profile:
         raise HTTPException(status_code=404, detail="User profile not found")
+    if settings.fast_serialization:
+        # 缓存中的资料由 UserProfileResponse 生成，已是可直接编码的dict
+        return FastJSONResponse(user_profile)
     return user_profile
 
 @router.put("/profile", response_model=user_model.UserProfileResponse)
-def update_user_profile(profile_data: user_model.UserProfileResponse, current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_profile = db.query(user_model.UserProfile).filter(user_model.UserProfile.user_id == current_user.user_id).first()
+def update_user_profile(profile_data: user_model.UserProfileResponse, current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_tenant_db)):
+    user_profile = user_service.update_user_profile(db=db, user_id=current_user.user_id, profile_data=profile_data, tenant_id=current_user.tenant_id)
     if not user_profile:
         raise HTTPException(status_code=404, detail="User profile not found")
-    
-    for key, value in profile_data.model_dump(exclude_unset=True).items():
-        if key == "user_id":
-            continue
-        setattr(user_profile, key, value)
-    
-    db.commit()
-    db.refresh(user_profile)
+    mark_primary_write(current_user.user_id, current_user.tenant_id)
     return user_profile
 
 @router.post("/interests", response_model=user_model.UserInterestsResponse)
-def create_or_update_interests(interests_data: user_model.UserInterestsCreate, current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_or_update_interests(interests_data: user_model.UserInterestsCreate, current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_tenant_db)):
     """
     创建或更新用户的兴趣画像。
     """
     try:
-        interests = user_service.create_or_update_user_interests(db=db, user_id=current_user.user_id, interests_data=interests_data)
+        interests = user_service.create_or_update_user_interests(db=db, user_id=current_user.user_id, interests_data=interests_data, tenant_id=current_user.tenant_id)
+        mark_primary_write(current_user.user_id, current_user.tenant_id)
         return interests
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/interests", response_model=user_model.UserInterestsResponse)
-def get_interests(current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_interests(current_user: user_model.UserCore = Depends(get_current_reader), db: Session = Depends(get_read_db)):
     """
     获取用户的兴趣画像。
     """
-    interests = user_service.get_user_interests(db=db, user_id=current_user.user_id)
+    interests = user_service.get_cached_user_interests(db=db, user_id=current_user.user_id, tenant_id=current_user.tenant_id)
     if not interests:
         raise HTTPException(status_code=404, detail="User interests not found")
     return interests
 
 @router.post("/app_usage", response_model=user_model.UserAppUsageResponse)
-def record_app_usage(app_usage_data: user_model.UserAppUsageCreate, current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_db)):
+def record_app_usage(app_usage_data: user_model.UserAppUsageCreate, current_user: user_model.UserCore = Depends(get_current_user), db: Session = Depends(get_tenant_db)):
     """
     记录用户的App使用会话。
     """
     try:
-        app_usage = user_service.record_app_usage(db=db, user_id=current_user.user_id, app_usage_data=app_usage_data)
+        app_usage = user_service.record_app_usage(db=db, user=current_user, app_usage_data=app_usage_data)
         return app_usage
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
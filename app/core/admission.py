@@ -0,0 +1,127 @@
+"""
+准入控制
+根据进行中请求数、数据库连接池排队情况与事件循环延迟判断是否过载，
+过载时快速拒绝低优先级请求（503 + Retry-After），保证登录、令牌校验等核心接口可用
+
+各项指标按进程统计（多worker部署时每个worker独立判断）
+"""
+
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .config import settings
+from .metrics import ADMISSION_IN_FLIGHT, EVENT_LOOP_LAG
+
+# 连接池等待耗时的衰减时间常数（秒）：无新样本时旧值按指数衰减，避免过载结束后继续拒绝
+_POOL_WAIT_DECAY_SECONDS = 5.0
+
+
+class AdmissionController:
+    """过载检测"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.pool_waiters = 0
+        self._pool_wait = 0.0
+        self._pool_wait_at = time.monotonic()
+        self.loop_lag = 0.0
+        self._lock = threading.Lock()
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._low_priority = {
+            tuple(rule.split(" ", 1)) for rule in settings.admission_low_priority_routes
+        }
+
+    def is_low_priority(self, method: str, path: str) -> bool:
+        return (method, path.rstrip("/")) in self._low_priority
+
+    @contextmanager
+    def pool_checkout(self):
+        """包裹连接池取连接过程，统计排队数与等待耗时（在线程池中调用）"""
+        with self._lock:
+            self.pool_waiters += 1
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            wait = time.perf_counter() - start_time
+            with self._lock:
+                self.pool_waiters -= 1
+                self._pool_wait = 0.8 * self.pool_wait + 0.2 * wait
+                self._pool_wait_at = time.monotonic()
+
+    @property
+    def pool_wait(self) -> float:
+        """近期连接池等待耗时（指数平滑并随时间衰减）"""
+        elapsed = time.monotonic() - self._pool_wait_at
+        return self._pool_wait * math.exp(-elapsed / _POOL_WAIT_DECAY_SECONDS)
+
+    def overload_reason(self) -> Optional[str]:
+        """返回过载原因，未过载时返回None"""
+        if self.in_flight >= settings.admission_max_in_flight:
+            return "in_flight"
+        if self.pool_waiters > settings.admission_max_pool_waiters:
+            return "pool_waiters"
+        if self.pool_wait * 1000 >= settings.admission_pool_wait_ms:
+            return "pool_wait"
+        if self.loop_lag * 1000 >= settings.admission_loop_lag_ms:
+            return "loop_lag"
+        return None
+
+    def enter(self) -> None:
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.inc()
+
+    def leave(self) -> None:
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.dec()
+
+    async def _monitor_loop_lag(self) -> None:
+        """周期性sleep，实际唤醒时间超出预期的部分即为事件循环延迟"""
+        loop = asyncio.get_running_loop()
+        interval = settings.admission_lag_probe_interval
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            self.loop_lag = 0.5 * self.loop_lag + 0.5 * lag
+            EVENT_LOOP_LAG.set(self.loop_lag)
+
+    def ensure_monitor(self) -> None:
+        """在当前事件循环中启动延迟探测（每个循环只启动一次）"""
+        loop = asyncio.get_running_loop()
+        task = self._monitor_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._monitor_task = loop.create_task(self._monitor_loop_lag())
+
+    async def stop(self) -> None:
+        """停止延迟探测（应用关闭时调用）"""
+        task, self._monitor_task = self._monitor_task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        if task.get_loop() is asyncio.get_running_loop():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> Dict[str, float]:
+        """当前状态（用于指标接口）"""
+        return {
+            "in_flight": self.in_flight,
+            "pool_waiters": self.pool_waiters,
+            "pool_wait_ms": round(self.pool_wait * 1000, 2),
+            "loop_lag_ms": round(self.loop_lag * 1000, 2),
+        }
+
+
+admission_controller = AdmissionController()
+
+
+def get_admission_controller() -> AdmissionController:
+    """获取准入控制器实例"""
+    return admission_controller
@@ -15,21 +15,24 @@ def get_auth_providers_config() -> Dict[str, Any]:
         "wechat": {
             "app_id": os.getenv("WECHAT_APP_ID", "your_wechat_app_id"),
             "app_secret": os.getenv("WECHAT_APP_SECRET", "your_wechat_app_secret"),
-            "redirect_uri": os.getenv("WECHAT_REDIRECT_URI", "https://your-domain.com/auth/wechat/callback")
+            "redirect_uri": os.getenv("WECHAT_REDIRECT_URI", "https://your-domain.com/auth/wechat/callback"),
+            "api_base": os.getenv("WECHAT_API_BASE", "https://api.weixin.qq.com")
         },
         
         # QQ登录配置
         "qq": {
             "app_id": os.getenv("QQ_APP_ID", "your_qq_app_id"),
             "app_secret": os.getenv("QQ_APP_SECRET", "your_qq_app_secret"),
-            "redirect_uri": os.getenv("QQ_REDIRECT_URI", "https://your-domain.com/auth/qq/callback")
+            "redirect_uri": os.getenv("QQ_REDIRECT_URI", "https://your-domain.com/auth/qq/callback"),
+            "api_base": os.getenv("QQ_API_BASE", "https://graph.qq.com")
         },
         
         # Google OAuth配置
         "google": {
             "client_id": os.getenv("GOOGLE_CLIENT_ID", "your_google_client_id"),
             "client_secret": os.getenv("GOOGLE_CLIENT_SECRET", "your_google_client_secret"),
-            "redirect_uri": os.getenv("GOOGLE_REDIRECT_URI", "https://your-domain.com/auth/google/callback")
+            "redirect_uri": os.getenv("GOOGLE_REDIRECT_URI", "https://your-domain.com/auth/google/callback"),
+            "api_base": os.getenv("GOOGLE_API_BASE", "https://oauth2.googleapis.com")
         },
         
         # 手机号验证配置
@@ -6,9 +6,26 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 from pydantic import BaseModel
-import httpx
 from datetime import datetime
 
+# 第三方接口共享HTTP客户端（复用连接），首次使用时创建
+_http_client = None
+
+def get_http_client():
+    """获取共享的异步HTTP客户端"""
+    global _http_client
+    if _http_client is None:
+        import httpx  # 延迟导入，缩短启动时间
+        _http_client = httpx.AsyncClient()
+    return _http_client
+
+async def close_http_client() -> None:
+    """关闭共享HTTP客户端（应用关闭时调用）"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 class AuthUserInfo(BaseModel):
     """统一的认证用户信息格式"""
     provider_user_id: str  # 第三方平台的用户ID
@@ -53,7 +70,8 @@ class WeChatAuthProvider(BaseAuthProvider):
             raise ValueError("WeChat auth code is required")
         
         # 1. 通过code获取access_token
-        token_url = "https://api.weixin.qq.com/sns/oauth2/access_token"
+        api_base = self.config.get("api_base", "https://api.weixin.qq.com")
+        token_url = f"{api_base}/sns/oauth2/access_token"
         token_params = {
             "appid": self.config["app_id"],
             "secret": self.config["app_secret"],
@@ -61,37 +79,37 @@ class WeChatAuthProvider(BaseAuthProvider):
             "grant_type": "authorization_code"
         }
         
-        async with httpx.AsyncClient() as client:
-            token_response = await client.get(token_url, params=token_params)
-            token_data = token_response.json()
+        client = get_http_client()
+        token_response = await client.get(token_url, params=token_params)
+        token_data = token_response.json()
             
-            if "errcode" in token_data:
-                raise ValueError(f"WeChat auth error: {token_data}")
+        if "errcode" in token_data:
+            raise ValueError(f"WeChat auth error: {token_data}")
             
-            access_token = token_data["access_token"]
-            openid = token_data["openid"]
+        access_token = token_data["access_token"]
+        openid = token_data["openid"]
             
-            # 2. 获取用户信息
-            userinfo_url = "https://api.weixin.qq.com/sns/userinfo"
-            userinfo_params = {
-                "access_token": access_token,
-                "openid": openid,
-                "lang": "zh_CN"
-            }
+        # 2. 获取用户信息
+        userinfo_url = f"{api_base}/sns/userinfo"
+        userinfo_params = {
+            "access_token": access_token,
+            "openid": openid,
+            "lang": "zh_CN"
+        }
             
-            userinfo_response = await client.get(userinfo_url, params=userinfo_params)
-            userinfo_data = userinfo_response.json()
+        userinfo_response = await client.get(userinfo_url, params=userinfo_params)
+        userinfo_data = userinfo_response.json()
             
-            if "errcode" in userinfo_data:
-                raise ValueError(f"WeChat userinfo error: {userinfo_data}")
+        if "errcode" in userinfo_data:
+            raise ValueError(f"WeChat userinfo error: {userinfo_data}")
             
-            return AuthUserInfo(
-                provider_user_id=openid,
-                provider="wechat",
-                nickname=userinfo_data.get("nickname"),
-                avatar_url=userinfo_data.get("headimgurl"),
-                raw_data=userinfo_data
-            )
+        return AuthUserInfo(
+            provider_user_id=openid,
+            provider="wechat",
+            nickname=userinfo_data.get("nickname"),
+            avatar_url=userinfo_data.get("headimgurl"),
+            raw_data=userinfo_data
+        )
 
 
 class QQAuthProvider(BaseAuthProvider):
@@ -109,44 +127,45 @@ class QQAuthProvider(BaseAuthProvider):
         if not access_token:
             raise ValueError("QQ access token is required")
         
-        async with httpx.AsyncClient() as client:
-            # 1. 获取OpenID
-            openid_url = "https://graph.qq.com/oauth2.0/me"
-            openid_params = {"access_token": access_token}
+        api_base = self.config.get("api_base", "https://graph.qq.com")
+        client = get_http_client()
+        # 1. 获取OpenID
+        openid_url = f"{api_base}/oauth2.0/me"
+        openid_params = {"access_token": access_token}
             
-            openid_response = await client.get(openid_url, params=openid_params)
-            openid_text = openid_response.text
+        openid_response = await client.get(openid_url, params=openid_params)
+        openid_text = openid_response.text
             
-            # 解析JSONP格式响应
-            if "callback" in openid_text:
-                import json
-                json_str = openid_text.split("(")[1].split(")")[0]
-                openid_data = json.loads(json_str)
-                openid = openid_data["openid"]
-            else:
-                raise ValueError("Failed to get QQ OpenID")
+        # 解析JSONP格式响应
+        if "callback" in openid_text:
+            import json
+            json_str = openid_text.split("(")[1].split(")")[0]
+            openid_data = json.loads(json_str)
+            openid = openid_data["openid"]
+        else:
+            raise ValueError("Failed to get QQ OpenID")
             
-            # 2. 获取用户信息
-            userinfo_url = "https://graph.qq.com/user/get_user_info"
-            userinfo_params = {
-                "access_token": access_token,
-                "oauth_consumer_key": self.config["app_id"],
-                "openid": openid
-            }
+        # 2. 获取用户信息
+        userinfo_url = f"{api_base}/user/get_user_info"
+        userinfo_params = {
+            "access_token": access_token,
+            "oauth_consumer_key": self.config["app_id"],
+            "openid": openid
+        }
             
-            userinfo_response = await client.get(userinfo_url, params=userinfo_params)
-            userinfo_data = userinfo_response.json()
+        userinfo_response = await client.get(userinfo_url, params=userinfo_params)
+        userinfo_data = userinfo_response.json()
             
-            if userinfo_data.get("ret") != 0:
-                raise ValueError(f"QQ userinfo error: {userinfo_data}")
+        if userinfo_data.get("ret") != 0:
+            raise ValueError(f"QQ userinfo error: {userinfo_data}")
             
-            return AuthUserInfo(
-                provider_user_id=openid,
-                provider="qq",
-                nickname=userinfo_data.get("nickname"),
-                avatar_url=userinfo_data.get("figureurl_qq_1"),
-                raw_data=userinfo_data
-            )
+        return AuthUserInfo(
+            provider_user_id=openid,
+            provider="qq",
+            nickname=userinfo_data.get("nickname"),
+            avatar_url=userinfo_data.get("figureurl_qq_1"),
+            raw_data=userinfo_data
+        )
 
 
 class GoogleAuthProvider(BaseAuthProvider):
@@ -165,27 +184,28 @@ class GoogleAuthProvider(BaseAuthProvider):
             raise ValueError("Google ID token is required")
         
         # 验证Google ID Token
-        verify_url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
+        api_base = self.config.get("api_base", "https://oauth2.googleapis.com")
+        verify_url = f"{api_base}/tokeninfo?id_token={id_token}"
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(verify_url)
-            user_data = response.json()
+        client = get_http_client()
+        response = await client.get(verify_url)
+        user_data = response.json()
             
-            if response.status_code != 200 or "error" in user_data:
-                raise ValueError(f"Google token verification failed: {user_data}")
+        if response.status_code != 200 or "error" in user_data:
+            raise ValueError(f"Google token verification failed: {user_data}")
             
-            # 验证audience
-            if user_data.get("aud") != self.config["client_id"]:
-                raise ValueError("Invalid Google client ID")
+        # 验证audience
+        if user_data.get("aud") != self.config["client_id"]:
+            raise ValueError("Invalid Google client ID")
             
-            return AuthUserInfo(
-                provider_user_id=user_data["sub"],
-                provider="google",
-                email=user_data.get("email"),
-                nickname=user_data.get("name"),
-                avatar_url=user_data.get("picture"),
-                raw_data=user_data
-            )
+        return AuthUserInfo(
+            provider_user_id=user_data["sub"],
+            provider="google",
+            email=user_data.get("email"),
+            nickname=user_data.get("name"),
+            avatar_url=user_data.get("picture"),
+            raw_data=user_data
+        )
 
 
 class PhoneAuthProvider(BaseAuthProvider):
@@ -252,6 +272,11 @@ class AuthProviderFactory:
         "email": EmailAuthProvider
     }
     
+    @classmethod
+    def register_provider(cls, provider_name: str, provider_class: type) -> None:
+        """注册认证提供商"""
+        cls._providers[provider_name] = provider_class
+    
     @classmethod
     def create_provider(cls, provider_name: str, config: Dict[str, Any]) -> BaseAuthProvider:
         """创建认证提供商实例"""
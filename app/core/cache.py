@@ -1,7 +1,19 @@
 import json
+import math
+import random
+import time
 import redis
-from typing import Optional, Any
+from typing import Optional, Any, Callable, Dict, List, Tuple
 from .config import settings
+from .metrics import CACHE_OPERATION_DURATION, CACHE_REQUESTS, track_latency
+
+# 当前值与读取时一致（期间没有写穿或失效）时才替换
+_REPLACE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return false
+"""
 
 class CacheService:
     """Redis缓存服务"""
@@ -16,12 +28,21 @@ class CacheService:
     
     def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
+        value = self._get_raw(key)
+        return json.loads(value) if value else None
+    
+    def _get_raw(self, key: str) -> Optional[str]:
+        """获取未解码的缓存值"""
         try:
-            value = self.redis_client.get(key)
+            with track_latency(CACHE_OPERATION_DURATION, "get"):
+                value = self.redis_client.get(key)
             if value:
-                return json.loads(value)
+                CACHE_REQUESTS.labels("hit").inc()
+                return value
+            CACHE_REQUESTS.labels("miss").inc()
             return None
         except Exception as e:
+            CACHE_REQUESTS.labels("error").inc()
             print(f"Cache get error: {e}")
             return None
     
@@ -30,7 +51,8 @@ class CacheService:
         try:
             ttl = ttl or settings.cache_ttl_seconds
             serialized_value = json.dumps(value, default=str)
-            return self.redis_client.setex(key, ttl, serialized_value)
+            with track_latency(CACHE_OPERATION_DURATION, "set"):
+                return self.redis_client.setex(key, ttl, serialized_value)
         except Exception as e:
             print(f"Cache set error: {e}")
             return False
@@ -38,18 +60,124 @@ class CacheService:
     def delete(self, key: str) -> bool:
         """删除缓存"""
         try:
-            return bool(self.redis_client.delete(key))
+            with track_latency(CACHE_OPERATION_DURATION, "delete"):
+                return bool(self.redis_client.delete(key))
         except Exception as e:
             print(f"Cache delete error: {e}")
             return False
     
+    def _should_refresh(self, entry: dict) -> bool:
+        """XFetch：越接近过期、重建越慢，越可能提前刷新（每个请求独立掷骰，避免集中重建）"""
+        beta = settings.cache_early_refresh_beta
+        if beta <= 0:
+            return False
+        return time.time() - entry["delta"] * beta * math.log(1.0 - random.random()) >= entry["expires_at"]
+    
+    def set_entry(
+        self,
+        key: str,
+        value: Any,
+        ttl: int = None,
+        delta: float = 0.0,
+        only_if_absent: bool = False,
+        expected: Optional[str] = None
+    ) -> bool:
+        """
+        写入读穿缓存条目，value为None时写入负缓存；TTL带随机抖动
+        expected不为None时只在当前值仍为expected时替换（比较并写入）
+        """
+        try:
+            ttl = settings.cache_negative_ttl_seconds if value is None else (ttl or settings.cache_ttl_seconds)
+            jitter = settings.cache_ttl_jitter
+            ttl = max(1, int(ttl * random.uniform(1 - jitter, 1 + jitter)))
+            entry = {"value": value, "delta": delta, "expires_at": time.time() + ttl}
+            serialized = json.dumps(entry, default=str)
+            with track_latency(CACHE_OPERATION_DURATION, "set"):
+                if expected is not None:
+                    replace = self.redis_client.register_script(_REPLACE_SCRIPT)
+                    return bool(replace(keys=[key], args=[expected, serialized, ttl]))
+                return bool(self.redis_client.set(key, serialized, ex=ttl, nx=only_if_absent))
+        except Exception as e:
+            print(f"Cache set error: {e}")
+            return False
+    
+    def get_entries(self, keys: List[str]) -> List[Optional[dict]]:
+        """一次MGET读取多个读穿缓存条目，未命中为None；Redis不可用时全部视为未命中"""
+        if not keys:
+            return []
+        try:
+            with track_latency(CACHE_OPERATION_DURATION, "mget"):
+                values = self.redis_client.mget(keys)
+        except Exception as e:
+            CACHE_REQUESTS.labels("error").inc(len(keys))
+            print(f"Cache mget error: {e}")
+            return [None] * len(keys)
+        entries = [json.loads(value) if value else None for value in values]
+        hits = sum(entry is not None for entry in entries)
+        CACHE_REQUESTS.labels("hit").inc(hits)
+        CACHE_REQUESTS.labels("miss").inc(len(keys) - hits)
+        return entries
+
+    def set_entries(self, values: Dict[str, Any], ttl: int = None, delta: float = 0.0) -> bool:
+        """流水线批量回填读穿缓存条目（NX，不覆盖并发写入的新值），各条目TTL独立抖动"""
+        if not values:
+            return True
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in values.items():
+                entry_ttl = settings.cache_negative_ttl_seconds if value is None else (ttl or settings.cache_ttl_seconds)
+                jitter = settings.cache_ttl_jitter
+                entry_ttl = max(1, int(entry_ttl * random.uniform(1 - jitter, 1 + jitter)))
+                entry = {"value": value, "delta": delta, "expires_at": time.time() + entry_ttl}
+                pipe.set(key, json.dumps(entry, default=str), ex=entry_ttl, nx=True)
+            with track_latency(CACHE_OPERATION_DURATION, "mset"):
+                pipe.execute()
+            return True
+        except Exception as e:
+            print(f"Cache mset error: {e}")
+            return False
+    
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: int = None) -> Any:
+        """
+        读穿缓存
+        未命中或需要提前刷新时调用loader并回填；loader返回None表示记录不存在（负缓存）
+        未命中时以NX回填；提前刷新时只在条目未被改写时替换，均不会覆盖并发写入的新值
+        """
+        raw = self._get_raw(key)
+        entry = json.loads(raw) if raw else None
+        if entry is not None and not self._should_refresh(entry):
+            return entry["value"]
+        start_time = time.perf_counter()
+        value = loader()
+        self.set_entry(
+            key, value, ttl,
+            delta=time.perf_counter() - start_time,
+            only_if_absent=entry is None,
+            expected=raw
+        )
+        return value
+    
     def clear_user_cache(self, user_id: str, tenant_id: str = "default") -> bool:
         """清理用户相关缓存"""
         try:
             pattern = f"user:{tenant_id}:{user_id}:*"
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                return bool(self.redis_client.delete(*keys))
+            with track_latency(CACHE_OPERATION_DURATION, "clear_user"):
+                keys = self.redis_client.keys(pattern)
+                if keys:
+                    return bool(self.redis_client.delete(*keys))
+            return True
+        except Exception as e:
+            print(f"Cache clear error: {e}")
+            return False
+    
+    def clear_users_cache(self, users: List[Tuple[str, str]]) -> bool:
+        """批量清理一批用户的缓存（按已知键名一次往返删除，不扫描键空间）"""
+        keys = [user_cache_key(user_id, tenant_id, name) for user_id, tenant_id in users for name in USER_CACHE_NAMES]
+        if not keys:
+            return True
+        try:
+            with track_latency(CACHE_OPERATION_DURATION, "clear_users"):
+                self.redis_client.delete(*keys)
             return True
         except Exception as e:
             print(f"Cache clear error: {e}")
@@ -62,6 +190,13 @@ class CacheService:
         except Exception:
             return False
 
+# 用户数据缓存的全部键名
+USER_CACHE_NAMES = ("profile", "interests", "card")
+
+def user_cache_key(user_id: str, tenant_id: str, name: str) -> str:
+    """用户数据缓存键，与 clear_user_cache 的命名空间一致"""
+    return f"user:{tenant_id}:{user_id}:{name}"
+
 # 全局缓存实例
 cache = CacheService()
 
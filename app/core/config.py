@@ -16,6 +16,23 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./auth.db"
     database_pool_size: int = 10
     database_max_overflow: int = 20
+    database_replica_urls: list = []  # 只读副本，如 ["postgresql://...@replica1/db"]
+    replica_max_lag_seconds: float = 5.0  # 超过该复制延迟的副本不参与读路由
+    replica_lag_check_interval: float = 2.0  # 副本延迟检查间隔（秒）
+    read_your_writes_seconds: int = 5  # 用户写入后该时间窗口内读主库
+    slow_query_threshold_ms: int = 200  # 慢查询日志阈值
+    n_plus_one_threshold: int = 5  # 同一SQL指纹在单个请求内重复次数达到该值时告警
+    db_debug_headers: bool = False  # 返回X-DB-Queries/X-DB-Time响应头
+    
+    # 租户分库配置
+    database_shards: dict = {}  # 额外分片，如 {"shard1": "postgresql://...@db1/auth"}；默认分片为DATABASE_URL
+    tenant_shard_map: dict = {}  # 静态租户映射，如 {"big-tenant": "shard1"}
+    shard_placement: str = "default"  # 未映射租户的放置策略：default/hash
+    shard_map_refresh_seconds: int = 5  # 动态映射（迁移工具写入Redis）刷新间隔
+    
+    # 租户注册表配置
+    tenant_registry_enforced: bool = False  # 为true时拒绝未登记的租户登录
+    tenant_registry_poll_seconds: float = 5.0  # 各进程轮询配置版本的间隔
     
     # Redis配置
     redis_url: str = "redis://localhost:6379"
@@ -31,22 +48,90 @@ class Settings(BaseSettings):
     # 安全配置
     cors_origins: list = ["*"]
     trusted_hosts: list = ["*"]
+    admin_api_key: Optional[str] = None  # 管理接口密钥（X-Admin-Key），未配置时管理接口不可用
+    internal_api_key: Optional[str] = None  # 内部服务接口密钥（X-Internal-Key），未配置时内部接口不可用
+    
+    # 令牌吊销配置
+    token_revocation_enabled: bool = True
+    revocation_bloom_capacity: int = 100000  # 本地布隆过滤器预期容量（已吊销且未过期的令牌数）
+    revocation_bloom_error_rate: float = 0.001  # 误判率，误判时回查Redis
+    revocation_resync_seconds: int = 300  # 定期从Redis全量同步（重建过滤器、清理过期水位）
+    principal_cache_ttl_seconds: float = 5.0  # 用户主体缓存时间（UDS令牌校验使用，状态变更最多延迟该时间生效）
+    principal_cache_max_entries: int = 100000
+    
+    # 内部令牌校验（Unix域套接字，msgpack长度前缀帧）
+    verify_socket_path: Optional[str] = None  # 如 /run/auth/verify.sock，未配置时不启用
+    verify_socket_max_frame_bytes: int = 65536
     
     # 限流配置
     rate_limit_enabled: bool = True
     max_requests_per_minute: int = 60
     max_requests_per_hour: int = 1000
     
+    # 准入控制配置（过载时拒绝低优先级请求）
+    admission_enabled: bool = True
+    admission_low_priority_routes: list = ["POST /api/user/app_usage", "POST /api/user/interests"]  # "方法 路径"
+    admission_max_in_flight: int = 100  # 进行中请求数达到该值视为过载
+    admission_max_pool_waiters: int = 5  # 等待数据库连接的请求数超过该值视为过载
+    admission_pool_wait_ms: int = 100  # 近期取连接平均耗时阈值
+    admission_loop_lag_ms: int = 100  # 事件循环延迟阈值
+    admission_lag_probe_interval: float = 0.1  # 事件循环延迟探测间隔（秒）
+    admission_retry_after_seconds: int = 2  # 拒绝响应的Retry-After
+    
+    # 幂等键配置（请求头 Idempotency-Key，重试返回首次请求的响应）
+    idempotency_enabled: bool = True
+    idempotency_routes: list = [
+        "POST /api/user/app_usage", "POST /api/user/interests", "POST /api/user/login", "POST /api/user/auth"
+    ]  # "方法 路径"
+    idempotency_ttl_seconds: int = 3600  # 成功响应保存时间
+    idempotency_lock_seconds: float = 30.0  # 处理中锁的超时（应大于接口最长耗时）
+    idempotency_wait_seconds: float = 10.0  # 并发的重复请求等待首个请求完成的最长时间，超时返回409
+    idempotency_poll_interval: float = 0.05  # 等待期间检查结果的间隔
+    
     # 日志配置
     log_level: str = "INFO"
     log_format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    log_json: bool = True  # 输出JSON结构化日志
+    log_sample_rate: float = 1.0  # 成功请求访问日志采样率（错误与慢请求总是记录）
+    slow_request_threshold_ms: int = 1000  # 慢请求阈值
     
     # 缓存配置
     cache_ttl_seconds: int = 3600  # 1小时
     session_cache_ttl: int = 1800  # 30分钟
+    cache_negative_ttl_seconds: int = 60  # 不存在记录的缓存时间
+    cache_ttl_jitter: float = 0.1  # TTL随机抖动比例，避免同时过期
+    cache_early_refresh_beta: float = 1.0  # 提前刷新系数，越大越早刷新（0关闭）
+    user_batch_max_ids: int = 500  # 批量查询用户名片单次最多用户数
+    fast_serialization: bool = False  # 热点接口跳过响应模型校验，直接编码（orjson）
+    
+    # 登录后置操作配置
+    login_deferred_updates: bool = True  # 最后登录时间在后台批量写入
+    login_flush_interval_seconds: float = 2.0  # 批量写入间隔
+    login_flush_batch_size: int = 1000  # 单条UPDATE包含的用户数
+    login_buffer_max_users: int = 50000  # 缓冲用户数达到该值时立即写入
+    
+    # 统计配置
+    analytics_retention_days: int = 400  # 活跃用户HyperLogLog与登录计数保留天数
+    segment_max_page_size: int = 1000  # 分群查询单页最大条数
+    segment_stream_batch_size: int = 1000  # 分群导出每批查询条数（批间释放数据库连接）
+    admin_user_list_max_page_size: int = 200  # 管理端用户列表单页最大条数
+    
+    # 注销与数据清理配置
+    account_purge_grace_days: int = 30  # 注销后保留天数，期满后由清理任务删除数据
+    account_purge_batch_size: int = 500  # 清理任务每批处理的用户数与行数
+    account_purge_pause_seconds: float = 0.1  # 清理任务批间暂停，限制对数据库的压力
+    
+    # App使用记录归档配置
+    app_usage_archive_dir: str = "archive/app_usage"  # 归档目录（本机磁盘，按租户/日期分区）
+    app_usage_archive_after_days: int = 180  # 会话开始时间早于该天数的记录归档后从数据库删除
+    app_usage_archive_batch_size: int = 5000  # 游标每次读取的行数与每条DELETE的行数上限
+    app_usage_archive_pause_seconds: float = 0.05  # 删除批间暂停，限制对数据库的压力
     
     # 健康检查配置
     health_check_timeout: int = 30
+    warmup_enabled: bool = True  # 启动时预热连接与热点代码路径，完成后才就绪
+    warmup_db_connections: int = 5  # 启动时每个数据库预建的连接数（不超过连接池大小）
+    warmup_redis_connections: int = 5  # 启动时预建的Redis连接数
     
     class Config:
         env_file = ".env"
@@ -1,18 +1,50 @@
-from sqlalchemy import create_engine
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from fastapi import Request
+from jose import JWTError, jwt
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 from .config import settings
+from .admission import admission_controller
+from .cache import get_cache
+from .metrics import instrument_engine, observe_pool_wait
+from . import query_stats
+
+logger = logging.getLogger(__name__)
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取连接耗时的连接池（排队情况同时用于准入控制）"""
+
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            with admission_controller.pool_checkout():
+                return super()._do_get()
+        finally:
+            observe_pool_wait(time.perf_counter() - start_time)
+
+def _create_engine(url: str) -> Engine:
+    """创建带连接池与指标埋点的数据库引擎"""
+    db_engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.database_pool_size,
+        max_overflow=settings.database_max_overflow,
+        pool_pre_ping=True,  # 连接前检查连接是否有效
+        pool_recycle=3600,   # 1小时后回收连接
+        echo=settings.debug  # 在调试模式下显示SQL
+    )
+    instrument_engine(db_engine)
+    query_stats.instrument_engine(db_engine)
+    return db_engine
 
 # 创建数据库引擎，优化连接池配置
-engine = create_engine(
-    settings.DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=settings.database_pool_size,
-    max_overflow=settings.database_max_overflow,
-    pool_pre_ping=True,  # 连接前检查连接是否有效
-    pool_recycle=3600,   # 1小时后回收连接
-    echo=settings.debug  # 在调试模式下显示SQL
-)
+engine = _create_engine(settings.DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -23,3 +55,141 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# PostgreSQL副本复制延迟（秒）；主库或已追平时为0
+_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class ReplicaRouter:
+    """
+    只读副本路由
+    按复制延迟过滤可用副本并轮询分配，全部不可用时返回None（回退主库）
+    """
+
+    def __init__(self, replica_engines: List[Engine]):
+        self.engines = replica_engines
+        self.sessions = {id(e): sessionmaker(autocommit=False, autoflush=False, bind=e) for e in replica_engines}
+        self._lag: Dict[int, Optional[float]] = {id(e): None for e in replica_engines}
+        self._checked_at: Dict[int, float] = {id(e): 0.0 for e in replica_engines}
+        self._locks = {id(e): threading.Lock() for e in replica_engines}
+        self._round_robin = itertools.count()
+
+    def _measure_lag(self, replica: Engine) -> Optional[float]:
+        """查询复制延迟，连接失败返回None"""
+        try:
+            with replica.connect() as conn:
+                if replica.dialect.name != "postgresql":
+                    conn.execute(text("SELECT 1"))
+                    return 0.0
+                return float(conn.execute(_REPLICA_LAG_SQL).scalar() or 0.0)
+        except Exception as e:
+            logger.warning(f"Replica {replica.url.render_as_string(hide_password=True)} unavailable: {e}")
+            return None
+
+    def lag(self, replica: Engine) -> Optional[float]:
+        """获取副本延迟，超过检查间隔时刷新（同一副本同一时刻只有一个线程刷新）"""
+        key = id(replica)
+        if time.monotonic() - self._checked_at[key] >= settings.replica_lag_check_interval:
+            lock = self._locks[key]
+            if lock.acquire(blocking=False):
+                try:
+                    self._lag[key] = self._measure_lag(replica)
+                    self._checked_at[key] = time.monotonic()
+                finally:
+                    lock.release()
+        return self._lag[key]
+
+    def choose(self) -> Optional[Engine]:
+        """选择一个延迟在阈值内的副本"""
+        if not self.engines:
+            return None
+        start = next(self._round_robin)
+        for offset in range(len(self.engines)):
+            replica = self.engines[(start + offset) % len(self.engines)]
+            lag = self.lag(replica)
+            if lag is not None and lag <= settings.replica_max_lag_seconds:
+                return replica
+        return None
+
+    def status(self) -> List[Dict[str, object]]:
+        """副本状态（用于健康检查）"""
+        return [
+            {"replica": e.url.render_as_string(hide_password=True), "lag_seconds": self.lag(e)}
+            for e in self.engines
+        ]
+
+replica_router = ReplicaRouter([_create_engine(url) for url in settings.database_replica_urls])
+
+# 读己之写：本进程内的最近写入记录（user_key -> 过期时间），跨进程由Redis同步
+_recent_writes: Dict[str, float] = {}
+
+def _sticky_key(user_id: str, tenant_id: str) -> str:
+    return f"rw:{tenant_id}:{user_id}"
+
+def mark_primary_write(user_id: str, tenant_id: str = "default") -> None:
+    """记录用户刚发生写入，在 read_your_writes_seconds 内该用户的读请求走主库"""
+    if not replica_router.engines:
+        return
+    key = _sticky_key(user_id, tenant_id)
+    now = time.monotonic()
+    if len(_recent_writes) > 10000:
+        for stale_key in [k for k, expires_at in _recent_writes.items() if expires_at <= now]:
+            _recent_writes.pop(stale_key, None)
+    _recent_writes[key] = now + settings.read_your_writes_seconds
+    try:
+        get_cache().redis_client.set(key, 1, ex=settings.read_your_writes_seconds)
+    except Exception as e:
+        logger.warning(f"Failed to record recent write for {key}: {e}")
+
+def _has_recent_write(user_id: str, tenant_id: str) -> bool:
+    key = _sticky_key(user_id, tenant_id)
+    expires_at = _recent_writes.get(key)
+    if expires_at is not None:
+        if expires_at > time.monotonic():
+            return True
+        _recent_writes.pop(key, None)
+    try:
+        return bool(get_cache().redis_client.exists(key))
+    except Exception:
+        # 无法确认时保守地读主库
+        return True
+
+def token_claims(request: Request) -> Optional[dict]:
+    """读取令牌声明（仅用于路由决策，不做校验；校验由get_current_user完成）"""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token)
+    except JWTError:
+        return None
+
+def get_read_db(request: Request):
+    """
+    获取只读数据库会话
+    优先路由到延迟达标的副本；无副本、副本不可用或用户刚写入时使用主库
+    非默认分片的租户直接使用所在分片（副本仅配置于默认分片）
+    """
+    from .sharding import DEFAULT_SHARD, shard_router  # 延迟导入，避免循环依赖
+
+    session_factory = SessionLocal
+    claims = token_claims(request) or {}
+    tenant_id = claims.get("tenant_id") or request.headers.get("x-tenant-id")
+    shard = shard_router.shard_for_tenant(tenant_id)
+    if shard != DEFAULT_SHARD:
+        session_factory = shard_router.sessions[shard]
+    elif replica_router.engines:
+        user_id = claims.get("sub")
+        sticky = user_id is not None and _has_recent_write(user_id, tenant_id or "default")
+        replica = None if sticky else replica_router.choose()
+        if replica is not None:
+            session_factory = replica_router.sessions[id(replica)]
+    db = session_factory()
+    try:
+        yield db
+    finally:
+        db.close()
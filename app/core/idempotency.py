@@ -0,0 +1,80 @@
+"""
+幂等键（请求头 Idempotency-Key）存储
+重试的写请求直接返回首次请求的响应，不重复执行接口：
+- idem:{tenant}:{principal}:{digest}        首次请求的成功响应（状态码、响应头、响应体、请求指纹），保存 idempotency_ttl_seconds
+- idem:{tenant}:{principal}:{digest}:lock   处理中锁（SET NX PX），值为持有者随机令牌
+digest 由方法、路径与幂等键计算；principal 为令牌中的用户，未认证接口（登录）为 anon-请求指纹
+写入响应与释放锁均校验持有者，锁超时后被其他请求接管时不覆盖其结果
+"""
+
+import hashlib
+import json
+import secrets
+from typing import Optional
+
+from .cache import get_cache
+from .config import settings
+
+# 持有者一致时写入响应并释放锁
+_COMPLETE_SCRIPT = """
+if redis.call('get', KEYS[2]) == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    redis.call('del', KEYS[2])
+    return 1
+end
+return 0
+"""
+
+# 持有者一致时释放锁
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class IdempotencyStore:
+    """幂等响应存储"""
+
+    @property
+    def redis(self):
+        return get_cache().redis_client
+
+    @staticmethod
+    def record_key(scope_id: str, method: str, path: str, idempotency_key: str) -> str:
+        digest = hashlib.sha256(f"{method} {path} {idempotency_key}".encode()).hexdigest()[:32]
+        return f"idem:{scope_id}:{digest}"
+
+    def get(self, record_key: str) -> Optional[dict]:
+        """已保存的响应，不存在时返回None"""
+        value = self.redis.get(record_key)
+        return json.loads(value) if value else None
+
+    def acquire(self, record_key: str) -> Optional[str]:
+        """获取处理中锁，成功时返回持有者令牌"""
+        token = secrets.token_hex(8)
+        if self.redis.set(f"{record_key}:lock", token, nx=True, px=int(settings.idempotency_lock_seconds * 1000)):
+            return token
+        return None
+
+    def complete(self, record_key: str, token: str, record: dict) -> bool:
+        """保存响应并释放锁（锁已被接管时不写入）"""
+        complete = self.redis.register_script(_COMPLETE_SCRIPT)
+        return bool(complete(
+            keys=[record_key, f"{record_key}:lock"],
+            args=[token, json.dumps(record), settings.idempotency_ttl_seconds]
+        ))
+
+    def release(self, record_key: str, token: str) -> None:
+        """释放锁（请求失败时调用，等待中的重复请求将重新执行）"""
+        release = self.redis.register_script(_RELEASE_SCRIPT)
+        release(keys=[f"{record_key}:lock"], args=[token])
+
+
+idempotency_store = IdempotencyStore()
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """获取幂等响应存储实例"""
+    return idempotency_store
@@ -0,0 +1,155 @@
+"""
+应用生命周期管理
+
+启动：开发环境建表 → 后台预热数据库与Redis连接、热点代码路径 → 标记就绪（/ready 返回200）
+关闭（SIGTERM，uvicorn停止接收新请求并等待处理中的请求后）：
+    标记未就绪 → 停止后台探测 → 关闭第三方HTTP客户端 → 刷新登录时间缓冲 → 释放数据库与Redis连接池 → 刷新日志队列
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+from jose import jwt
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import configure_mappers
+
+from .admission import get_admission_controller
+from .auth_providers import close_http_client
+from .cache import get_cache
+from .config import settings
+from .database import SessionLocal, replica_router
+from .logging import shutdown_logging
+from .revocation import get_revocation_cache
+from .sharding import shard_router
+from .tenants import get_tenant_registry
+from .verify_socket import get_verify_socket_server
+from ..models import user as user_model
+from ..services.login_activity import get_login_activity
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+_warmup_task: Optional[asyncio.Future] = None
+
+
+def is_ready() -> bool:
+    """预热是否完成"""
+    return _ready.is_set()
+
+
+def _all_engines():
+    return list(shard_router.engines.values()) + list(replica_router.engines)
+
+
+def create_tables() -> None:
+    """只在开发环境自动创建表，生产环境使用Alembic"""
+    if settings.environment != "development":
+        return
+    for shard_engine in shard_router.engines.values():
+        user_model.Base.metadata.create_all(bind=shard_engine)
+
+
+def _warm_engine(db_engine: Engine, count: int) -> None:
+    """同时持有count个连接，确保连接池中真正建立count个连接"""
+    connections = []
+    try:
+        for _ in range(count):
+            conn = db_engine.connect()
+            connections.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def _warm_redis(count: int) -> None:
+    pool = get_cache().redis_client.connection_pool
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(pool.get_connection())
+    finally:
+        for conn in connections:
+            pool.release(conn)
+
+
+def _warm_code_paths() -> None:
+    """
+    预热首个请求才会触发的一次性开销：ORM映射配置、热点查询的SQL编译缓存、JWT签名后端初始化
+    查询不存在的ID，只为生成与线上相同形态的语句
+    """
+    configure_mappers()
+    db = SessionLocal()
+    try:
+        for model in (user_model.UserCore, user_model.UserProfile, user_model.UserInterests):
+            db.query(model).filter(model.user_id == "").first()
+    finally:
+        db.close()
+    token = jwt.encode({"sub": ""}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+
+def warm_up() -> None:
+    """预热连接池，完成后标记就绪（单个依赖预热失败只记录告警）"""
+    if not settings.warmup_enabled:
+        _ready.set()
+        return
+    start_time = time.perf_counter()
+    db_connections = min(settings.warmup_db_connections, settings.database_pool_size)
+    for db_engine in _all_engines():
+        try:
+            _warm_engine(db_engine, db_connections)
+        except Exception as e:
+            logger.warning(f"Database warm-up failed for {db_engine.url.render_as_string(hide_password=True)}: {e}")
+    try:
+        _warm_code_paths()
+    except Exception as e:
+        logger.warning(f"Code path warm-up failed: {e}")
+    try:
+        _warm_redis(settings.warmup_redis_connections)
+    except Exception as e:
+        logger.warning(f"Redis warm-up failed: {e}")
+    _ready.set()
+    logger.info(f"Warm-up finished in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+
+
+async def startup() -> None:
+    """应用启动：建表后在后台线程预热，不阻塞端口监听（存活检查可立即通过）"""
+    global _warmup_task
+    _ready.clear()
+    await asyncio.to_thread(create_tables)
+    # 登录路径只读取租户快照，启动时先完成首次加载
+    await asyncio.to_thread(get_tenant_registry().ensure_running)
+    if settings.token_revocation_enabled:
+        get_revocation_cache().ensure_running()
+    if settings.verify_socket_path:
+        await get_verify_socket_server().start(settings.verify_socket_path)
+    _warmup_task = asyncio.ensure_future(asyncio.to_thread(warm_up))
+
+
+async def shutdown() -> None:
+    """应用关闭：释放外部连接并刷新缓冲"""
+    _ready.clear()
+    if _warmup_task is not None and not _warmup_task.done():
+        await _warmup_task
+
+    await get_verify_socket_server().stop()
+    await get_admission_controller().stop()
+    await close_http_client()
+    await asyncio.to_thread(get_revocation_cache().stop)
+    await asyncio.to_thread(get_tenant_registry().stop)
+    # 先写入缓冲中的登录时间，再释放连接池
+    await asyncio.to_thread(get_login_activity().stop)
+    for db_engine in _all_engines():
+        db_engine.dispose()
+    try:
+        get_cache().redis_client.connection_pool.disconnect()
+    except Exception as e:
+        logger.warning(f"Failed to close Redis connections: {e}")
+    logger.info("Shutdown complete")
+    # 最后刷新日志，确保以上日志输出
+    shutdown_logging()
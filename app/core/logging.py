@@ -1,45 +1,141 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-from typing import Dict, Any
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
 from .config import settings
 
+# 日志队列监听器：实际的I/O在后台线程完成，不阻塞事件循环
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+# 配置前根logger上的处理器，停止监听线程后恢复，之后的日志不再写入无人消费的队列
+_original_handlers: Optional[List[logging.Handler]] = None
+
+class JsonFormatter(logging.Formatter):
+    """JSON结构化日志格式"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """保留原始消息与异常信息，格式化交给监听线程完成"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 def setup_logging() -> None:
     """配置日志系统"""
-    logging.basicConfig(
-        level=getattr(logging, settings.log_level.upper()),
-        format=settings.log_format,
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-        ]
-    )
-    
+    global _queue_listener, _queue_handler, _original_handlers
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.log_json:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(settings.log_format))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    if _original_handlers is None:
+        _original_handlers = list(root.handlers)
+    if _queue_listener is not None:
+        _queue_listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = _StructuredQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(getattr(logging, settings.log_level.upper()))
+
+    _queue_listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _queue_listener.start()
+
     # 设置第三方库日志级别
     logging.getLogger("uvicorn").setLevel(logging.INFO)
     logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
     logging.getLogger("alembic").setLevel(logging.INFO)
 
+def shutdown_logging() -> None:
+    """停止日志监听线程并刷新剩余日志，恢复配置前的根日志处理器"""
+    global _queue_listener, _queue_handler, _original_handlers
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+    if _queue_handler is not None:
+        root = logging.getLogger()
+        root.removeHandler(_queue_handler)
+        _queue_handler = None
+        for handler in _original_handlers or []:
+            root.addHandler(handler)
+        _original_handlers = None
+
+atexit.register(shutdown_logging)
+
 def get_logger(name: str) -> logging.Logger:
     """获取指定名称的logger"""
     return logging.getLogger(name)
 
 class RequestLogger:
     """请求日志记录器"""
-    
-    @staticmethod
-    def log_request(method: str, url: str, user_id: str = None, tenant_id: str = None):
-        """记录请求日志"""
-        logger = get_logger("request")
-        logger.info(f"Request: {method} {url} - User: {user_id} - Tenant: {tenant_id}")
-    
+
     @staticmethod
-    def log_response(status_code: int, processing_time: float):
-        """记录响应日志"""
-        logger = get_logger("response")
-        logger.info(f"Response: {status_code} - Time: {processing_time:.3f}s")
-    
+    def log_access(
+        method: str,
+        route: str,
+        path: str,
+        status_code: int,
+        processing_time: float,
+        user_id: str = None,
+        tenant_id: str = None
+    ):
+        """
+        记录访问日志（请求与响应合并为一条）
+        错误和慢请求总是记录，成功请求按 log_sample_rate 采样
+        """
+        duration_ms = processing_time * 1000
+        is_error = status_code >= 400
+        is_slow = duration_ms >= settings.slow_request_threshold_ms
+        if not (is_error or is_slow) and random.random() >= settings.log_sample_rate:
+            return
+
+        logger = get_logger("access")
+        level = logging.WARNING if status_code >= 500 or is_slow else logging.INFO
+        logger.log(level, f"{method} {path} {status_code} {duration_ms:.1f}ms", extra={
+            "fields": {
+                "method": method,
+                "route": route,
+                "path": path,
+                "status": status_code,
+                "duration_ms": round(duration_ms, 2),
+                "user_id": user_id,
+                "tenant_id": tenant_id,
+                "slow": is_slow,
+            }
+        })
+
     @staticmethod
     def log_error(error: Exception, context: Dict[str, Any] = None):
         """记录错误日志"""
         logger = get_logger("error")
         context_str = f" - Context: {context}" if context else ""
-        logger.error(f"Error: {str(error)}{context_str}", exc_info=True)
+        logger.error(f"Error: {str(error)}{context_str}", exc_info=True, extra={"fields": context or {}})
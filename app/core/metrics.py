@@ -0,0 +1,176 @@
+"""
+Prometheus指标注册表
+统一定义请求、认证提供商、数据库、Redis缓存及连接池相关指标
+
+多进程部署（uvicorn --workers / gunicorn）时，需在进程启动前设置环境变量
+PROMETHEUS_MULTIPROC_DIR 指向一个共享的空目录，各worker会把指标写入该目录下的
+mmap文件，抓取时由 MultiProcessCollector 汇总；gunicorn 还应在 child_exit 钩子中
+调用 prometheus_client.multiprocess.mark_process_dead(worker.pid)。
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 延迟分桶（秒），覆盖从亚毫秒级缓存操作到秒级第三方调用
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "auth_http_request_duration_seconds",
+    "HTTP请求处理耗时（按路由模板和状态码）",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROVIDER_REQUEST_DURATION = Histogram(
+    "auth_provider_request_duration_seconds",
+    "第三方认证提供商调用耗时",
+    ["provider", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROVIDER_ERRORS = Counter(
+    "auth_provider_errors_total",
+    "第三方认证提供商调用失败次数",
+    ["provider"],
+)
+
+DB_STATEMENT_DURATION = Histogram(
+    "auth_db_statement_duration_seconds",
+    "SQL语句执行耗时（_count即语句数）",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_POOL_WAIT = Histogram(
+    "auth_db_pool_wait_seconds",
+    "从连接池获取连接的耗时（含排队等待与新建连接）",
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "auth_db_pool_checked_out",
+    "当前已借出的数据库连接数",
+    multiprocess_mode="livesum",
+)
+
+CACHE_OPERATION_DURATION = Histogram(
+    "auth_cache_operation_duration_seconds",
+    "Redis缓存操作耗时",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+CACHE_REQUESTS = Counter(
+    "auth_cache_requests_total",
+    "缓存读取结果计数（hit/miss/error）",
+    ["result"],
+)
+
+ADMISSION_SHED = Counter(
+    "auth_admission_shed_total",
+    "过载时被拒绝的低优先级请求数",
+    ["route", "reason"],
+)
+
+IDEMPOTENCY_REQUESTS = Counter(
+    "auth_idempotency_requests_total",
+    "携带Idempotency-Key的请求数（executed/replayed/inactive/in_progress/mismatch/unavailable）",
+    ["route", "outcome"],
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "auth_admission_in_flight",
+    "进行中的HTTP请求数",
+    multiprocess_mode="livesum",
+)
+
+EVENT_LOOP_LAG = Gauge(
+    "auth_event_loop_lag_seconds",
+    "事件循环调度延迟（平滑值）",
+    multiprocess_mode="livemax",
+)
+
+TOKEN_REVOCATION_CHECKS = Counter(
+    "auth_token_revocation_checks_total",
+    "令牌吊销检查次数（local为进程内完成，其余需查询Redis）",
+    ["result"],
+)
+
+_STATEMENT_TYPES = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def _statement_type(statement: str) -> str:
+    """提取SQL语句类型，保持标签基数可控"""
+    head = statement.lstrip()[:10].split(None, 1)
+    keyword = head[0].upper() if head else ""
+    return keyword if keyword in _STATEMENT_TYPES else "OTHER"
+
+
+@contextmanager
+def track_latency(histogram: Histogram, *labels: str):
+    """记录代码块耗时到指定直方图"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(*labels) if labels else histogram
+        target.observe(time.perf_counter() - start)
+
+
+def observe_request(method: str, route: str, status: int, duration: float) -> None:
+    """记录一次HTTP请求耗时"""
+    HTTP_REQUEST_DURATION.labels(method, route, str(status)).observe(duration)
+
+
+def observe_pool_wait(duration: float) -> None:
+    """记录一次连接池取连接耗时"""
+    DB_POOL_WAIT.observe(duration)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """为数据库引擎挂载语句耗时与连接借还事件"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_time = getattr(context, "_metrics_start_time", None)
+        if start_time is not None:
+            DB_STATEMENT_DURATION.labels(_statement_type(statement)).observe(
+                time.perf_counter() - start_time
+            )
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """以Prometheus文本格式导出指标，多进程模式下汇总所有worker"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,13 +1,27 @@
+import asyncio
+import hashlib
+import json
+import logging
 import time
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from jose import JWTError
 
 from .config import settings
 from .logging import RequestLogger
 from .cache import get_cache
+from .admission import get_admission_controller
+from .idempotency import get_idempotency_store
+from .metrics import ADMISSION_SHED, IDEMPOTENCY_REQUESTS, observe_request
+from .query_stats import begin_request_stats, end_request_stats
+from .security import PrincipalCache, check_principal, decode_token, load_principal, principal_cache
+
+logger = logging.getLogger(__name__)
 
 # 限流器配置
 limiter = Limiter(
@@ -15,87 +29,424 @@ limiter = Limiter(
     default_limits=[f"{settings.max_requests_per_minute}/minute", f"{settings.max_requests_per_hour}/hour"]
 )
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """请求日志中间件"""
-    
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # 记录请求
-        user_id = getattr(request.state, 'user_id', None)
-        tenant_id = getattr(request.state, 'tenant_id', None)
-        RequestLogger.log_request(
-            request.method, 
-            str(request.url), 
-            user_id, 
-            tenant_id
-        )
-        
+def _route_template(scope: Scope) -> str:
+    """获取匹配到的路由模板（路由匹配后写入scope），避免以原始URL作为指标标签"""
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # 新版FastAPI不再为include_router复制路由，scope中的route不含前缀，完整模板位于有效路由上下文
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(context, "path", None) or route.path
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    """读取请求头（name需为小写）"""
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value
+    return None
+
+class RequestLoggingMiddleware:
+    """
+    请求日志与计时中间件（纯ASGI实现）
+    只包装send以获取状态码并追加响应头，不缓冲响应体
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+        query_stats, stats_token = begin_request_stats()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", str(time.perf_counter() - start_time))
+                if settings.db_debug_headers or settings.debug:
+                    headers.append("X-DB-Queries", str(query_stats.count))
+                    headers.append("X-DB-Time", f"{query_stats.duration * 1000:.2f}")
+            await send(message)
+
         try:
-            response = await call_next(request)
-            processing_time = time.time() - start_time
-            
-            # 记录响应
-            RequestLogger.log_response(response.status_code, processing_time)
-            
-            # 添加响应头
-            response.headers["X-Process-Time"] = str(processing_time)
-            
-            return response
-            
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
+            route = _route_template(scope)
+            state = scope.get("state", {})
+            observe_request(scope["method"], route, 500, processing_time)
             RequestLogger.log_error(e, {
-                "method": request.method,
-                "url": str(request.url),
-                "processing_time": processing_time
+                "method": scope["method"],
+                "route": route,
+                "path": scope["path"],
+                "duration_ms": round(processing_time * 1000, 2),
+                "user_id": state.get("user_id"),
+                "tenant_id": state.get("tenant_id")
             })
             raise
+        else:
+            processing_time = time.perf_counter() - start_time
+            route = _route_template(scope)
+            state = scope.get("state", {})
+            # 记录访问日志（用户与租户由认证依赖写入request.state）
+            RequestLogger.log_access(
+                scope["method"],
+                route,
+                scope["path"],
+                status_code,
+                processing_time,
+                state.get("user_id"),
+                state.get("tenant_id")
+            )
+            observe_request(scope["method"], route, status_code, processing_time)
+        finally:
+            end_request_stats(query_stats, stats_token, _route_template(scope))
+
+class AdmissionControlMiddleware:
+    """
+    准入控制中间件（纯ASGI实现）
+    统计进行中请求数；过载时直接拒绝低优先级请求，不进入路由与数据库
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.controller = get_admission_controller()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.admission_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        self.controller.ensure_monitor()
+        method, path = scope["method"], scope["path"]
+        if self.controller.is_low_priority(method, path):
+            reason = self.controller.overload_reason()
+            if reason is not None:
+                ADMISSION_SHED.labels(f"{method} {path.rstrip('/')}", reason).inc()
+                response = JSONResponse(
+                    {"detail": "Service overloaded, please retry later"},
+                    status_code=503,
+                    headers={"Retry-After": str(settings.admission_retry_after_seconds)}
+                )
+                await response(scope, receive, send)
+                return
 
-class CacheMiddleware(BaseHTTPMiddleware):
-    """缓存中间件"""
-    
-    async def dispatch(self, request: Request, call_next):
+        self.controller.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.leave()
+
+class CacheMiddleware:
+    """
+    响应缓存中间件（纯ASGI实现）
+    响应边发送边收集，仅在需要写入缓存时缓冲响应体
+    """
+
+    # 不缓存的接口
+    # 用户资料与兴趣画像由服务层读穿缓存并在写入时失效，这里不再缓存整段响应
+    # /user/me 包含资料与兴趣画像，且须在每次请求时校验令牌（注销、吊销、冻结即时生效）
+    # 管理、内部与运营分析接口按密钥头鉴权，缓存键不含密钥，缓存后无密钥的请求也会命中
+    skip_paths = (
+        "/health", "/metrics", "/docs", "/openapi", "/user/profile", "/user/interests", "/user/me",
+        "/admin", "/internal", "/analytics"
+    )
+    # 携带这些请求头的请求不缓存（按密钥鉴权的接口）
+    skip_headers = (b"x-admin-key", b"x-internal-key")
+    # 超过该大小的响应不缓存，避免占用过多内存
+    max_body_size = 1024 * 1024
+    # 按请求计算的响应头不缓存，命中时不返回首次请求的耗时与SQL统计
+    per_request_headers = ("x-process-time", "x-db-queries", "x-db-time")
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _cache_key(self, scope: Scope) -> str:
+        """缓存键包含查询参数和认证头摘要，避免不同用户共享缓存"""
+        query = scope.get("query_string", b"").decode("latin-1")
+        authorization = _header(scope, b"authorization") or b""
+        auth_digest = hashlib.sha1(authorization).hexdigest()[:16] if authorization else "anon"
+        return f"response:{scope['method']}:{scope['path']}?{query}:{auth_digest}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         # 只对GET请求进行缓存
-        if request.method != "GET":
-            return await call_next(request)
-        
-        # 跳过健康检查等不需要缓存的接口
-        if any(path in str(request.url) for path in ["/health", "/metrics", "/docs", "/openapi"]):
-            return await call_next(request)
-        
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        # 跳过健康检查等不需要缓存的接口，以及携带管理/内部密钥的请求
+        if (any(path in scope["path"] for path in self.skip_paths)
+                or any(_header(scope, name) is not None for name in self.skip_headers)):
+            await self.app(scope, receive, send)
+            return
+
         cache = get_cache()
-        cache_key = f"response:{request.method}:{request.url}"
-        
+        cache_key = self._cache_key(scope)
+
         # 尝试从缓存获取
         cached_response = cache.get(cache_key)
         if cached_response:
-            return Response(
-                content=cached_response["content"],
-                status_code=cached_response["status_code"],
-                headers={"X-Cache": "HIT", **cached_response.get("headers", {})}
+            headers = [
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in cached_response.get("headers", [])
+            ]
+            headers.append((b"x-cache", b"HIT"))
+            await send({
+                "type": "http.response.start",
+                "status": cached_response["status_code"],
+                "headers": headers,
+            })
+            await send({
+                "type": "http.response.body",
+                "body": cached_response["content"].encode("utf-8"),
+            })
+            return
+
+        capture: Dict[str, Any] = {"enabled": False, "headers": [], "chunks": [], "size": 0}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # 只缓存成功响应
+                if message["status"] == 200:
+                    capture["enabled"] = True
+                    capture["headers"] = [
+                        (name.decode("latin-1"), value.decode("latin-1"))
+                        for name, value in message.get("headers", [])
+                        if name.lower().decode("latin-1") not in self.per_request_headers
+                    ]
+                    MutableHeaders(scope=message).append("X-Cache", "MISS")
+            elif message["type"] == "http.response.body" and capture["enabled"]:
+                body = message.get("body", b"")
+                capture["size"] += len(body)
+                if capture["size"] > self.max_body_size:
+                    capture["enabled"] = False
+                    capture["chunks"] = []
+                else:
+                    capture["chunks"].append(body)
+                    if not message.get("more_body", False):
+                        self._store(cache, cache_key, capture["headers"], capture["chunks"])
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _store(self, cache, cache_key: str, headers: List, chunks: List[bytes]) -> None:
+        """写入缓存"""
+        try:
+            content = b"".join(chunks).decode("utf-8")
+        except UnicodeDecodeError:
+            return
+        cache.set(cache_key, {
+            "content": content,
+            "status_code": 200,
+            "headers": headers
+        }, ttl=settings.cache_ttl_seconds)
+
+class IdempotencyMiddleware:
+    """
+    幂等键中间件（纯ASGI实现）
+    对配置的写接口，携带 Idempotency-Key 的请求按 租户/用户/幂等键 去重：
+    - 已有保存的响应时直接返回（响应头 Idempotent-Replayed: true），不再执行接口
+    - 同一幂等键的请求正在处理时等待其完成；首个请求失败时由等待者重新执行，等待超时返回409
+    - 同一用户的同一幂等键用于不同的请求体时返回422
+    - 未认证的登录请求按请求体区分调用方：不同客户端选用相同的幂等键互不影响，请求体不同时各自执行
+    - 用户已冻结或注销时不返回保存的响应，交由接口拒绝
+    只保存2xx响应；Redis不可用时直接执行接口；Redis调用在线程池中执行，不阻塞事件循环
+    """
+
+    max_key_length = 255
+    # 超过该大小的响应不保存
+    max_body_size = 256 * 1024
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.store = get_idempotency_store()
+        self.routes = {tuple(rule.split(" ", 1)) for rule in settings.idempotency_routes}
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks, more_body = [], True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        return b"".join(chunks)
+
+    @staticmethod
+    def _scope_id(scope: Scope, body: bytes, fingerprint: str) -> Tuple[Optional[str], Optional[dict]]:
+        """
+        幂等键作用域与令牌声明：已认证请求为 租户:用户
+        未认证的登录请求没有用户，以请求指纹区分调用方，为 租户:anon-指纹（声明为None）
+        令牌无效时作用域为None
+        """
+        authorization = _header(scope, b"authorization")
+        if authorization:
+            scheme, _, token = authorization.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None, None
+            try:
+                claims = decode_token(token)
+            except JWTError:
+                return None, None
+            return f"{claims.get('tenant_id') or 'default'}:{claims['sub']}", claims
+        try:
+            tenant_id = json.loads(body).get("tenant_id")
+        except (ValueError, AttributeError):
+            tenant_id = None
+        header_tenant = _header(scope, b"x-tenant-id")
+        tenant = tenant_id or (header_tenant.decode("latin-1") if header_tenant else "default")
+        return f"{tenant}:anon-{fingerprint[:32]}", None
+
+    def _try_claim(self, record_key: str):
+        record = self.store.get(record_key)
+        if record is not None:
+            return "replay", record
+        token = self.store.acquire(record_key)
+        if token is not None:
+            return "execute", token
+        return "in_progress", None
+
+    async def _claim(self, record_key: str):
+        """返回 ("replay", 已保存的响应) / ("execute", 锁令牌) / ("in_progress", None)"""
+        deadline = time.monotonic() + settings.idempotency_wait_seconds
+        while True:
+            outcome, value = await asyncio.to_thread(self._try_claim, record_key)
+            if outcome != "in_progress" or time.monotonic() >= deadline:
+                return outcome, value
+            await asyncio.sleep(settings.idempotency_poll_interval)
+
+    @staticmethod
+    async def _principal_active(claims: dict) -> bool:
+        """令牌对应的用户是否仍为正常状态（与令牌校验共用主体缓存）"""
+        principal = principal_cache.get(claims["sub"])
+        if principal is PrincipalCache.MISSING:
+            principal = await asyncio.to_thread(load_principal, claims)
+        try:
+            check_principal(principal)
+        except JWTError:
+            return False
+        return True
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.idempotency_enabled:
+            await self.app(scope, receive, send)
+            return
+        route = (scope["method"], scope["path"].rstrip("/"))
+        idempotency_key = _header(scope, b"idempotency-key")
+        if route not in self.routes or idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        route_label = " ".join(route)
+        if not idempotency_key or len(idempotency_key) > self.max_key_length:
+            response = JSONResponse(
+                {"detail": f"Idempotency-Key must be 1-{self.max_key_length} characters"}, status_code=400
             )
-        
-        # 执行请求
-        response = await call_next(request)
-        
-        # 缓存成功响应
-        if response.status_code == 200:
-            response_body = b""
-            async for chunk in response.body_iterator:
-                response_body += chunk
-            
-            cache.set(cache_key, {
-                "content": response_body.decode(),
-                "status_code": response.status_code,
-                "headers": dict(response.headers)
-            }, ttl=settings.cache_ttl_seconds)
-            
-            # 重新创建响应
-            return Response(
-                content=response_body,
-                status_code=response.status_code,
-                headers={"X-Cache": "MISS", **dict(response.headers)}
+            await response(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        replayed = False
+
+        async def replay_receive() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        fingerprint = hashlib.sha256(body).hexdigest()
+        scope_id, claims = self._scope_id(scope, body, fingerprint)
+        if scope_id is None:
+            # 令牌无效，由接口返回401
+            await self.app(scope, replay_receive, send)
+            return
+
+        record_key = self.store.record_key(scope_id, *route, idempotency_key.decode("latin-1"))
+        try:
+            outcome, value = await self._claim(record_key)
+        except Exception:
+            IDEMPOTENCY_REQUESTS.labels(route_label, "unavailable").inc()
+            logger.warning(f"Idempotency store unavailable, executing {route_label} without deduplication", exc_info=True)
+            await self.app(scope, replay_receive, send)
+            return
+
+        if outcome == "replay":
+            if value["fingerprint"] != fingerprint:
+                IDEMPOTENCY_REQUESTS.labels(route_label, "mismatch").inc()
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used with a different request body"}, status_code=422
+                )
+                await response(scope, receive, send)
+                return
+            if claims is not None and not await self._principal_active(claims):
+                # 用户已冻结或注销，不返回保存的响应，由接口返回401
+                IDEMPOTENCY_REQUESTS.labels(route_label, "inactive").inc()
+                await self.app(scope, replay_receive, send)
+                return
+            IDEMPOTENCY_REQUESTS.labels(route_label, "replayed").inc()
+            headers = [(name.encode("latin-1"), v.encode("latin-1")) for name, v in value["headers"]]
+            headers.append((b"idempotent-replayed", b"true"))
+            await send({"type": "http.response.start", "status": value["status"], "headers": headers})
+            await send({"type": "http.response.body", "body": value["body"].encode("latin-1")})
+            return
+
+        if outcome == "in_progress":
+            IDEMPOTENCY_REQUESTS.labels(route_label, "in_progress").inc()
+            response = JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"},
+                status_code=409,
+                headers={"Retry-After": str(max(1, round(settings.idempotency_wait_seconds)))}
             )
-        
-        return response
+            await response(scope, receive, send)
+            return
+
+        IDEMPOTENCY_REQUESTS.labels(route_label, "executed").inc()
+        token = value
+        capture: Dict[str, Any] = {"enabled": False, "status": 500, "headers": [], "chunks": [], "size": 0}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                capture["status"] = message["status"]
+                # 只保存2xx响应，其他响应不缓冲响应体
+                capture["enabled"] = 200 <= message["status"] < 300
+                capture["headers"] = [
+                    (name.decode("latin-1"), v.decode("latin-1")) for name, v in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body" and capture["enabled"]:
+                chunk = message.get("body", b"")
+                capture["size"] += len(chunk)
+                if capture["size"] > self.max_body_size:
+                    # 响应过大不保存，丢弃已缓冲的部分
+                    capture["enabled"] = False
+                    capture["chunks"] = []
+                else:
+                    capture["chunks"].append(chunk)
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+            if capture["enabled"]:
+                try:
+                    stored = await asyncio.to_thread(self.store.complete, record_key, token, {
+                        "fingerprint": fingerprint,
+                        "status": capture["status"],
+                        "headers": capture["headers"],
+                        "body": b"".join(capture["chunks"]).decode("latin-1"),
+                    })
+                except Exception:
+                    logger.warning(f"Failed to store idempotent response for {route_label}", exc_info=True)
+        finally:
+            if not stored:
+                try:
+                    await asyncio.to_thread(self.store.release, record_key, token)
+                except Exception:
+                    logger.warning(f"Failed to release idempotency lock for {route_label}", exc_info=True)
@@ -0,0 +1,31 @@
+"""
+键集（seek）分页游标
+游标为排序键最后一行取值的JSON经URL安全Base64编码，对客户端不透明；
+下一页以 (排序键) > (游标值) 定位，翻页耗时与页码无关
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """编码排序键取值（datetime按ISO格式保存）"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """解码游标，格式不正确时抛出ValueError"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
@@ -0,0 +1,136 @@
+"""
+请求级SQL统计
+基于SQLAlchemy引擎事件统计每个请求的语句数与数据库耗时，
+记录慢查询（归一化SQL指纹）并提示疑似N+1查询
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from contextvars import ContextVar, Token
+from typing import Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger("sql")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+class QueryStats:
+    """一次请求（或一段代码）内的SQL统计"""
+
+    __slots__ = ("count", "duration", "fingerprints")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, fingerprint: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint] += 1
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# assert_max_queries 注册的全局统计，跨线程生效（TestClient在独立线程中运行应用）
+_global_trackers: Set[QueryStats] = set()
+_global_trackers_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def fingerprint_sql(statement: str) -> str:
+    """归一化SQL：去除字面量和参数差异，便于聚合同类语句（SQLAlchemy语句文本可复用，结果缓存）"""
+    normalized = _STRING_RE.sub("?", statement)
+    normalized = _PLACEHOLDER_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("(?)", normalized)
+    return _WHITESPACE_RE.sub(" ", normalized).strip()
+
+
+def begin_request_stats() -> Tuple[QueryStats, Token]:
+    """为当前请求开启SQL统计"""
+    stats = QueryStats()
+    return stats, _current_stats.set(stats)
+
+
+def end_request_stats(stats: QueryStats, token: Token, route: str) -> None:
+    """结束当前请求的SQL统计，并检查疑似N+1查询"""
+    _current_stats.reset(token)
+    if not stats.fingerprints:
+        return
+    fingerprint, repeats = stats.fingerprints.most_common(1)[0]
+    if repeats >= settings.n_plus_one_threshold:
+        logger.warning(
+            f"Possible N+1 query on {route}: {repeats}x {fingerprint} "
+            f"({stats.count} queries, {stats.duration * 1000:.1f}ms)"
+        )
+
+
+def get_request_stats() -> Optional[QueryStats]:
+    """获取当前请求的SQL统计"""
+    return _current_stats.get()
+
+
+@contextmanager
+def assert_max_queries(max_queries: int):
+    """
+    测试辅助：断言代码块内执行的SQL语句数不超过上限
+
+    用法：
+        with assert_max_queries(3):
+            client.post("/api/user/login", json={"device_id": "d1"})
+    """
+    stats = QueryStats()
+    with _global_trackers_lock:
+        _global_trackers.add(stats)
+    try:
+        yield stats
+    finally:
+        with _global_trackers_lock:
+            _global_trackers.discard(stats)
+    if stats.count > max_queries:
+        details = "\n".join(f"  {n}x {fp}" for fp, n in stats.fingerprints.most_common())
+        raise AssertionError(f"Expected at most {max_queries} queries, got {stats.count}:\n{details}")
+
+
+def instrument_engine(engine: Engine) -> None:
+    """为数据库引擎挂载请求级SQL统计与慢查询日志"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_stats_start_time = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start_time = getattr(context, "_query_stats_start_time", None)
+        if start_time is None:
+            return
+        duration = time.perf_counter() - start_time
+        stats = _current_stats.get()
+        slow = duration * 1000 >= settings.slow_query_threshold_ms
+        if stats is None and not _global_trackers and not slow:
+            return
+
+        fingerprint = fingerprint_sql(statement)
+        if stats is not None:
+            stats.record(fingerprint, duration)
+        if _global_trackers:
+            with _global_trackers_lock:
+                for tracker in _global_trackers:
+                    tracker.record(fingerprint, duration)
+        if slow:
+            logger.warning(f"Slow query ({duration * 1000:.1f}ms): {fingerprint}")
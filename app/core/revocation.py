@@ -0,0 +1,229 @@
+"""
+令牌吊销
+- 单个令牌：按 jti 吊销（退出登录），记录保留到令牌过期
+- 用户级水位：签发时间早于水位的该用户令牌全部失效（退出所有设备、管理员吊销）
+
+Redis 存储：
+- revoked:jti:{jti}        单个令牌吊销标记，TTL为令牌剩余有效期
+- revoked:jtis             有序集合 jti -> exp，用于各进程全量同步
+- revoked:watermarks       有序集合 user_id -> 水位时间戳
+- 频道 revocations         吊销事件广播
+
+每个进程在本地维护 jti 布隆过滤器与水位字典，由后台线程订阅广播增量更新并定期全量同步。
+校验令牌时水位比较与过滤器查询均在进程内完成，仅过滤器命中（已吊销或误判）时回查Redis。
+"""
+
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+from .cache import get_cache
+from .config import settings
+from .metrics import TOKEN_REVOCATION_CHECKS
+from .tenants import get_tenant_registry
+
+logger = logging.getLogger(__name__)
+
+REVOKED_JTIS_KEY = "revoked:jtis"
+WATERMARKS_KEY = "revoked:watermarks"
+REVOCATION_CHANNEL = "revocations"
+
+
+def _jti_key(jti: str) -> str:
+    return f"revoked:jti:{jti}"
+
+
+class _BloomFilter:
+    """布隆过滤器（双重哈希）"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationCache:
+    """进程内吊销视图"""
+
+    def __init__(self):
+        self._bloom = self._new_bloom(0)
+        self._watermarks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._resync_due = 0.0
+
+    @staticmethod
+    def _new_bloom(expected: int) -> _BloomFilter:
+        return _BloomFilter(max(settings.revocation_bloom_capacity, expected * 2), settings.revocation_bloom_error_rate)
+
+    # ---- 本地视图 ----
+
+    def _apply_jti(self, jti: str) -> None:
+        bloom = self._bloom
+        bloom.add(jti)
+        if bloom.count > bloom.capacity:
+            # 超出容量后误判率上升，提前全量同步重建（同时清除已过期的jti）
+            self._resync_due = 0.0
+
+    def _apply_watermark(self, user_id: str, watermark: float) -> None:
+        with self._lock:
+            if watermark > self._watermarks.get(user_id, 0.0):
+                self._watermarks[user_id] = watermark
+
+    def is_revoked(self, claims: dict) -> bool:
+        """判断令牌是否已吊销（claims为已校验签名的令牌声明）"""
+        if not settings.token_revocation_enabled:
+            return False
+        self.ensure_running()
+
+        watermark = self._watermarks.get(claims.get("sub"))
+        if watermark is not None and float(claims.get("iat", 0)) < watermark:
+            TOKEN_REVOCATION_CHECKS.labels(result="watermark").inc()
+            return True
+        jti = claims.get("jti")
+        if jti is None or jti not in self._bloom:
+            TOKEN_REVOCATION_CHECKS.labels(result="local").inc()
+            return False
+        try:
+            revoked = bool(get_cache().redis_client.exists(_jti_key(jti)))
+        except Exception as e:
+            # 无法确认时按已吊销处理（过滤器命中本身概率很低）
+            logger.warning(f"Failed to confirm revoked token {jti}: {e}")
+            revoked = True
+        TOKEN_REVOCATION_CHECKS.labels(result="revoked" if revoked else "false_positive").inc()
+        return revoked
+
+    # ---- 吊销 ----
+
+    def revoke_token(self, jti: str, expires_at: float) -> None:
+        """吊销单个令牌，Redis写入失败时抛出异常（本地已生效）"""
+        self._apply_jti(jti)
+        ttl = int(expires_at - time.time()) + 1
+        if ttl <= 0:
+            return
+        pipe = get_cache().redis_client.pipeline(transaction=False)
+        pipe.set(_jti_key(jti), 1, ex=ttl)
+        pipe.zadd(REVOKED_JTIS_KEY, {jti: expires_at})
+        pipe.publish(REVOCATION_CHANNEL, json.dumps({"jti": jti}))
+        pipe.execute()
+
+    def revoke_user(self, user_id: str, before: Optional[float] = None) -> float:
+        """吊销用户在 before（默认当前时间）之前签发的全部令牌，返回水位"""
+        watermark = time.time() if before is None else before
+        self._apply_watermark(user_id, watermark)
+        pipe = get_cache().redis_client.pipeline(transaction=False)
+        pipe.zadd(WATERMARKS_KEY, {user_id: watermark}, gt=True)
+        pipe.publish(REVOCATION_CHANNEL, json.dumps({"user_id": user_id, "watermark": watermark}))
+        pipe.execute()
+        return watermark
+
+    # ---- 同步 ----
+
+    def resync(self) -> None:
+        """从Redis全量加载，重建过滤器并清理已过期的记录"""
+        client = get_cache().redis_client
+        now = time.time()
+        # 水位早于最长令牌有效期的记录已无意义
+        watermark_floor = now - get_tenant_registry().max_token_ttl().total_seconds()
+        pipe = client.pipeline(transaction=False)
+        pipe.zremrangebyscore(REVOKED_JTIS_KEY, "-inf", now)
+        pipe.zremrangebyscore(WATERMARKS_KEY, "-inf", watermark_floor)
+        pipe.zrange(REVOKED_JTIS_KEY, 0, -1)
+        pipe.zrange(WATERMARKS_KEY, 0, -1, withscores=True)
+        _, _, jtis, watermarks = pipe.execute()
+
+        bloom = self._new_bloom(len(jtis))
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            # 保留本进程刚写入、尚未同步到Redis的水位
+            merged = {user_id: float(score) for user_id, score in watermarks}
+            for user_id, watermark in self._watermarks.items():
+                if watermark > max(merged.get(user_id, 0.0), watermark_floor):
+                    merged[user_id] = watermark
+            self._watermarks = merged
+        self._bloom = bloom
+
+    def _handle_message(self, data: str) -> None:
+        event = json.loads(data)
+        if "jti" in event:
+            self._apply_jti(event["jti"])
+        elif "user_id" in event:
+            self._apply_watermark(event["user_id"], float(event["watermark"]))
+
+    def _run(self) -> None:
+        """订阅吊销广播；断线重连后先全量同步，补上断线期间的事件"""
+        backoff = 1.0
+        while not self._stopping.is_set():
+            pubsub = None
+            try:
+                pubsub = get_cache().redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REVOCATION_CHANNEL)
+                self.resync()
+                backoff = 1.0
+                self._resync_due = time.monotonic() + settings.revocation_resync_seconds
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        self._handle_message(message["data"])
+                    if time.monotonic() >= self._resync_due:
+                        self.resync()
+                        self._resync_due = time.monotonic() + settings.revocation_resync_seconds
+            except Exception as e:
+                logger.warning(f"Revocation sync unavailable, retrying in {backoff:.0f}s: {e}")
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def ensure_running(self) -> None:
+        """启动后台同步线程（每个进程一次）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._resync_due = time.monotonic() + settings.revocation_resync_seconds
+                self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止后台同步线程（应用关闭时调用）"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+
+revocation_cache = RevocationCache()
+
+
+def get_revocation_cache() -> RevocationCache:
+    """获取令牌吊销视图实例"""
+    return revocation_cache
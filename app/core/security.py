@@ -1,5 +1,11 @@
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from fastapi import Depends, HTTPException, status
+from typing import Optional, Sequence
+from fastapi import Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -7,7 +13,9 @@ from sqlalchemy.orm import Session
 
 from .config import settings
 from ..models import user as user_model
-from ..core.database import get_db
+from ..core.database import get_read_db
+from ..core.revocation import get_revocation_cache
+from ..core.sharding import get_tenant_db, shard_router
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -19,25 +27,118 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # jti 用于吊销单个令牌，iat（毫秒精度）用于与用户吊销水位比较
+    to_encode.update({"exp": expire, "iat": round(time.time(), 3), "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> user_model.UserCore:
+def decode_token(token: str) -> dict:
+    """校验签名、有效期与吊销状态，返回令牌声明；无效时抛出JWTError"""
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    if payload.get("sub") is None:
+        raise JWTError("Missing subject")
+    if get_revocation_cache().is_revoked(payload):
+        raise JWTError("Token revoked")
+    return payload
+
+def authenticate(request: Request, token: str, db: Session, options: Sequence = ()) -> user_model.UserCore:
+    """校验令牌并查询用户；options 为查询加载选项，用于在同一次查询中带出关联数据"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无法验证凭据",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
+        payload = decode_token(token)
     except JWTError:
         raise credentials_exception
+    user_id: str = payload["sub"]
     
-    user = db.query(user_model.UserCore).filter(user_model.UserCore.user_id == user_id).first()
-    if user is None:
+    user = db.query(user_model.UserCore).options(*options).filter(user_model.UserCore.user_id == user_id).first()
+    if user is None or user.status != user_model.UserStatus.ACTIVE:
         raise credentials_exception
+    # 供访问日志使用
+    request.state.user_id = user.user_id
+    request.state.tenant_id = user.tenant_id
+    # 供退出登录等接口使用
+    request.state.token_claims = payload
     return user
+
+class PrincipalCache:
+    """
+    用户主体缓存（进程内，LRU + TTL）
+    缓存 UserCoreResponse 结构的dict，供只需身份信息、不需要ORM对象的校验方使用；
+    用户不存在同样缓存。吊销在每次校验时基于令牌声明判断，不受缓存影响，
+    状态变更（冻结、删除）最多延迟 principal_cache_ttl_seconds 生效
+    """
+
+    MISSING = object()
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str):
+        """返回缓存的主体（用户不存在时为None），未命中返回 PrincipalCache.MISSING"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                return self.MISSING
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id: str, principal: Optional[dict]) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + settings.principal_cache_ttl_seconds, principal)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.principal_cache_max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+principal_cache = PrincipalCache()
+
+def load_principal(claims: dict) -> Optional[dict]:
+    """从用户所在分片加载主体并写入缓存（缓存未命中时调用，含数据库I/O）"""
+    user_id = claims["sub"]
+    db = shard_router.session_for_tenant(claims.get("tenant_id"))
+    try:
+        user = db.query(user_model.UserCore).filter(user_model.UserCore.user_id == user_id).first()
+        principal = user_model.UserCoreResponse.model_validate(user).model_dump(mode="json") if user else None
+    finally:
+        db.close()
+    principal_cache.set(user_id, principal)
+    return principal
+
+def check_principal(principal: Optional[dict]) -> dict:
+    """主体不存在或非正常状态时抛出JWTError"""
+    if principal is None or principal["status"] != user_model.UserStatus.ACTIVE.value:
+        raise JWTError("Inactive user")
+    return principal
+
+def verify_principal(token: str) -> dict:
+    """校验令牌并返回用户主体（与get_current_user使用相同的令牌校验逻辑）"""
+    claims = decode_token(token)
+    principal = principal_cache.get(claims["sub"])
+    if principal is PrincipalCache.MISSING:
+        principal = load_principal(claims)
+    return check_principal(principal)
+
+def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_tenant_db)) -> user_model.UserCore:
+    return authenticate(request, token, db)
+
+def get_current_reader(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)) -> user_model.UserCore:
+    """只读接口使用，用户查询可路由到只读副本"""
+    return authenticate(request, token, db)
+
+def require_admin(x_admin_key: Optional[str] = Header(None)) -> None:
+    """管理接口鉴权：校验 X-Admin-Key 请求头（未配置 admin_api_key 时管理接口不可用）"""
+    if not settings.admin_api_key or not x_admin_key or not secrets.compare_digest(x_admin_key, settings.admin_api_key):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+
+def require_internal(x_internal_key: Optional[str] = Header(None)) -> None:
+    """内部服务接口鉴权：校验 X-Internal-Key 请求头（未配置 internal_api_key 时内部接口不可用）"""
+    if not settings.internal_api_key or not x_internal_key or not secrets.compare_digest(x_internal_key, settings.internal_api_key):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal access required")
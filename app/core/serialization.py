@@ -0,0 +1,44 @@
+"""
+热点接口快速序列化（fast_serialization=true 时启用）
+默认路径由FastAPI按response_model对返回值做校验（ORM对象需from_attributes逐字段读取与校验）再编码；
+快速路径面向本服务自己加载、结构已知的数据：
+- RowSerializer 按响应模型的字段列表直接读取ORM对象属性生成dict，不做校验
+- FastJSONResponse 使用orjson编码（未安装时退化为预编译的pydantic TypeAdapter）
+接口直接返回Response时FastAPI不再处理response_model，OpenAPI文档仍以response_model为准
+"""
+
+from typing import Any, Type
+
+from pydantic import BaseModel, TypeAdapter
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+_ANY_ADAPTER = TypeAdapter(Any)
+
+
+def dumps(content: Any) -> bytes:
+    """编码为JSON（datetime为ISO格式，枚举取值，与默认路径输出一致）"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return _ANY_ADAPTER.dump_json(content)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RowSerializer:
+    """按响应模型字段直接读取对象属性（数据由本服务加载，跳过校验）"""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.fields = tuple(model.model_fields)
+
+    def __call__(self, obj: Any) -> dict:
+        return {field: getattr(obj, field) for field in self.fields}
@@ -0,0 +1,159 @@
+"""
+按租户分库
+维护租户到分片的映射，每个分片拥有独立的引擎与连接池
+
+分片映射优先级：
+1. Redis哈希 tenant:shard_map（租户迁移工具写入，进程内定期刷新）
+2. 配置项 tenant_shard_map（静态指定）
+3. 放置策略 shard_placement（hash / default，可通过 register_placement 扩展）
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .cache import get_cache
+from .config import settings
+from .database import SessionLocal, _create_engine, engine, token_claims
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD = "default"
+SHARD_MAP_KEY = "tenant:shard_map"
+# 迁移切换期间的映射值前缀，此时该租户的请求返回503
+MOVING_PREFIX = "moving:"
+
+
+class ShardPlacement(ABC):
+    """分片放置策略基类"""
+
+    @abstractmethod
+    def shard_for(self, tenant_id: str, shards: List[str]) -> str:
+        """为租户选择分片"""
+        pass
+
+
+class DefaultPlacement(ShardPlacement):
+    """未显式映射的租户全部放在默认分片"""
+
+    def shard_for(self, tenant_id: str, shards: List[str]) -> str:
+        return DEFAULT_SHARD
+
+
+class HashPlacement(ShardPlacement):
+    """最高随机权重（rendezvous）哈希：新增分片时只有少量租户需要迁移"""
+
+    def shard_for(self, tenant_id: str, shards: List[str]) -> str:
+        return max(
+            shards,
+            key=lambda shard: hashlib.blake2b(f"{shard}:{tenant_id}".encode(), digest_size=8).digest()
+        )
+
+
+class ShardRouter:
+    """租户分片路由"""
+
+    _placements = {
+        "default": DefaultPlacement,
+        "hash": HashPlacement,
+    }
+
+    def __init__(self):
+        self.engines: Dict[str, Engine] = {DEFAULT_SHARD: engine}
+        self.sessions: Dict[str, sessionmaker] = {DEFAULT_SHARD: SessionLocal}
+        for name, url in settings.database_shards.items():
+            if name == DEFAULT_SHARD:
+                continue
+            shard_engine = _create_engine(url)
+            self.engines[name] = shard_engine
+            self.sessions[name] = sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+
+        placement_class = self._placements.get(settings.shard_placement)
+        if placement_class is None:
+            raise ValueError(f"Unsupported shard placement: {settings.shard_placement}")
+        self.placement = placement_class()
+
+        self._dynamic_map: Dict[str, str] = {}
+        self._dynamic_loaded_at = 0.0
+        self._refresh_lock = threading.Lock()
+
+    @classmethod
+    def register_placement(cls, name: str, placement_class: type) -> None:
+        """注册自定义放置策略"""
+        cls._placements[name] = placement_class
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.engines) > 1
+
+    def _dynamic_mapping(self) -> Dict[str, str]:
+        """读取迁移工具维护的映射（按 shard_map_refresh_seconds 缓存在进程内）"""
+        if time.monotonic() - self._dynamic_loaded_at < settings.shard_map_refresh_seconds:
+            return self._dynamic_map
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self._dynamic_map = get_cache().redis_client.hgetall(SHARD_MAP_KEY) or {}
+            except Exception as e:
+                logger.warning(f"Failed to refresh tenant shard map: {e}")
+            finally:
+                self._dynamic_loaded_at = time.monotonic()
+                self._refresh_lock.release()
+        return self._dynamic_map
+
+    def shard_for_tenant(self, tenant_id: Optional[str]) -> str:
+        """获取租户所在分片名称"""
+        if not self.sharded or not tenant_id:
+            return DEFAULT_SHARD
+        shard = self._dynamic_mapping().get(tenant_id) or settings.tenant_shard_map.get(tenant_id)
+        if shard is None:
+            return self.placement.shard_for(tenant_id, sorted(self.engines))
+        if shard.startswith(MOVING_PREFIX):
+            raise HTTPException(
+                status_code=503,
+                detail="Tenant is being migrated, please retry shortly",
+                headers={"Retry-After": str(settings.shard_map_refresh_seconds)}
+            )
+        if shard not in self.engines:
+            logger.error(f"Tenant {tenant_id} mapped to unknown shard {shard}")
+            return DEFAULT_SHARD
+        return shard
+
+    def session_for_tenant(self, tenant_id: Optional[str]) -> Session:
+        """创建租户所在分片的数据库会话"""
+        return self.sessions[self.shard_for_tenant(tenant_id)]()
+
+
+shard_router = ShardRouter()
+
+
+def tenant_from_request(request: Request) -> Optional[str]:
+    """从令牌声明或 X-Tenant-ID 请求头获取租户（仅用于路由，令牌由get_current_user校验）"""
+    claims = token_claims(request) or {}
+    return claims.get("tenant_id") or request.headers.get("x-tenant-id")
+
+
+@contextmanager
+def tenant_session(tenant_id: Optional[str]):
+    """按租户打开数据库会话（用于租户来自请求体的接口，如登录）"""
+    db = shard_router.session_for_tenant(tenant_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_tenant_db(request: Request):
+    """获取请求所属租户分片的数据库会话"""
+    db = shard_router.session_for_tenant(tenant_from_request(request))
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,211 @@
+"""
+租户注册表
+tenant 表（默认库）保存各租户的认证方式、令牌有效期、登录限流、用户数上限与缓存TTL，
+每个进程持有一份只读快照：
+- 登录路径上的租户查询只读取快照，不产生I/O
+- 后台线程定期轮询 count(*) 与 sum(version)，有变化时重新加载（管理接口修改后本进程立即刷新）
+- 用户数配额在注册时以条件UPDATE增量维护（user_count < max_users 时加一），不执行COUNT
+- 登录限流为进程内令牌桶（与准入控制一致，按进程计算）
+未登记的租户使用全局配置；tenant_registry_enforced=true 时拒绝未登记的租户
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, select, update
+
+from .config import settings
+from .database import SessionLocal
+from ..models import user as user_model
+
+logger = logging.getLogger(__name__)
+
+
+class TenantQuotaExceeded(Exception):
+    """租户用户数已达上限"""
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.refill_per_second = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class TenantRegistry:
+    """租户配置快照"""
+
+    def __init__(self):
+        self._snapshot: Dict[str, user_model.TenantConfig] = {}
+        self._fingerprint: Optional[Tuple[int, int]] = None
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- 快照 ----
+
+    def _load_fingerprint(self, db) -> Tuple[int, int]:
+        row = db.execute(select(
+            func.count(), func.coalesce(func.sum(user_model.Tenant.version), 0)
+        ).select_from(user_model.Tenant)).one()
+        return int(row[0]), int(row[1])
+
+    def refresh(self, force: bool = False) -> bool:
+        """版本有变化时重新加载快照，返回是否重新加载"""
+        db = SessionLocal()
+        try:
+            fingerprint = self._load_fingerprint(db)
+            if not force and fingerprint == self._fingerprint:
+                return False
+            tenants = db.query(user_model.Tenant).all()
+            snapshot = {tenant.tenant_id: user_model.TenantConfig.model_validate(tenant) for tenant in tenants}
+        finally:
+            db.close()
+        with self._lock:
+            # 限流配置变化的租户重建令牌桶
+            self._buckets = {
+                tenant_id: bucket for tenant_id, bucket in self._buckets.items()
+                if tenant_id in snapshot and snapshot[tenant_id].login_rate_per_minute == bucket.capacity
+            }
+            self._snapshot = snapshot
+            self._fingerprint = fingerprint
+        logger.info(f"Tenant registry loaded: {len(snapshot)} tenants")
+        return True
+
+    def _run(self) -> None:
+        while not self._stopping.wait(settings.tenant_registry_poll_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Tenant registry refresh failed: {e}")
+
+    def ensure_running(self) -> None:
+        """首次使用时加载快照并启动轮询线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="tenant-registry", daemon=True)
+            self._thread.start()
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            logger.warning(f"Tenant registry load failed: {e}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止轮询线程（应用关闭时调用）"""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+    # ---- 查询（仅读取快照） ----
+
+    def get(self, tenant_id: str) -> Optional[user_model.TenantConfig]:
+        self.ensure_running()
+        return self._snapshot.get(tenant_id)
+
+    def check_login(self, tenant_id: str, provider: str) -> Optional[user_model.TenantConfig]:
+        """登录前校验租户、认证方式与限流，返回租户配置（未登记时为None）"""
+        tenant = self.get(tenant_id)
+        if tenant is None:
+            if settings.tenant_registry_enforced:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unknown tenant")
+            return None
+        if tenant.allowed_providers is not None and provider not in tenant.allowed_providers:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Provider {provider} is not enabled for this tenant"
+            )
+        if tenant.login_rate_per_minute is not None:
+            with self._lock:
+                bucket = self._buckets.get(tenant_id)
+                if bucket is None:
+                    bucket = self._buckets[tenant_id] = _TokenBucket(tenant.login_rate_per_minute)
+                allowed = bucket.take()
+            if not allowed:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many login requests for this tenant",
+                    headers={"Retry-After": str(max(1, round(60 / tenant.login_rate_per_minute)))}
+                )
+        return tenant
+
+    def token_ttl(self, tenant_id: str) -> timedelta:
+        tenant = self.get(tenant_id)
+        minutes = tenant.access_token_expire_minutes if tenant and tenant.access_token_expire_minutes else settings.ACCESS_TOKEN_EXPIRE_MINUTES
+        return timedelta(minutes=minutes)
+
+    def max_token_ttl(self) -> timedelta:
+        """所有租户中最长的令牌有效期（吊销记录至少保留这么久）"""
+        minutes = [tenant.access_token_expire_minutes for tenant in self._snapshot.values() if tenant.access_token_expire_minutes]
+        return timedelta(minutes=max([settings.ACCESS_TOKEN_EXPIRE_MINUTES, *minutes]))
+
+    def cache_ttl(self, tenant_id: str) -> int:
+        tenant = self.get(tenant_id)
+        return tenant.cache_ttl_seconds if tenant and tenant.cache_ttl_seconds else settings.cache_ttl_seconds
+
+    # ---- 用户数配额 ----
+
+    def reserve_user(self, tenant_id: str) -> None:
+        """注册前占用一个用户名额，已达上限时抛出TenantQuotaExceeded（未登记的租户不计数）"""
+        if self.get(tenant_id) is None:
+            return
+        db = SessionLocal()
+        try:
+            tenant_table = user_model.Tenant
+            result = db.execute(
+                update(tenant_table)
+                .where(tenant_table.tenant_id == tenant_id)
+                .where((tenant_table.max_users.is_(None)) | (tenant_table.user_count < tenant_table.max_users))
+                .values(user_count=tenant_table.user_count + 1)
+            )
+            db.commit()
+        finally:
+            db.close()
+        if result.rowcount == 0:
+            raise TenantQuotaExceeded(tenant_id)
+
+    def release_users(self, tenant_id: str, count: int = 1) -> None:
+        """归还用户名额（注册失败或用户被删除时调用）"""
+        if count <= 0 or self.get(tenant_id) is None:
+            return
+        db = SessionLocal()
+        try:
+            tenant_table = user_model.Tenant
+            db.execute(
+                update(tenant_table)
+                .where(tenant_table.tenant_id == tenant_id)
+                .values(user_count=case(
+                    (tenant_table.user_count > count, tenant_table.user_count - count), else_=0
+                ))
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+tenant_registry = TenantRegistry()
+
+
+def get_tenant_registry() -> TenantRegistry:
+    """获取租户注册表实例"""
+    return tenant_registry
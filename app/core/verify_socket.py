@@ -0,0 +1,161 @@
+"""
+内部令牌校验（Unix域套接字）
+供同机sidecar、网关等高频校验令牌，免去HTTP解析、JSON与TCP开销：
+- 帧格式：4字节大端长度 + msgpack消息
+- 请求：{"id": 任意, "token": "<JWT>"}
+- 响应：{"id": 原样返回, "ok": true, "principal": {...UserCoreResponse}, "exp": 过期时间戳}
+        {"id": 原样返回, "ok": false, "error": "invalid_token" | "bad_request" | "unavailable"}
+- 支持流水线：客户端可连续发送多个请求，响应按请求顺序返回
+
+校验逻辑与 get_current_user 相同（decode_token：签名、有效期、吊销），用户主体先查进程内缓存，
+未命中时在线程池中查库。多worker部署时由持有 {path}.lock 文件锁（flock）的worker绑定并提供服务，
+锁随进程退出自动释放，遗留的套接字文件只由持锁者删除
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import socket
+import struct
+from typing import Any, Optional
+
+from jose import JWTError
+
+from .config import settings
+from .security import PrincipalCache, check_principal, decode_token, load_principal, principal_cache
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，仅启用套接字时需要
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+
+
+def encode_frame(message: Any) -> bytes:
+    body = msgpack.packb(message, use_bin_type=True)
+    return _HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader, max_bytes: int) -> Optional[Any]:
+    """读取一帧，连接正常关闭时返回None；超长帧抛出ValueError"""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > max_bytes:
+        raise ValueError(f"Frame of {length} bytes exceeds limit")
+    return msgpack.unpackb(await reader.readexactly(length), raw=False)
+
+
+async def verify(request: Any) -> dict:
+    """处理一个校验请求"""
+    request_id = request.get("id") if isinstance(request, dict) else None
+    token = request.get("token") if isinstance(request, dict) else None
+    if not isinstance(token, str):
+        return {"id": request_id, "ok": False, "error": "bad_request"}
+    try:
+        claims = decode_token(token)
+        principal = principal_cache.get(claims["sub"])
+        if principal is PrincipalCache.MISSING:
+            principal = await asyncio.to_thread(load_principal, claims)
+        check_principal(principal)
+    except JWTError:
+        return {"id": request_id, "ok": False, "error": "invalid_token"}
+    except Exception as e:
+        logger.error(f"Token verification over socket failed: {e}")
+        return {"id": request_id, "ok": False, "error": "unavailable"}
+    return {"id": request_id, "ok": True, "principal": principal, "exp": claims["exp"]}
+
+
+class VerifySocketServer:
+    """Unix域套接字监听"""
+
+    def __init__(self):
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._path: Optional[str] = None
+        self._lock_fd: Optional[int] = None
+
+    @staticmethod
+    def _acquire_lock(path: str) -> Optional[int]:
+        """获取套接字路径的独占文件锁，已被其他worker持有时返回None"""
+        lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o660)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            return None
+        return lock_fd
+
+    @staticmethod
+    def _release_lock(lock_fd: int) -> None:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+    async def start(self, path: str) -> None:
+        if msgpack is None:
+            logger.error("verify_socket_path is set but msgpack is not installed; socket disabled")
+            return
+        lock_fd = self._acquire_lock(path)
+        if lock_fd is None:
+            logger.info(f"Verify socket {path} is served by another worker")
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # 持锁后路径上的套接字文件只可能是上次异常退出遗留的
+            if os.path.exists(path):
+                os.unlink(path)
+            sock.bind(path)
+            os.chmod(path, 0o660)
+            self._server = await asyncio.start_unix_server(self._handle, sock=sock)
+        except OSError as e:
+            sock.close()
+            self._release_lock(lock_fd)
+            logger.error(f"Failed to bind verify socket {path}: {e}")
+            return
+        self._path = path
+        self._lock_fd = lock_fd
+        logger.info(f"Verify socket listening on {path}")
+
+    async def stop(self) -> None:
+        server, self._server = self._server, None
+        if server is None:
+            return
+        server.close()
+        await server.wait_closed()
+        # 只有持锁的worker删除套接字文件，之后释放锁供其他worker接管
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+        self._release_lock(self._lock_fd)
+        self._lock_fd = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        max_bytes = settings.verify_socket_max_frame_bytes
+        try:
+            while True:
+                request = await read_frame(reader, max_bytes)
+                if request is None:
+                    break
+                writer.write(encode_frame(await verify(request)))
+                # 缓冲未超过高水位时立即返回，流水线请求的响应合并写出
+                await writer.drain()
+        except (ValueError, msgpack.UnpackException) as e:
+            logger.warning(f"Closing verify socket connection: {e}")
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+
+verify_socket_server = VerifySocketServer()
+
+
+def get_verify_socket_server() -> VerifySocketServer:
+    """获取令牌校验套接字实例"""
+    return verify_socket_server
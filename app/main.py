@@ -1,18 +1,26 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from .core.config import settings
-from .core.database import engine
+from .core import lifecycle
 from .core.logging import setup_logging
-from .core.middleware import RequestLoggingMiddleware, CacheMiddleware, limiter
-from .models import user as user_model
-from .api import user_api, health
+from .core.middleware import AdmissionControlMiddleware, IdempotencyMiddleware, RequestLoggingMiddleware, CacheMiddleware, limiter
+from .api import user_api, health, analytics, segments, admin, internal
 
 # 设置日志
 setup_logging()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时建表并预热连接，关闭时释放连接池"""
+    await lifecycle.startup()
+    yield
+    await lifecycle.shutdown()
+
 # 创建FastAPI应用
 app = FastAPI(
     title=settings.app_name,
@@ -21,6 +29,7 @@ app = FastAPI(
     debug=settings.debug,
     docs_url="/docs" if settings.debug else None,
     redoc_url="/redoc" if settings.debug else None,
+    lifespan=lifespan,
 )
 
 # 添加限流器
@@ -36,29 +45,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 添加自定义中间件
+# 添加自定义中间件（后添加的在外层：被拒绝的请求同样记录访问日志与指标）
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(RequestLoggingMiddleware)
 if settings.environment == "production":
     app.add_middleware(CacheMiddleware)
 
-@app.on_event("startup")
-async def startup_event():
-    """应用启动事件"""
-    # 只在开发环境自动创建表，生产环境使用Alembic
-    if settings.environment == "development":
-        user_model.UserCore.metadata.create_all(bind=engine)
-        user_model.UserProfile.metadata.create_all(bind=engine)
-        user_model.UserInterests.metadata.create_all(bind=engine)
-        user_model.UserAppUsage.metadata.create_all(bind=engine)
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """应用关闭事件"""
-    pass
-
 # 注册路由
 app.include_router(health.router, prefix=settings.api_prefix, tags=["系统监控"])
 app.include_router(user_api.router, prefix=f"{settings.api_prefix}/user", tags=["用户管理"])
+app.include_router(analytics.router, prefix=f"{settings.api_prefix}/analytics", tags=["运营分析"])
+app.include_router(segments.router, prefix=f"{settings.api_prefix}/segments", tags=["用户分群"])
+app.include_router(admin.router, prefix=f"{settings.api_prefix}/admin", tags=["用户运维"])
+app.include_router(internal.router, prefix=f"{settings.api_prefix}/internal", tags=["内部接口"])
 
 @app.get("/")
 def read_root():
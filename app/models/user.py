@@ -1,12 +1,16 @@
 import uuid
 from datetime import datetime, date
-from sqlalchemy import Column, String, DateTime, Integer, Float, Enum as SQLAlchemyEnum, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, Float, Enum as SQLAlchemyEnum, ForeignKey, Index, JSON
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from pydantic import BaseModel, Field
 import enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlalchemy.dialects.postgresql import JSONB # For tags JSON
 
+# PostgreSQL使用JSONB，其他数据库（本地SQLite、压测环境）退化为JSON
+JSONType = JSON().with_variant(JSONB, "postgresql")
+
 Base = declarative_base()
 
 class RegisterChannel(str, enum.Enum):
@@ -41,13 +45,37 @@ class UserCore(Base):
     password_hash = Column(String, nullable=True)
     register_channel = Column(SQLAlchemyEnum(RegisterChannel), nullable=False, default=RegisterChannel.DEVICE_ID)
     provider_user_id = Column(String, nullable=True, index=True)  # 第三方平台用户ID
-    provider_data = Column(JSONB, nullable=True)  # 第三方平台原始数据
+    provider_data = Column(JSONType, nullable=True)  # 第三方平台原始数据
     register_time = Column(DateTime, default=datetime.utcnow)
     last_login_time = Column(DateTime, default=datetime.utcnow)
     status = Column(SQLAlchemyEnum(UserStatus), nullable=False, default=UserStatus.ACTIVE)
     device_id = Column(String, nullable=True, index=True)  # 改为可选，支持第三方登录
+    deleted_at = Column(DateTime, nullable=True)  # 注销时间，保留期满后由清理任务删除数据
+
+    # 只读关联，写入仍由服务层显式处理；默认懒加载，按需使用joinedload
+    profile = relationship(
+        "UserProfile",
+        primaryjoin="UserCore.user_id == foreign(UserProfile.user_id)",
+        uselist=False,
+        viewonly=True,
+        back_populates="user"
+    )
+    interests = relationship("UserInterests", uselist=False, viewonly=True, back_populates="user")
     
     __table_args__ = (
+        # 管理端用户列表：租户内按注册时间键集分页
+        Index("ix_user_core_tenant_register", "tenant_id", "register_time", "user_id"),
+        # 注销数据清理：按注销时间键集扫描
+        Index("ix_user_core_status_deleted", "status", "deleted_at", "user_id"),
+        # 管理端邮箱/手机号前缀搜索（LIKE 'prefix%'），仅PostgreSQL
+        Index(
+            "ix_user_core_tenant_email_prefix", "tenant_id", "email",
+            postgresql_ops={"email": "text_pattern_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_user_core_tenant_phone_prefix", "tenant_id", "phone",
+            postgresql_ops={"phone": "text_pattern_ops"}
+        ).ddl_if(dialect="postgresql"),
         # 确保同一租户内的phone/email/device_id唯一
         {'mysql_engine': 'InnoDB'}
     )
@@ -67,6 +95,30 @@ class UserProfile(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    user = relationship(
+        "UserCore",
+        primaryjoin="UserCore.user_id == foreign(UserProfile.user_id)",
+        viewonly=True,
+        back_populates="profile"
+    )
+
+# SQLAlchemy 的 'user_identity' 表模型：一个用户可绑定多个第三方登录身份
+class UserIdentity(Base):
+    __tablename__ = "user_identity"
+
+    identity_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    tenant_id = Column(String, nullable=False, default="default")  # 租户隔离
+    provider = Column(String, nullable=False)  # 认证提供商 (wechat/qq/google/phone/email/apple)
+    provider_user_id = Column(String, nullable=False)  # 第三方平台用户ID
+    user_id = Column(String, ForeignKey("user_core.user_id"), nullable=False, index=True)
+    provider_data = Column(JSONType, nullable=True)  # 绑定时的第三方平台原始数据
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # 登录身份解析：唯一索引一次命中
+        Index("ux_user_identity_provider", "tenant_id", "provider", "provider_user_id", unique=True),
+    )
+
 # 通用化枚举定义
 class InterestCategory(str, enum.Enum):
     EDUCATION = "education"        # 教育学习类
@@ -101,22 +153,41 @@ class UserInterests(Base):
     user_id = Column(String, ForeignKey("user_core.user_id"), primary_key=True)
     tenant_id = Column(String, nullable=False, default="default", index=True)  # 租户隔离
     primary_category = Column(SQLAlchemyEnum(InterestCategory), nullable=True)
-    interest_data = Column(JSONB, nullable=True)  # 灵活的兴趣数据结构
+    interest_data = Column(JSONType, nullable=True)  # 灵活的兴趣数据结构
     preferred_format = Column(SQLAlchemyEnum(ContentFormat), nullable=True)
     schema_version = Column(String, default="1.0")  # 支持schema版本演进
     collected_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    user = relationship("UserCore", viewonly=True, back_populates="interests")
+
+    __table_args__ = (
+        # 分群查询：租户内按user_id键集分页
+        Index("ix_user_interests_tenant_user", "tenant_id", "user_id"),
+        # 分群过滤与计数（覆盖过滤列与user_id，计数可走仅索引扫描）
+        Index(
+            "ix_user_interests_segment",
+            "tenant_id", "primary_category", "preferred_format", "schema_version", "user_id"
+        ),
+        # interest_data 包含查询（@>），仅PostgreSQL
+        Index(
+            "ix_user_interests_data_path",
+            "interest_data",
+            postgresql_using="gin",
+            postgresql_ops={"interest_data": "jsonb_path_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
+
 # SQLAlchemy 的 'user_app_usage' 表模型
 class UserAppUsage(Base):
     __tablename__ = "user_app_usage"
 
     session_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("user_core.user_id"), nullable=False)
+    user_id = Column(String, ForeignKey("user_core.user_id"), nullable=False, index=True)
     tenant_id = Column(String, nullable=False, default="default", index=True)  # 租户隔离
     device_type = Column(SQLAlchemyEnum(DeviceType), nullable=False)
     app_version = Column(String, nullable=True)
-    session_start_time = Column(DateTime, default=datetime.utcnow)
+    session_start_time = Column(DateTime, default=datetime.utcnow, index=True)  # 归档按会话开始时间扫描
     session_end_time = Column(DateTime, nullable=True)
     duration_seconds = Column(Integer, nullable=True)
 
@@ -124,6 +195,23 @@ class UserAppUsage(Base):
 
 
 
+# SQLAlchemy 的 'tenant' 表模型 - 租户注册表（位于默认库）
+class Tenant(Base):
+    __tablename__ = "tenant"
+
+    tenant_id = Column(String, primary_key=True)
+    name = Column(String, nullable=True)
+    # 以下配置为空时使用全局配置
+    allowed_providers = Column(JSONType, nullable=True)  # 允许的认证方式列表
+    access_token_expire_minutes = Column(Integer, nullable=True)
+    login_rate_per_minute = Column(Integer, nullable=True)  # 每进程每分钟登录请求数
+    max_users = Column(Integer, nullable=True)
+    cache_ttl_seconds = Column(Integer, nullable=True)
+    user_count = Column(Integer, nullable=False, default=0)  # 注册时增量维护，不参与配置快照
+    version = Column(Integer, nullable=False, default=1)  # 配置变更时递增，各进程据此刷新快照
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 # 用于 API 交互的 Pydantic 模型 (Schemas)
 class UserLoginRequest(BaseModel):
     device_id: str = Field(..., description="设备唯一标识")
@@ -154,7 +242,7 @@ class UserCoreResponse(BaseModel):
     email: str | None
     register_channel: RegisterChannel
     status: UserStatus
-    device_id: str
+    device_id: str | None  # 第三方登录用户没有设备ID
 
     class Config:
         from_attributes = True
@@ -185,6 +273,139 @@ class UserInterestsResponse(UserInterestsCreate):
     class Config:
         from_attributes = True
 
+# Pydantic Models for Interest Segments
+class SegmentQuery(BaseModel):
+    """兴趣分群条件（各条件之间为AND）"""
+    tenant_id: str = Field(default="default", description="租户标识")
+    categories: Optional[List[InterestCategory]] = Field(None, description="主兴趣类别，任一匹配")
+    formats: Optional[List[ContentFormat]] = Field(None, description="偏好内容格式，任一匹配")
+    interest_contains: Optional[dict] = Field(None, description="interest_data 包含的JSON片段")
+    schema_version: Optional[str] = None
+
+class SegmentMember(BaseModel):
+    user_id: str
+    primary_category: Optional[InterestCategory]
+    preferred_format: Optional[ContentFormat]
+    schema_version: Optional[str]
+    updated_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class SegmentPageResponse(BaseModel):
+    items: List[SegmentMember]
+    next_cursor: Optional[str]  # 为空表示没有下一页
+
+class SegmentCountResponse(BaseModel):
+    tenant_id: str
+    count: int
+
+class TokenRevocationResponse(BaseModel):
+    user_id: str
+    revoked_before: datetime  # 该时间之前签发的令牌均已失效
+
+class AccountDeletionResponse(BaseModel):
+    user_id: str
+    deleted_at: datetime
+    purge_after: datetime  # 该时间之后数据将被清理，不可恢复
+
+# Pydantic Models for Tenant Registry
+class TenantSettings(BaseModel):
+    """租户配置（字段为空时使用全局配置）"""
+    name: Optional[str] = None
+    allowed_providers: Optional[List[str]] = Field(None, description="允许的认证方式，空表示不限制")
+    access_token_expire_minutes: Optional[int] = Field(None, ge=1)
+    login_rate_per_minute: Optional[int] = Field(None, ge=1, description="每进程每分钟登录请求数")
+    max_users: Optional[int] = Field(None, ge=0)
+    cache_ttl_seconds: Optional[int] = Field(None, ge=1)
+
+class TenantConfig(TenantSettings):
+    """进程内租户配置快照"""
+    tenant_id: str
+    version: int
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
+class TenantResponse(TenantConfig):
+    user_count: int
+    updated_at: Optional[datetime]
+
+# Pydantic Models for Admin User Listing
+class UserListFilter(BaseModel):
+    """管理端用户列表筛选条件"""
+    status: Optional[UserStatus] = None
+    register_channel: Optional[RegisterChannel] = None
+    product_id: Optional[str] = None
+    registered_from: Optional[datetime] = Field(None, description="注册时间下限（含）")
+    registered_to: Optional[datetime] = Field(None, description="注册时间上限（不含）")
+    email_prefix: Optional[str] = Field(None, min_length=1, description="邮箱前缀")
+    phone_prefix: Optional[str] = Field(None, min_length=1, description="手机号前缀")
+
+class UserListItem(BaseModel):
+    user_id: str
+    tenant_id: str
+    product_id: Optional[str]
+    phone: Optional[str]
+    email: Optional[str]
+    register_channel: RegisterChannel
+    status: UserStatus
+    register_time: Optional[datetime]
+    last_login_time: Optional[datetime]
+    nickname: Optional[str]
+    region: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+class UserListResponse(BaseModel):
+    items: List[UserListItem]
+    next_cursor: Optional[str]  # 为空表示没有下一页
+    total_estimate: Optional[int] = None  # 仅在 with_total=true 时返回（PostgreSQL为执行计划估算值）
+
+# /user/me 可选字段组
+USER_ME_FIELD_GROUPS = ("core", "profile", "interests")
+
+class UserMeResponse(BaseModel):
+    """当前用户聚合信息，仅包含请求的字段组"""
+    core: Optional[UserCoreResponse] = None
+    profile: Optional[UserProfileResponse] = None
+    interests: Optional[UserInterestsResponse] = None
+
+# Pydantic Models for Batch User Lookup
+class UserCardBatchRequest(BaseModel):
+    tenant_id: str = Field(default="default", description="租户标识")
+    user_ids: List[str] = Field(..., min_length=1, description="用户ID列表，可重复")
+
+class UserCard(BaseModel):
+    user_id: str
+    found: bool  # 用户不存在或已删除时为false，其余字段为空
+    nickname: Optional[str] = None
+    avatar_url: Optional[str] = None
+
+class UserCardBatchResponse(BaseModel):
+    items: List[UserCard]  # 与请求中的user_ids一一对应
+
+# Pydantic Models for Analytics
+class ActiveUsersResponse(BaseModel):
+    tenant_id: str
+    start: date
+    end: date
+    providers: List[str]
+    active_users: int  # 区间去重活跃用户数（HyperLogLog估算，误差约0.81%）
+    logins: Dict[str, int]  # 各渠道登录次数
+    registrations: Dict[str, int]  # 各渠道注册次数
+
+class AnalyticsSummaryResponse(BaseModel):
+    tenant_id: str
+    date: date
+    dau: int
+    wau: int  # 截至当天的7天滚动窗口
+    mau: int  # 截至当天的30天滚动窗口
+    logins: Dict[str, int]
+    registrations: Dict[str, int]
+
 # Pydantic Models for User App Usage
 class UserAppUsageCreate(BaseModel):
     device_type: DeviceType
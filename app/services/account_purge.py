@@ -0,0 +1,172 @@
+"""
+注销账号数据清理
+删除注销超过保留期（account_purge_grace_days）的用户数据，适合定时执行，中断后重新执行即从检查点继续
+
+- 候选用户按 (deleted_at, user_id) 键集扫描 ix_user_core_status_deleted，每批 batch_size 个用户
+- 每批按外键逆序删除：user_app_usage（经 ix_user_app_usage_user_id 每次最多删除 batch_size 行）、
+  user_interests、user_profile、user_identity，最后删除 user_core；每条DELETE单独提交，不长时间持有锁
+- 每批完成后清理该批用户缓存并写检查点，批间暂停 pause_seconds
+- dry_run 只统计各表待删除行数，不删除也不写检查点
+分片部署时依次处理所有分片；全部完成后删除检查点，下次执行按新的截止时间重新扫描
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.engine import Engine
+
+from ..core.cache import get_cache
+from ..core.config import settings
+from ..core.sharding import shard_router
+from ..models.user import Base, UserStatus
+
+logger = logging.getLogger(__name__)
+
+# (表名, 主键)，按外键依赖逆序排列；user_core 在每批最后删除
+PURGE_TABLES = [
+    ("user_app_usage", "session_id"),
+    ("user_interests", "user_id"),
+    ("user_profile", "user_id"),
+    ("user_identity", "identity_id"),
+]
+
+
+class AccountPurger:
+    """注销账号数据清理"""
+
+    def __init__(
+        self,
+        grace_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None,
+        checkpoint_path: Optional[str] = None,
+        dry_run: bool = False
+    ):
+        self.batch_size = batch_size or settings.account_purge_batch_size
+        self.pause_seconds = settings.account_purge_pause_seconds if pause_seconds is None else pause_seconds
+        self.dry_run = dry_run
+        self.checkpoint_path = checkpoint_path or ".account_purge.json"
+        grace = timedelta(days=settings.account_purge_grace_days if grace_days is None else grace_days)
+        self.checkpoint = self._load_checkpoint(datetime.utcnow() - grace)
+        self.cutoff = datetime.fromisoformat(self.checkpoint["cutoff"])
+
+    def _load_checkpoint(self, cutoff: datetime) -> Dict:
+        if not self.dry_run and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            logger.info(f"Resuming account purge from checkpoint {self.checkpoint_path}: cutoff={checkpoint['cutoff']}")
+            return checkpoint
+        return {
+            "cutoff": cutoff.isoformat(),
+            "shards": {},
+            "users": 0,
+            "rows": {table_name: 0 for table_name, _ in PURGE_TABLES + [("user_core", "user_id")]},
+        }
+
+    def _save_checkpoint(self) -> None:
+        if self.dry_run:
+            return
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _pause(self) -> None:
+        if self.pause_seconds:
+            time.sleep(self.pause_seconds)
+
+    def _candidates(self, db_engine: Engine, after: Optional[List[str]]) -> List[Tuple[datetime, str, str]]:
+        """下一批候选用户 (deleted_at, user_id, tenant_id)"""
+        table = Base.metadata.tables["user_core"]
+        query = select(table.c.deleted_at, table.c.user_id, table.c.tenant_id).where(
+            table.c.status == UserStatus.DELETED,
+            table.c.deleted_at < self.cutoff
+        )
+        if after is not None:
+            query = query.where(
+                tuple_(table.c.deleted_at, table.c.user_id) > (datetime.fromisoformat(after[0]), after[1])
+            )
+        query = query.order_by(table.c.deleted_at, table.c.user_id).limit(self.batch_size)
+        with db_engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(query)]
+
+    def _count_rows(self, db_engine: Engine, table_name: str, user_ids: List[str]) -> int:
+        table = Base.metadata.tables[table_name]
+        with db_engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(table).where(table.c.user_id.in_(user_ids))
+            ).scalar()
+
+    def _delete_rows(self, db_engine: Engine, table_name: str, pk: str, user_ids: List[str]) -> int:
+        """按主键分批删除该批用户的行，每批单独提交"""
+        table = Base.metadata.tables[table_name]
+        deleted = 0
+        while True:
+            with db_engine.begin() as conn:
+                keys = conn.execute(
+                    select(table.c[pk]).where(table.c.user_id.in_(user_ids)).limit(self.batch_size)
+                ).scalars().all()
+                if keys:
+                    conn.execute(delete(table).where(table.c[pk].in_(keys)))
+            deleted += len(keys)
+            if len(keys) < self.batch_size:
+                return deleted
+            self._pause()
+
+    def _delete_users(self, db_engine: Engine, user_ids: List[str]) -> int:
+        table = Base.metadata.tables["user_core"]
+        with db_engine.begin() as conn:
+            return conn.execute(
+                delete(table).where(table.c.user_id.in_(user_ids), table.c.status == UserStatus.DELETED)
+            ).rowcount
+
+    def _purge_shard(self, shard: str, db_engine: Engine) -> None:
+        progress = self.checkpoint["shards"].setdefault(shard, {"after": None, "done": False})
+        if progress["done"]:
+            return
+        rows = self.checkpoint["rows"]
+        while True:
+            candidates = self._candidates(db_engine, progress["after"])
+            if not candidates:
+                break
+            user_ids = [user_id for _, user_id, _ in candidates]
+
+            if self.dry_run:
+                for table_name, _ in PURGE_TABLES:
+                    rows[table_name] += self._count_rows(db_engine, table_name, user_ids)
+                rows["user_core"] += len(user_ids)
+            else:
+                for table_name, pk in PURGE_TABLES:
+                    rows[table_name] += self._delete_rows(db_engine, table_name, pk, user_ids)
+                rows["user_core"] += self._delete_users(db_engine, user_ids)
+                get_cache().clear_users_cache([(user_id, tenant_id) for _, user_id, tenant_id in candidates])
+
+            last_deleted_at, last_user_id, _ = candidates[-1]
+            progress["after"] = [last_deleted_at.isoformat(), last_user_id]
+            self.checkpoint["users"] += len(candidates)
+            self._save_checkpoint()
+            logger.info(f"{'Counted' if self.dry_run else 'Purged'} {len(candidates)} deleted users on shard {shard}")
+            if len(candidates) < self.batch_size:
+                break
+            self._pause()
+
+        progress["done"] = True
+        self._save_checkpoint()
+
+    def run(self) -> Dict:
+        """执行（或从检查点继续）清理，返回处理的用户数与各表行数"""
+        for shard, db_engine in sorted(shard_router.engines.items()):
+            self._purge_shard(shard, db_engine)
+        if not self.dry_run and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return {
+            "dry_run": self.dry_run,
+            "cutoff": self.checkpoint["cutoff"],
+            "users": self.checkpoint["users"],
+            "rows": self.checkpoint["rows"],
+        }
@@ -0,0 +1,107 @@
+"""
+登录与活跃用户统计
+基于Redis HyperLogLog按 租户/渠道/天 记录活跃用户，按 租户/天 记录登录与注册次数：
+- hll:active:{tenant}:{provider}:{yyyymmdd}    PFADD user_id（登录与App会话上报时写入）
+- stats:{tenant}:{yyyymmdd}                    HINCRBY login:{provider} / register:{provider}
+区间去重活跃数对所有日期键执行一次 PFCOUNT，查询耗时只与天数相关（误差约0.81%）
+日期按UTC计算；统计写入失败不影响登录
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from ..core.cache import get_cache
+from ..core.config import settings
+from ..models import user as user_model
+
+logger = logging.getLogger(__name__)
+
+ALL_PROVIDERS = [channel.value for channel in user_model.RegisterChannel]
+# 计数事件 -> 返回字段
+EVENT_FIELDS = {"login": "logins", "register": "registrations"}
+
+
+def _day(value: date) -> str:
+    return value.strftime("%Y%m%d")
+
+
+def _active_key(tenant_id: str, provider: str, day: date) -> str:
+    return f"hll:active:{tenant_id}:{provider}:{_day(day)}"
+
+
+def _stats_key(tenant_id: str, day: date) -> str:
+    return f"stats:{tenant_id}:{_day(day)}"
+
+
+def _days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def record_activity(
+    user_id: str,
+    tenant_id: str,
+    provider: str,
+    event: Optional[str] = None
+) -> None:
+    """
+    记录用户活跃，event 为 login / register 时同时累加对应计数
+    一次往返完成（非事务流水线）
+    """
+    today = datetime.utcnow().date()
+    ttl = settings.analytics_retention_days * 86400
+    active_key = _active_key(tenant_id, provider, today)
+    try:
+        pipe = get_cache().redis_client.pipeline(transaction=False)
+        pipe.pfadd(active_key, user_id)
+        pipe.expire(active_key, ttl)
+        if event is not None:
+            stats_key = _stats_key(tenant_id, today)
+            pipe.hincrby(stats_key, f"{event}:{provider}", 1)
+            pipe.expire(stats_key, ttl)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record analytics for tenant {tenant_id}: {e}")
+
+
+def count_active_users(
+    tenant_id: str,
+    start: date,
+    end: date,
+    providers: Optional[List[str]] = None
+) -> int:
+    """统计区间内去重活跃用户数"""
+    keys = [
+        _active_key(tenant_id, provider, day)
+        for day in _days(start, end)
+        for provider in (providers or ALL_PROVIDERS)
+    ]
+    return get_cache().redis_client.pfcount(*keys)
+
+
+def count_events(tenant_id: str, start: date, end: date) -> Dict[str, Dict[str, int]]:
+    """统计区间内登录与注册次数，按渠道汇总"""
+    pipe = get_cache().redis_client.pipeline(transaction=False)
+    for day in _days(start, end):
+        pipe.hgetall(_stats_key(tenant_id, day))
+    totals: Dict[str, Dict[str, int]] = {name: {} for name in EVENT_FIELDS.values()}
+    for day_stats in pipe.execute():
+        for field, value in day_stats.items():
+            event, _, provider = field.partition(":")
+            if event not in EVENT_FIELDS:
+                continue
+            bucket = totals[EVENT_FIELDS[event]]
+            bucket[provider] = bucket.get(provider, 0) + int(value)
+    return totals
+
+
+def summary(tenant_id: str, day: date, providers: Optional[List[str]] = None) -> Dict[str, object]:
+    """指定日期的 DAU / WAU / MAU（截至当天的7天、30天滚动窗口）及当天登录注册次数"""
+    return {
+        "tenant_id": tenant_id,
+        "date": day,
+        "dau": count_active_users(tenant_id, day, day, providers),
+        "wau": count_active_users(tenant_id, day - timedelta(days=6), day, providers),
+        "mau": count_active_users(tenant_id, day - timedelta(days=29), day, providers),
+        **count_events(tenant_id, day, day),
+    }
@@ -3,14 +3,21 @@
 支持中国大陆和海外不同的认证提供商
 """
 
-from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from typing import Optional, Dict, Any, Tuple
 from ..models import user as user_model
 from ..core.security import create_access_token
 from ..core.cache import get_cache
 from ..core.auth_providers import AuthProviderFactory, AUTH_PROVIDERS_CONFIG, AuthUserInfo
+from ..core.metrics import PROVIDER_ERRORS, PROVIDER_REQUEST_DURATION
+from ..core.tenants import TenantQuotaExceeded, get_tenant_registry
+from . import analytics
+from .login_activity import get_login_activity
+from .user_service import AccountFrozen
 from datetime import datetime
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -57,12 +64,13 @@ class AuthService:
             
             # 2. 创建认证提供商实例并进行认证
             auth_provider = AuthProviderFactory.create_provider(provider, provider_config)
-            auth_user_info = await auth_provider.authenticate(credentials)
+            auth_user_info = await self._call_provider(auth_provider, provider, credentials)
             
             # 3. 查找或创建用户
-            user = self._find_or_create_user(
+            user, created = self._find_or_create_user(
                 db, auth_user_info, tenant_id, product_id
             )
+            analytics.record_activity(user.user_id, tenant_id, provider, "register" if created else "login")
             
             # 4. 生成JWT token
             access_token = create_access_token(data={
@@ -70,15 +78,10 @@ class AuthService:
                 "tenant_id": tenant_id,
                 "product_id": product_id,
                 "provider": provider
-            })
+            }, expires_delta=get_tenant_registry().token_ttl(tenant_id))
             
-            # 5. 获取用户资料
-            user_profile = db.query(user_model.UserProfile).filter(
-                user_model.UserProfile.user_id == user.user_id
-            ).first()
-            
-            # 6. 清理用户缓存
-            self.cache.clear_user_cache(user.user_id, tenant_id)
+            # 5. 获取用户资料（已有用户在查找时一并加载）
+            user_profile = user.profile
             
             return user_model.UserLoginResponse(
                 token=access_token,
@@ -86,10 +89,32 @@ class AuthService:
                 nickname=user_profile.nickname if user_profile else auth_user_info.nickname or "新用户"
             )
             
+        except (TenantQuotaExceeded, AccountFrozen):
+            raise
         except Exception as e:
             logger.error(f"Authentication failed: {e}")
             raise ValueError(f"认证失败: {str(e)}")
     
+    async def _call_provider(
+        self,
+        auth_provider,
+        provider: str,
+        credentials: Dict[str, Any]
+    ) -> AuthUserInfo:
+        """调用认证提供商并记录耗时与失败次数"""
+        start_time = time.perf_counter()
+        outcome = "success"
+        try:
+            return await auth_provider.authenticate(credentials)
+        except Exception:
+            outcome = "error"
+            PROVIDER_ERRORS.labels(provider).inc()
+            raise
+        finally:
+            PROVIDER_REQUEST_DURATION.labels(provider, outcome).observe(
+                time.perf_counter() - start_time
+            )
+    
     def _get_provider_config(self, provider: str, region: str) -> Dict[str, Any]:
         """获取认证提供商配置"""
         # 根据地区选择不同的配置
@@ -103,58 +128,104 @@ class AuthService:
         # 全球配置
         return AUTH_PROVIDERS_CONFIG.get(provider, {})
     
+    def _find_by_identity(
+        self,
+        db: Session,
+        auth_info: AuthUserInfo,
+        tenant_id: str
+    ) -> Optional[user_model.UserCore]:
+        """按登录身份查找用户（user_identity唯一索引一次命中，与绑定了多少种登录方式无关）"""
+        return db.query(user_model.UserCore).join(
+            user_model.UserIdentity,
+            user_model.UserIdentity.user_id == user_model.UserCore.user_id
+        ).options(
+            joinedload(user_model.UserCore.profile)
+        ).filter(
+            user_model.UserIdentity.tenant_id == tenant_id,
+            user_model.UserIdentity.provider == auth_info.provider,
+            user_model.UserIdentity.provider_user_id == auth_info.provider_user_id
+        ).first()
+    
+    def _new_identity(
+        self,
+        user_id: str,
+        auth_info: AuthUserInfo,
+        tenant_id: str
+    ) -> user_model.UserIdentity:
+        return user_model.UserIdentity(
+            tenant_id=tenant_id,
+            provider=auth_info.provider,
+            provider_user_id=auth_info.provider_user_id,
+            user_id=user_id,
+            provider_data=auth_info.raw_data
+        )
+    
+    def _check_active(self, user: user_model.UserCore) -> None:
+        if user.status != user_model.UserStatus.ACTIVE:
+            raise AccountFrozen(user.user_id)
+    
     def _find_or_create_user(
         self, 
         db: Session, 
         auth_info: AuthUserInfo, 
         tenant_id: str, 
         product_id: Optional[str]
-    ) -> user_model.UserCore:
-        """查找或创建用户"""
+    ) -> Tuple[user_model.UserCore, bool]:
+        """
+        查找或创建用户，返回 (用户, 是否新注册)
+        已注销的账号不再匹配（按新用户注册），匹配到冻结的账号时抛出AccountFrozen
+        """
         
-        # 1. 尝试通过第三方用户ID查找
-        existing_user = db.query(user_model.UserCore).filter(
-            user_model.UserCore.provider_user_id == auth_info.provider_user_id,
-            user_model.UserCore.register_channel == auth_info.provider,
-            user_model.UserCore.tenant_id == tenant_id
-        ).first()
+        # 1. 尝试通过登录身份查找
+        existing_user = self._find_by_identity(db, auth_info, tenant_id)
         
-        if existing_user:
-            # 更新最后登录时间
-            existing_user.last_login_time = datetime.utcnow()
+        if existing_user is not None and existing_user.status == user_model.UserStatus.DELETED:
+            # 注销时未解绑的身份（早期版本注销的账号），解绑后按新用户注册
+            db.query(user_model.UserIdentity).filter(
+                user_model.UserIdentity.tenant_id == tenant_id,
+                user_model.UserIdentity.provider == auth_info.provider,
+                user_model.UserIdentity.provider_user_id == auth_info.provider_user_id
+            ).delete(synchronize_session=False)
             db.commit()
-            return existing_user
+            existing_user = None
+        
+        if existing_user:
+            self._check_active(existing_user)
+            # 最后登录时间与缓存清理在后台批量执行
+            get_login_activity().record(db, existing_user.user_id, tenant_id)
+            return existing_user, False
         
-        # 2. 尝试通过邮箱或手机号查找（如果提供）
+        # 2. 尝试通过邮箱或手机号查找（如果提供），找到后绑定新的登录身份，保留已有身份
+        existing_user = None
         if auth_info.email:
             existing_user = db.query(user_model.UserCore).filter(
                 user_model.UserCore.email == auth_info.email,
-                user_model.UserCore.tenant_id == tenant_id
+                user_model.UserCore.tenant_id == tenant_id,
+                user_model.UserCore.status != user_model.UserStatus.DELETED
             ).first()
-            
-            if existing_user:
-                # 绑定第三方账号
-                existing_user.provider_user_id = auth_info.provider_user_id
-                existing_user.provider_data = auth_info.raw_data
-                existing_user.last_login_time = datetime.utcnow()
-                db.commit()
-                return existing_user
         
-        if auth_info.phone:
+        if existing_user is None and auth_info.phone:
             existing_user = db.query(user_model.UserCore).filter(
                 user_model.UserCore.phone == auth_info.phone,
-                user_model.UserCore.tenant_id == tenant_id
+                user_model.UserCore.tenant_id == tenant_id,
+                user_model.UserCore.status != user_model.UserStatus.DELETED
             ).first()
-            
-            if existing_user:
-                # 绑定第三方账号
-                existing_user.provider_user_id = auth_info.provider_user_id
-                existing_user.provider_data = auth_info.raw_data
+        
+        if existing_user:
+            self._check_active(existing_user)
+            try:
+                db.add(self._new_identity(existing_user.user_id, auth_info, tenant_id))
                 existing_user.last_login_time = datetime.utcnow()
                 db.commit()
-                return existing_user
+            except IntegrityError:
+                # 并发请求已绑定同一身份
+                db.rollback()
+                return self._find_by_identity(db, auth_info, tenant_id) or existing_user, False
+            return existing_user, False
         
-        # 3. 创建新用户
+        # 3. 创建新用户，先占用租户用户名额；用户、登录身份与资料在同一事务中写入，任一失败都归还名额
+        tenants = get_tenant_registry()
+        tenants.reserve_user(tenant_id)
         new_user = user_model.UserCore(
             tenant_id=tenant_id,
             product_id=product_id,
@@ -165,22 +236,32 @@ class AuthService:
             provider_data=auth_info.raw_data
         )
         
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        
-        # 4. 创建用户资料
-        user_profile = user_model.UserProfile(
-            user_id=new_user.user_id,
-            tenant_id=tenant_id,
-            nickname=auth_info.nickname or "新用户",
-            avatar_url=auth_info.avatar_url
-        )
-        
-        db.add(user_profile)
-        db.commit()
+        try:
+            db.add(new_user)
+            db.flush()
+            db.add(self._new_identity(new_user.user_id, auth_info, tenant_id))
+            db.add(user_model.UserProfile(
+                user_id=new_user.user_id,
+                tenant_id=tenant_id,
+                nickname=auth_info.nickname or "新用户",
+                avatar_url=auth_info.avatar_url
+            ))
+            db.commit()
+            db.refresh(new_user)
+        except IntegrityError:
+            # 并发的首次登录已创建该身份，返回已创建的用户
+            db.rollback()
+            tenants.release_users(tenant_id)
+            existing_user = self._find_by_identity(db, auth_info, tenant_id)
+            if existing_user is None:
+                raise
+            return existing_user, False
+        except Exception:
+            db.rollback()
+            tenants.release_users(tenant_id)
+            raise
         
-        return new_user
+        return new_user, True
     
     def get_supported_providers(self, region: str = "global") -> Dict[str, Any]:
         """获取支持的认证提供商列表"""
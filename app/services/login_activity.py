@@ -0,0 +1,149 @@
+"""
+登录后置操作
+登录接口只负责签发令牌，最后登录时间的写入移出请求路径：
+- last_login_time 在内存中按用户合并，后台线程定期批量写入
+  （PostgreSQL使用一条 UPDATE ... FROM (VALUES ...)，其他数据库使用executemany）
+- 用户缓存（资料、兴趣画像、名片）不含最后登录时间，登录不清理缓存
+应用关闭时停止后台线程并刷新剩余数据；login_deferred_updates=false 时退回同步写入
+"""
+
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import user as user_model
+
+logger = logging.getLogger(__name__)
+
+_UPDATE_ONE_SQL = text(
+    "UPDATE user_core SET last_login_time = :login_time "
+    "WHERE user_id = :user_id AND (last_login_time IS NULL OR last_login_time < :login_time)"
+)
+
+
+def _write_last_login(db_engine: Engine, updates: Dict[str, datetime]) -> None:
+    """批量写入最后登录时间（按user_id排序，保持加锁顺序一致）"""
+    items = sorted(updates.items())
+    batch_size = settings.login_flush_batch_size
+    with db_engine.begin() as conn:
+        for offset in range(0, len(items), batch_size):
+            chunk = items[offset:offset + batch_size]
+            if db_engine.dialect.name == "postgresql":
+                values = ", ".join(f"(:u{i}, CAST(:t{i} AS timestamp))" for i in range(len(chunk)))
+                params = {}
+                for i, (user_id, login_time) in enumerate(chunk):
+                    params[f"u{i}"] = user_id
+                    params[f"t{i}"] = login_time
+                conn.execute(text(
+                    "UPDATE user_core SET last_login_time = v.login_time "
+                    f"FROM (VALUES {values}) AS v(user_id, login_time) "
+                    "WHERE user_core.user_id = v.user_id "
+                    "AND (user_core.last_login_time IS NULL OR user_core.last_login_time < v.login_time)"
+                ), params)
+            else:
+                conn.execute(_UPDATE_ONE_SQL, [
+                    {"user_id": user_id, "login_time": login_time} for user_id, login_time in chunk
+                ])
+
+
+class LoginActivityBuffer:
+    """登录活动缓冲区"""
+
+    def __init__(self):
+        self._pending: Dict[Engine, Dict[str, datetime]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread = None
+
+    def record(self, db: Session, user_id: str, tenant_id: str = "default") -> None:
+        """记录一次登录（写入在当前会话所在的库执行）"""
+        login_time = datetime.utcnow()
+        if not settings.login_deferred_updates:
+            db.query(user_model.UserCore).filter(
+                user_model.UserCore.user_id == user_id
+            ).update({user_model.UserCore.last_login_time: login_time}, synchronize_session=False)
+            db.commit()
+            return
+
+        with self._lock:
+            self._pending.setdefault(db.get_bind(), {})[user_id] = login_time
+            pending_count = sum(len(updates) for updates in self._pending.values())
+        self._ensure_running()
+        if pending_count >= settings.login_buffer_max_users:
+            self._wakeup.set()
+
+    def _ensure_running(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # 清除上次停止时设置的唤醒标记，否则新线程启动后立即写入
+                self._stopping.clear()
+                self._wakeup.clear()
+                self._thread = threading.Thread(target=self._run, name="login-activity-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(settings.login_flush_interval_seconds)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """写入缓冲中的登录时间，返回写入的用户数"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            written = 0
+            for db_engine, updates in pending.items():
+                try:
+                    _write_last_login(db_engine, updates)
+                    written += len(updates)
+                except Exception as e:
+                    logger.error(f"Failed to flush {len(updates)} last_login_time updates: {e}")
+                    self._requeue(db_engine, updates)
+            return written
+
+    def _requeue(self, db_engine: Engine, updates: Dict[str, datetime]) -> None:
+        """写入失败时放回缓冲区等待下次重试（保留较新的时间）"""
+        with self._lock:
+            pending = self._pending.setdefault(db_engine, {})
+            for user_id, login_time in updates.items():
+                if pending.get(user_id, login_time) <= login_time:
+                    pending[user_id] = login_time
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止后台线程并刷新剩余数据（应用关闭时调用）"""
+        self._stopping.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        written = self.flush()
+        if written:
+            logger.info(f"Flushed {written} pending last_login_time updates on shutdown")
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(updates) for updates in self._pending.values())
+
+
+login_activity = LoginActivityBuffer()
+# 未经lifespan关闭（如脚本中使用）时兜底刷新
+atexit.register(login_activity.stop)
+
+
+def get_login_activity() -> LoginActivityBuffer:
+    """获取登录活动缓冲区实例"""
+    return login_activity
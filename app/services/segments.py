@@ -0,0 +1,101 @@
+"""
+兴趣分群查询
+按租户筛选 user_interests（类别、内容格式、schema版本、interest_data JSON包含），支持：
+- 键集分页：按 (tenant_id, user_id) 有序扫描，游标为上一页最后的user_id
+- 仅计数：过滤列均在 ix_user_interests_segment 中，PostgreSQL可走仅索引扫描
+- 流式导出：分批键集查询并逐行输出NDJSON，批与批之间释放连接，不持有长事务
+JSON包含条件在PostgreSQL上使用 @>（GIN jsonb_path_ops索引）；其他数据库仅支持顶层标量键
+"""
+
+import json
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from ..core.pagination import decode_cursor, encode_cursor
+from ..core.sharding import tenant_session
+from ..models import user as user_model
+
+UserInterests = user_model.UserInterests
+
+SEGMENT_COLUMNS = (
+    UserInterests.user_id,
+    UserInterests.primary_category,
+    UserInterests.preferred_format,
+    UserInterests.schema_version,
+    UserInterests.updated_at,
+)
+
+
+def _contains_conditions(db: Session, document: dict) -> list:
+    if db.get_bind().dialect.name == "postgresql":
+        return [type_coerce(UserInterests.interest_data, JSONB).contains(document)]
+
+    conditions = []
+    for key, value in document.items():
+        element = UserInterests.interest_data[key]
+        if isinstance(value, bool):
+            conditions.append(element.as_boolean() == value)
+        elif isinstance(value, int):
+            conditions.append(element.as_integer() == value)
+        elif isinstance(value, float):
+            conditions.append(element.as_float() == value)
+        elif isinstance(value, str):
+            conditions.append(element.as_string() == value)
+        else:
+            raise ValueError("Nested interest_contains values require PostgreSQL")
+    return conditions
+
+
+def _conditions(db: Session, query: user_model.SegmentQuery) -> list:
+    conditions = [UserInterests.tenant_id == query.tenant_id]
+    if query.categories:
+        conditions.append(UserInterests.primary_category.in_(query.categories))
+    if query.formats:
+        conditions.append(UserInterests.preferred_format.in_(query.formats))
+    if query.schema_version is not None:
+        conditions.append(UserInterests.schema_version == query.schema_version)
+    if query.interest_contains:
+        conditions.extend(_contains_conditions(db, query.interest_contains))
+    return conditions
+
+
+def query_segment(
+    db: Session,
+    query: user_model.SegmentQuery,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """查询一页分群成员，返回 (成员, 下一页游标)"""
+    after = decode_cursor(cursor, 1)
+    stmt = select(*SEGMENT_COLUMNS).where(*_conditions(db, query))
+    if after is not None:
+        stmt = stmt.where(UserInterests.user_id > after[0])
+    # 多取一行判断是否还有下一页
+    rows = db.execute(stmt.order_by(UserInterests.user_id).limit(limit + 1)).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor([rows[limit - 1].user_id])
+    return rows, None
+
+
+def count_segment(db: Session, query: user_model.SegmentQuery) -> int:
+    """统计分群人数"""
+    stmt = select(func.count()).select_from(UserInterests).where(*_conditions(db, query))
+    return db.execute(stmt).scalar_one()
+
+
+def stream_segment(query: user_model.SegmentQuery, batch_size: int) -> Iterator[str]:
+    """逐行输出分群成员（NDJSON）"""
+    cursor = None
+    with tenant_session(query.tenant_id) as db:
+        while True:
+            rows, cursor = query_segment(db, query, batch_size, cursor)
+            # 输出前结束事务，客户端读取较慢时不占用连接
+            db.rollback()
+            for row in rows:
+                yield json.dumps(user_model.SegmentMember.model_validate(row).model_dump(mode="json")) + "\n"
+            if cursor is None:
+                return
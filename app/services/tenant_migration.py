@@ -0,0 +1,269 @@
+"""
+租户在线迁移
+将一个租户的数据分批复制到另一个分片，支持断点续传
+
+流程：
+1. copy     按主键分批复制（源库持续提供服务），每批提交后写检查点
+2. cutover  将映射置为 moving 状态（该租户请求短暂返回503），按主键分段比对两侧的整行内容，
+            补齐复制期间新增或修改的行并删除源库已删除的行，校验各表行数后把映射切换到目标分片
+3. cleanup  （可选）分批删除源分片上的数据
+
+部分表没有服务端维护的变更时间（user_app_usage 的会话开始时间由客户端上报，user_core 的状态、邮箱修改不更新任何时间列），
+因此增量不依赖时间列；代价是冻结期间需在两侧各读取一遍该租户的数据
+cutover 失败时映射恢复到源分片，并清除增量进度，重新执行cutover时从头比对
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.engine import Engine
+
+from ..core.cache import get_cache
+from ..core.config import settings
+from ..core.sharding import MOVING_PREFIX, SHARD_MAP_KEY, shard_router
+from ..models.user import Base
+
+logger = logging.getLogger(__name__)
+
+# (表名, 主键)，按外键依赖顺序排列
+TENANT_TABLES = [
+    ("user_core", "user_id"),
+    ("user_identity", "identity_id"),
+    ("user_profile", "user_id"),
+    ("user_interests", "user_id"),
+    ("user_app_usage", "session_id"),
+]
+
+# cutover 阶段的检查点后缀：补齐变更（按外键顺序）、删除源库已删除的行（按外键逆序）
+_DELTA_SUFFIXES = (":delta", ":removed")
+
+
+class TenantMover:
+    """租户分片迁移"""
+
+    def __init__(
+        self,
+        tenant_id: str,
+        target_shard: str,
+        chunk_size: int = 1000,
+        checkpoint_path: Optional[str] = None,
+        pause_seconds: float = 0.0
+    ):
+        if target_shard not in shard_router.engines:
+            raise ValueError(f"Unknown shard: {target_shard}")
+        self.tenant_id = tenant_id
+        self.target_shard = target_shard
+        self.chunk_size = chunk_size
+        self.pause_seconds = pause_seconds
+        self.checkpoint_path = checkpoint_path or f".tenant_move_{tenant_id}_{target_shard}.json"
+        self.checkpoint = self._load_checkpoint()
+        self.source_shard = self.checkpoint.get("source") or shard_router.shard_for_tenant(tenant_id)
+        if self.source_shard == target_shard:
+            raise ValueError(f"Tenant {tenant_id} already lives on shard {target_shard}")
+
+    @property
+    def source(self) -> Engine:
+        return shard_router.engines[self.source_shard]
+
+    @property
+    def target(self) -> Engine:
+        return shard_router.engines[self.target_shard]
+
+    def _load_checkpoint(self) -> Dict:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            logger.info(f"Resuming tenant move from checkpoint {self.checkpoint_path}: phase={checkpoint['phase']}")
+            return checkpoint
+        return {"tenant": self.tenant_id, "target": self.target_shard, "phase": "copy", "tables": {}}
+
+    def _save_checkpoint(self) -> None:
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _set_mapping(self, value: str) -> None:
+        get_cache().redis_client.hset(SHARD_MAP_KEY, self.tenant_id, value)
+
+    def _copy_rows(self, table_name: str, pk: str, rows: List[Dict]) -> None:
+        """幂等写入目标分片：先删除同主键行再插入"""
+        table = Base.metadata.tables[table_name]
+        keys = [row[pk] for row in rows]
+        with self.target.begin() as conn:
+            conn.execute(delete(table).where(table.c[pk].in_(keys)))
+            conn.execute(table.insert(), rows)
+
+    def _copy_table(self, table_name: str, pk: str) -> int:
+        """按主键顺序分批复制"""
+        table = Base.metadata.tables[table_name]
+        last_key = self.checkpoint["tables"].get(table_name)
+        copied = 0
+        while True:
+            with self.source.connect() as conn:
+                rows = [
+                    dict(row._mapping)
+                    for row in conn.execute(self._tenant_range(table, pk, last_key).limit(self.chunk_size))
+                ]
+            if not rows:
+                return copied
+            self._copy_rows(table_name, pk, rows)
+            last_key = rows[-1][pk]
+            copied += len(rows)
+            self.checkpoint["tables"][table_name] = last_key
+            self._save_checkpoint()
+            self._pause()
+
+    def _tenant_range(self, table, pk: str, after, upto=None):
+        """租户在主键区间 (after, upto] 内的行（upto为None时不设上界）"""
+        query = select(table).where(table.c.tenant_id == self.tenant_id)
+        if after is not None:
+            query = query.where(table.c[pk] > after)
+        if upto is not None:
+            query = query.where(table.c[pk] <= upto)
+        return query.order_by(table.c[pk])
+
+    def _sync_changed(self, table_name: str, pk: str) -> int:
+        """按主键分段比对整行，写入目标分片缺失或内容不同的行"""
+        table = Base.metadata.tables[table_name]
+        progress_key = f"{table_name}:delta"
+        last_key = self.checkpoint["tables"].get(progress_key)
+        synced = 0
+        while True:
+            with self.source.connect() as conn:
+                rows = [
+                    dict(row._mapping)
+                    for row in conn.execute(self._tenant_range(table, pk, last_key).limit(self.chunk_size))
+                ]
+            if not rows:
+                return synced
+            with self.target.connect() as conn:
+                existing = {
+                    row._mapping[pk]: dict(row._mapping)
+                    for row in conn.execute(self._tenant_range(table, pk, last_key, rows[-1][pk]))
+                }
+            missing = [row for row in rows if row[pk] not in existing]
+            changed = [row for row in rows if row[pk] in existing and existing[row[pk]] != row]
+            if missing or changed:
+                # 已有的行原地更新，不删除重建（子表已引用该行）
+                with self.target.begin() as conn:
+                    for row in changed:
+                        conn.execute(update(table).where(table.c[pk] == row[pk]).values(row))
+                    if missing:
+                        conn.execute(table.insert(), missing)
+            synced += len(missing) + len(changed)
+            last_key = rows[-1][pk]
+            self.checkpoint["tables"][progress_key] = last_key
+            self._save_checkpoint()
+
+    def _sync_removed(self, table_name: str, pk: str) -> int:
+        """删除目标分片上源库已不存在的行（只比对主键）"""
+        table = Base.metadata.tables[table_name]
+        progress_key = f"{table_name}:removed"
+        last_key = self.checkpoint["tables"].get(progress_key)
+        removed = 0
+        while True:
+            query = select(table.c[pk]).where(table.c.tenant_id == self.tenant_id)
+            if last_key is not None:
+                query = query.where(table.c[pk] > last_key)
+            with self.target.connect() as conn:
+                keys = conn.execute(query.order_by(table.c[pk]).limit(self.chunk_size)).scalars().all()
+            if not keys:
+                return removed
+            with self.source.connect() as conn:
+                present = set(conn.execute(select(table.c[pk]).where(table.c[pk].in_(keys))).scalars())
+            stale = [key for key in keys if key not in present]
+            if stale:
+                with self.target.begin() as conn:
+                    conn.execute(delete(table).where(table.c[pk].in_(stale)))
+            removed += len(stale)
+            last_key = keys[-1]
+            self.checkpoint["tables"][progress_key] = last_key
+            self._save_checkpoint()
+
+    def _pause(self) -> None:
+        if self.pause_seconds:
+            time.sleep(self.pause_seconds)
+
+    def _count(self, db_engine: Engine, table_name: str) -> int:
+        table = Base.metadata.tables[table_name]
+        with db_engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(table).where(table.c.tenant_id == self.tenant_id)
+            ).scalar()
+
+    def copy(self) -> None:
+        """阶段1：在线批量复制"""
+        if "copy_started_at" not in self.checkpoint:
+            self.checkpoint["source"] = self.source_shard
+            self.checkpoint["copy_started_at"] = datetime.utcnow().isoformat()
+            self._save_checkpoint()
+        for table_name, pk in TENANT_TABLES:
+            copied = self._copy_table(table_name, pk)
+            logger.info(f"Copied {copied} rows from {table_name}")
+        self.checkpoint["phase"] = "cutover"
+        self._save_checkpoint()
+
+    def cutover(self) -> None:
+        """阶段2：冻结租户、补齐增量、校验并切换映射"""
+        self._set_mapping(f"{MOVING_PREFIX}{self.target_shard}")
+        # 等待所有worker刷新到moving状态，确保不再有新的写入
+        time.sleep(settings.shard_map_refresh_seconds + 1)
+
+        try:
+            for table_name, pk in TENANT_TABLES:
+                synced = self._sync_changed(table_name, pk)
+                logger.info(f"Synced {synced} new or changed rows in {table_name}")
+            for table_name, pk in reversed(TENANT_TABLES):
+                removed = self._sync_removed(table_name, pk)
+                logger.info(f"Removed {removed} rows deleted on source from {table_name}")
+
+            mismatches = {}
+            for table_name, _ in TENANT_TABLES:
+                source_count, target_count = self._count(self.source, table_name), self._count(self.target, table_name)
+                if source_count != target_count:
+                    mismatches[table_name] = {"source": source_count, "target": target_count}
+            if mismatches:
+                raise RuntimeError(f"Row count mismatch after copy: {mismatches}")
+        except Exception:
+            # 失败时恢复到源分片，租户恢复写入后增量进度失效，可修复后重新执行cutover
+            self._set_mapping(self.source_shard)
+            for key in [k for k in self.checkpoint["tables"] if k.endswith(_DELTA_SUFFIXES)]:
+                del self.checkpoint["tables"][key]
+            self._save_checkpoint()
+            raise
+
+        self._set_mapping(self.target_shard)
+        self.checkpoint["phase"] = "cleanup"
+        self._save_checkpoint()
+
+    def cleanup(self) -> None:
+        """阶段3：分批删除源分片上的租户数据（按外键逆序）"""
+        for table_name, pk in reversed(TENANT_TABLES):
+            table = Base.metadata.tables[table_name]
+            while True:
+                with self.source.begin() as conn:
+                    keys = conn.execute(
+                        select(table.c[pk]).where(table.c.tenant_id == self.tenant_id).limit(self.chunk_size)
+                    ).scalars().all()
+                    if not keys:
+                        break
+                    conn.execute(delete(table).where(table.c[pk].in_(keys)))
+                self._pause()
+        self.checkpoint["phase"] = "done"
+        self._save_checkpoint()
+
+    def run(self, delete_source: bool = False) -> Dict:
+        """执行（或从检查点继续）迁移"""
+        if self.checkpoint["phase"] == "copy":
+            self.copy()
+        if self.checkpoint["phase"] == "cutover":
+            self.cutover()
+        if self.checkpoint["phase"] == "cleanup" and delete_source:
+            self.cleanup()
+        return self.checkpoint
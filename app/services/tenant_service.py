@@ -0,0 +1,56 @@
+"""
+租户注册表维护（管理接口使用）
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.sharding import tenant_session
+from ..core.tenants import get_tenant_registry
+from ..models import user as user_model
+
+
+def list_tenants(db: Session) -> List[user_model.Tenant]:
+    return db.query(user_model.Tenant).order_by(user_model.Tenant.tenant_id).all()
+
+
+def get_tenant(db: Session, tenant_id: str) -> Optional[user_model.Tenant]:
+    return db.query(user_model.Tenant).filter(user_model.Tenant.tenant_id == tenant_id).first()
+
+
+def _count_existing_users(tenant_id: str) -> int:
+    """统计租户已有用户数（登记租户时执行，之后由注册与删除增量维护）"""
+    with tenant_session(tenant_id) as db:
+        return db.query(func.count(user_model.UserCore.user_id)).filter(
+            user_model.UserCore.tenant_id == tenant_id,
+            user_model.UserCore.status != user_model.UserStatus.DELETED
+        ).scalar()
+
+
+def save_tenant(db: Session, tenant_id: str, tenant_settings: user_model.TenantSettings) -> user_model.Tenant:
+    """
+    登记或更新租户配置，递增版本号使各进程刷新快照
+    新登记的租户在提交后统计已有用户数：未登记的租户注册时不占用名额，提交前统计会漏掉统计与提交之间的注册；
+    其他进程在下次轮询（tenant_registry_poll_seconds）前仍按未登记处理，这段时间内的注册不计入 user_count
+    """
+    tenant = get_tenant(db, tenant_id)
+    created = tenant is None
+    if created:
+        tenant = user_model.Tenant(tenant_id=tenant_id, user_count=0, version=1)
+        db.add(tenant)
+    else:
+        tenant.version = user_model.Tenant.version + 1
+    for key, value in tenant_settings.model_dump().items():
+        setattr(tenant, key, value)
+    tenant.updated_at = datetime.utcnow()
+    db.commit()
+    if created:
+        tenant.user_count = _count_existing_users(tenant_id)
+        db.commit()
+    db.refresh(tenant)
+    # 本进程立即生效，其他进程在下次轮询时生效
+    get_tenant_registry().refresh()
+    return tenant
@@ -0,0 +1,277 @@
+"""
+App使用记录归档
+将会话开始时间早于保留期（app_usage_archive_after_days）的 user_app_usage 记录归档到本机磁盘并从数据库删除
+
+目录结构（按租户、日期分区）：
+    {app_usage_archive_dir}/tenant={tenant_id}/date={yyyy-mm-dd}/part-{run_id}.ndjson.gz   每行一条会话
+    {app_usage_archive_dir}/tenant={tenant_id}/date={yyyy-mm-dd}/part-{run_id}.json        清单（行数、sha256、状态）
+
+流程（各分片依次处理，每天一个区间）：
+1. 服务端游标（stream_results）按 session_start_time 流式读取，同时写入各租户的gzip文件并计算行数与sha256
+2. 重新流式读取文件校验行数与sha256，不一致时删除该文件并中止
+3. 再次流式读取已校验的文件，按其中的 session_id 分批删除（只删除已归档的行，归档期间新写入的旧会话留待下次）
+清单状态 written -> verified -> deleted；中断后重新执行时先完成未结束的清单，再继续归档
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Engine
+
+from ..core.config import settings
+from ..core.serialization import dumps
+from ..core.sharding import shard_router
+from ..models.user import Base
+
+logger = logging.getLogger(__name__)
+
+try:
+    from orjson import loads as _loads
+except ImportError:  # 可选依赖
+    _loads = json.loads
+
+
+def _tenant_dir(archive_dir: str, tenant_id: str) -> str:
+    return os.path.join(archive_dir, f"tenant={quote(tenant_id, safe='')}")
+
+
+def _partition_dir(archive_dir: str, tenant_id: str, day: date) -> str:
+    return os.path.join(_tenant_dir(archive_dir, tenant_id), f"date={day.isoformat()}")
+
+
+def _read_lines(data_path: str) -> Iterator[bytes]:
+    """流式读取归档文件（逐行解压，不整体加载）"""
+    with gzip.open(data_path, "rb") as f:
+        yield from f
+
+
+def _write_manifest(manifest_path: str, manifest: Dict) -> None:
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+
+
+class _PartWriter:
+    """单个分区文件的写入器，边写边计算行数与sha256"""
+
+    def __init__(self, archive_dir: str, tenant_id: str, day: date, run_id: str, shard: str):
+        partition_dir = _partition_dir(archive_dir, tenant_id, day)
+        os.makedirs(partition_dir, exist_ok=True)
+        self.data_path = os.path.join(partition_dir, f"part-{run_id}.ndjson.gz")
+        self.manifest_path = os.path.join(partition_dir, f"part-{run_id}.json")
+        self.manifest = {
+            "tenant_id": tenant_id,
+            "date": day.isoformat(),
+            "shard": shard,
+            "file": os.path.basename(self.data_path),
+        }
+        self.rows = 0
+        self.digest = hashlib.sha256()
+        self._file = gzip.open(f"{self.data_path}.tmp", "wb")
+
+    def write(self, line: bytes) -> None:
+        self._file.write(line)
+        self.digest.update(line)
+        self.rows += 1
+
+    def close(self) -> Dict:
+        self._file.close()
+        os.replace(f"{self.data_path}.tmp", self.data_path)
+        self.manifest.update(rows=self.rows, sha256=self.digest.hexdigest(), state="written")
+        _write_manifest(self.manifest_path, self.manifest)
+        return self.manifest
+
+    def abort(self) -> None:
+        self._file.close()
+        os.remove(f"{self.data_path}.tmp")
+
+
+class UsageArchiver:
+    """App使用记录归档"""
+
+    def __init__(
+        self,
+        archive_dir: Optional[str] = None,
+        after_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None
+    ):
+        self.archive_dir = archive_dir or settings.app_usage_archive_dir
+        self.batch_size = batch_size or settings.app_usage_archive_batch_size
+        self.pause_seconds = settings.app_usage_archive_pause_seconds if pause_seconds is None else pause_seconds
+        days = settings.app_usage_archive_after_days if after_days is None else after_days
+        # 只归档完整的天
+        self.cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=days), datetime.min.time())
+        self.run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        self.table = Base.metadata.tables["user_app_usage"]
+
+    def _pause(self) -> None:
+        if self.pause_seconds:
+            time.sleep(self.pause_seconds)
+
+    def _next_day(self, db_engine: Engine, since: Optional[datetime]) -> Optional[date]:
+        """since之后最早一条待归档会话所在的日期（走session_start_time索引）"""
+        query = select(func.min(self.table.c.session_start_time)).where(
+            self.table.c.session_start_time < self.cutoff
+        )
+        if since is not None:
+            query = query.where(self.table.c.session_start_time >= since)
+        with db_engine.connect() as conn:
+            earliest = conn.execute(query).scalar()
+        return earliest.date() if earliest is not None else None
+
+    def _archive_day(self, shard: str, db_engine: Engine, day: date) -> List[Tuple[str, Dict]]:
+        """服务端游标流式读取一天的会话，按租户写入分区文件"""
+        start = datetime.combine(day, datetime.min.time())
+        query = select(self.table).where(
+            self.table.c.session_start_time >= start,
+            self.table.c.session_start_time < min(start + timedelta(days=1), self.cutoff)
+        ).order_by(self.table.c.session_start_time)
+        writers: Dict[str, _PartWriter] = {}
+        try:
+            with db_engine.connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=self.batch_size).execute(query)
+                for row in result:
+                    record = dict(row._mapping)
+                    writer = writers.get(record["tenant_id"])
+                    if writer is None:
+                        writer = writers[record["tenant_id"]] = _PartWriter(
+                            self.archive_dir, record["tenant_id"], day, f"{self.run_id}-{shard}", shard
+                        )
+                    writer.write(dumps(record) + b"\n")
+        except BaseException:
+            for writer in writers.values():
+                writer.abort()
+            raise
+        return [(writer.manifest_path, writer.close()) for writer in writers.values()]
+
+    def _verify(self, manifest_path: str, manifest: Dict) -> None:
+        """重新读取文件，校验行数与sha256"""
+        data_path = os.path.join(os.path.dirname(manifest_path), manifest["file"])
+        digest, rows = hashlib.sha256(), 0
+        for line in _read_lines(data_path):
+            digest.update(line)
+            rows += 1
+        if rows != manifest["rows"] or digest.hexdigest() != manifest["sha256"]:
+            # 删除损坏的文件，数据仍在数据库中，下次执行重新归档
+            os.remove(data_path)
+            os.remove(manifest_path)
+            raise RuntimeError(
+                f"Archive verification failed for {data_path}: "
+                f"rows {rows}/{manifest['rows']}, sha256 {digest.hexdigest()}/{manifest['sha256']}"
+            )
+        manifest["state"] = "verified"
+        _write_manifest(manifest_path, manifest)
+
+    def _delete_archived(self, manifest_path: str, manifest: Dict) -> None:
+        """按归档文件中的session_id分批删除数据库中的行"""
+        db_engine = shard_router.engines[manifest["shard"]]
+        data_path = os.path.join(os.path.dirname(manifest_path), manifest["file"])
+        deleted, keys = 0, []
+
+        def flush() -> int:
+            with db_engine.begin() as conn:
+                count = conn.execute(delete(self.table).where(self.table.c.session_id.in_(keys))).rowcount
+            self._pause()
+            return count
+
+        for line in _read_lines(data_path):
+            keys.append(_loads(line)["session_id"])
+            if len(keys) >= self.batch_size:
+                deleted += flush()
+                keys = []
+        if keys:
+            deleted += flush()
+        if deleted != manifest["rows"]:
+            # 归档后被注销清理等其他流程删除的行
+            logger.warning(f"Deleted {deleted} of {manifest['rows']} archived rows for {data_path}")
+        manifest.update(state="deleted", deleted=deleted)
+        _write_manifest(manifest_path, manifest)
+
+    def _finish(self, manifest_path: str, manifest: Dict) -> None:
+        if manifest["state"] == "written":
+            self._verify(manifest_path, manifest)
+        if manifest["state"] == "verified":
+            self._delete_archived(manifest_path, manifest)
+
+    def _pending_manifests(self) -> Iterator[Tuple[str, Dict]]:
+        """上次中断时未完成的清单"""
+        if not os.path.isdir(self.archive_dir):
+            return
+        for root, _, files in os.walk(self.archive_dir):
+            for name in sorted(files):
+                if name.startswith("part-") and name.endswith(".json"):
+                    manifest_path = os.path.join(root, name)
+                    with open(manifest_path) as f:
+                        manifest = json.load(f)
+                    if manifest["state"] != "deleted":
+                        yield manifest_path, manifest
+
+    def run(self) -> Dict:
+        """执行归档，返回续完的文件数及各分片归档的天数、文件数与行数"""
+        resumed = 0
+        for manifest_path, manifest in self._pending_manifests():
+            logger.info(f"Resuming archive {manifest_path}: state={manifest['state']}")
+            self._finish(manifest_path, manifest)
+            resumed += 1
+
+        summary = {"cutoff": self.cutoff.isoformat(), "resumed_files": resumed, "shards": {}}
+        for shard, db_engine in sorted(shard_router.engines.items()):
+            stats = summary["shards"][shard] = {"days": 0, "files": 0, "rows": 0}
+            day = self._next_day(db_engine, None)
+            while day is not None:
+                parts = self._archive_day(shard, db_engine, day)
+                for manifest_path, manifest in parts:
+                    self._finish(manifest_path, manifest)
+                    stats["rows"] += manifest["rows"]
+                stats["days"] += 1
+                stats["files"] += len(parts)
+                logger.info(f"Archived {day.isoformat()} on shard {shard}: {len(parts)} files")
+                day = self._next_day(db_engine, datetime.combine(day + timedelta(days=1), datetime.min.time()))
+        return summary
+
+
+def iter_archived_sessions(
+    tenant_id: str,
+    user_id: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    archive_dir: Optional[str] = None
+) -> Iterator[dict]:
+    """
+    按日期顺序流式读取租户（可选指定用户）的归档会话，start/end 为闭区间
+    只读取已校验的文件；按用户读取时先按原始行过滤，命中的行才解析
+    """
+    tenant_dir = _tenant_dir(archive_dir or settings.app_usage_archive_dir, tenant_id)
+    if not os.path.isdir(tenant_dir):
+        return
+    needle = user_id.encode() if user_id else None
+    for partition in sorted(os.listdir(tenant_dir)):
+        if not partition.startswith("date="):
+            continue
+        day = date.fromisoformat(partition[len("date="):])
+        if (start and day < start) or (end and day > end):
+            continue
+        partition_dir = os.path.join(tenant_dir, partition)
+        for name in sorted(os.listdir(partition_dir)):
+            if not (name.startswith("part-") and name.endswith(".json")):
+                continue
+            with open(os.path.join(partition_dir, name)) as f:
+                manifest = json.load(f)
+            if manifest["state"] not in ("verified", "deleted"):
+                continue
+            for line in _read_lines(os.path.join(partition_dir, manifest["file"])):
+                if needle is not None and needle not in line:
+                    continue
+                record = _loads(line)
+                if user_id is None or record["user_id"] == user_id:
+                    yield record
@@ -0,0 +1,107 @@
+"""
+管理端用户列表与搜索
+user_core 左连接 user_profile，按租户筛选状态、注册渠道、产品、注册时间区间，
+支持邮箱/手机号前缀搜索：
+- 键集分页：按 (tenant_id, register_time, user_id) 倒序，对应索引 ix_user_core_tenant_register
+- 前缀搜索：PostgreSQL使用 (tenant_id, email/phone text_pattern_ops) 索引，与数据库排序规则无关
+- 总数：PostgreSQL返回执行计划的估算行数（EXPLAIN），不执行 COUNT(*)；其他数据库返回精确计数
+"""
+
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from ..core.pagination import decode_cursor, encode_cursor
+from ..models import user as user_model
+
+UserCore = user_model.UserCore
+UserProfile = user_model.UserProfile
+
+LIST_COLUMNS = (
+    UserCore.user_id,
+    UserCore.tenant_id,
+    UserCore.product_id,
+    UserCore.phone,
+    UserCore.email,
+    UserCore.register_channel,
+    UserCore.status,
+    UserCore.register_time,
+    UserCore.last_login_time,
+    UserProfile.nickname,
+    UserProfile.region,
+)
+
+
+class _ExplainJSON(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) <statement>，参数按原语句类型处理"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_ExplainJSON, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _conditions(tenant_id: str, filters: user_model.UserListFilter) -> list:
+    conditions = [UserCore.tenant_id == tenant_id]
+    if filters.status is not None:
+        conditions.append(UserCore.status == filters.status)
+    if filters.register_channel is not None:
+        conditions.append(UserCore.register_channel == filters.register_channel)
+    if filters.product_id is not None:
+        conditions.append(UserCore.product_id == filters.product_id)
+    if filters.registered_from is not None:
+        conditions.append(UserCore.register_time >= filters.registered_from)
+    if filters.registered_to is not None:
+        conditions.append(UserCore.register_time < filters.registered_to)
+    if filters.email_prefix:
+        conditions.append(UserCore.email.startswith(filters.email_prefix, autoescape=True))
+    if filters.phone_prefix:
+        conditions.append(UserCore.phone.startswith(filters.phone_prefix, autoescape=True))
+    return conditions
+
+
+def list_users(
+    db: Session,
+    tenant_id: str,
+    filters: user_model.UserListFilter,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """查询一页用户（注册时间倒序），返回 (用户, 下一页游标)"""
+    after = decode_cursor(cursor, 2)
+    stmt = select(*LIST_COLUMNS).outerjoin(
+        UserProfile, UserProfile.user_id == UserCore.user_id
+    ).where(*_conditions(tenant_id, filters))
+    if after is not None:
+        try:
+            after_time = datetime.fromisoformat(after[0])
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        stmt = stmt.where(tuple_(UserCore.register_time, UserCore.user_id) < tuple_(after_time, after[1]))
+    stmt = stmt.order_by(UserCore.register_time.desc(), UserCore.user_id.desc()).limit(limit + 1)
+    rows = db.execute(stmt).all()
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor([last.register_time, last.user_id])
+    return rows, None
+
+
+def estimate_total(db: Session, tenant_id: str, filters: user_model.UserListFilter) -> int:
+    """估算符合条件的用户数"""
+    stmt = select(UserCore.user_id).where(*_conditions(tenant_id, filters))
+    if db.get_bind().dialect.name != "postgresql":
+        return db.execute(select(func.count()).select_from(stmt.subquery())).scalar_one()
+    plan = db.execute(_ExplainJSON(stmt)).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -1,9 +1,16 @@
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy.orm import Session, joinedload
+from typing import Dict, List, Optional
 from ..models import user as user_model
 from ..core.security import create_access_token
-from ..core.cache import get_cache
+from ..core.cache import get_cache, user_cache_key
+from ..core.tenants import get_tenant_registry
+from . import analytics
+from .login_activity import get_login_activity
 from datetime import datetime
+import time
+
+class AccountFrozen(Exception):
+    """账号已冻结，拒绝登录"""
 
 def login_or_register_user(
     db: Session, 
@@ -11,83 +18,190 @@ def login_or_register_user(
     tenant_id: str = "default", 
     product_id: Optional[str] = None
 ) -> user_model.UserLoginResponse:
-    """处理用户的登录或注册逻辑（支持租户隔离）"""
-    cache = get_cache()
-    
-    # 检查该 device_id 的用户是否已存在（支持租户隔离）
-    db_user_core = db.query(user_model.UserCore).filter(
+    """
+    处理用户的登录或注册逻辑（支持租户隔离）
+    设备上的账号已注销时按新用户注册；账号被冻结时抛出AccountFrozen
+    """
+    # 检查该 device_id 的用户是否已存在（支持租户隔离），资料在同一次查询中带出
+    db_user_core = db.query(user_model.UserCore).options(
+        joinedload(user_model.UserCore.profile)
+    ).filter(
         user_model.UserCore.device_id == device_id,
-        user_model.UserCore.tenant_id == tenant_id
+        user_model.UserCore.tenant_id == tenant_id,
+        user_model.UserCore.status != user_model.UserStatus.DELETED
     ).first()
 
-    if db_user_core is None:
-        # 用户不存在，创建一个新用户（注册）
-        db_user_core = user_model.UserCore(
-            device_id=device_id,
-            tenant_id=tenant_id,
-            product_id=product_id
-        )
-        db.add(db_user_core)
-        db.commit()
-        db.refresh(db_user_core)
+    if db_user_core is not None and db_user_core.status != user_model.UserStatus.ACTIVE:
+        raise AccountFrozen(db_user_core.user_id)
 
-        db_user_profile = user_model.UserProfile(
-            user_id=db_user_core.user_id,
-            tenant_id=tenant_id
-        )
-        db.add(db_user_profile)
-        db.commit()
-        db.refresh(db_user_profile)
+    if db_user_core is None:
+        # 用户不存在，创建一个新用户（注册），先占用租户用户名额
+        tenants = get_tenant_registry()
+        tenants.reserve_user(tenant_id)
+        # 用户与资料在同一事务中写入，任一失败都归还名额
+        try:
+            db_user_core = user_model.UserCore(
+                device_id=device_id,
+                tenant_id=tenant_id,
+                product_id=product_id
+            )
+            db.add(db_user_core)
+            db.flush()
+            db_user_profile = user_model.UserProfile(
+                user_id=db_user_core.user_id,
+                tenant_id=tenant_id
+            )
+            db.add(db_user_profile)
+            db.commit()
+            db.refresh(db_user_core)
+            db.refresh(db_user_profile)
+        except Exception:
+            db.rollback()
+            tenants.release_users(tenant_id)
+            raise
+        analytics.record_activity(db_user_core.user_id, tenant_id, user_model.RegisterChannel.DEVICE_ID.value, "register")
     else:
-        # 更新最后登录时间
-        db_user_core.last_login_time = datetime.utcnow()
-        db.commit()
-
-    db_user_profile = db.query(user_model.UserProfile).filter(
-        user_model.UserProfile.user_id == db_user_core.user_id
-    ).first()
-
-    # 清理用户缓存
-    cache.clear_user_cache(db_user_core.user_id, tenant_id)
+        # 最后登录时间与缓存清理在后台批量执行
+        db_user_profile = db_user_core.profile
+        get_login_activity().record(db, db_user_core.user_id, tenant_id)
+        analytics.record_activity(db_user_core.user_id, tenant_id, user_model.RegisterChannel.DEVICE_ID.value, "login")
 
     # 用户已存在或刚刚被创建（登录）
     access_token = create_access_token(data={
         "sub": db_user_core.user_id,
         "tenant_id": tenant_id,
         "product_id": product_id
-    })
+    }, expires_delta=get_tenant_registry().token_ttl(tenant_id))
 
     return user_model.UserLoginResponse(
         token=access_token,
         user_id=db_user_core.user_id,
-        nickname=db_user_profile.nickname,
+        nickname=db_user_profile.nickname if db_user_profile else "新朋友",
     )
 
+def _write_through(user_id: str, tenant_id: str, name: str, value: dict) -> None:
+    """写入后更新缓存；写入失败时删除旧条目，避免读到过期数据"""
+    cache = get_cache()
+    key = user_cache_key(user_id, tenant_id, name)
+    if not cache.set_entry(key, value, get_tenant_registry().cache_ttl(tenant_id)):
+        cache.delete(key)
+
+def get_cached_user_profile(db: Session, user_id: str, tenant_id: str = "default") -> Optional[dict]:
+    """读取用户资料（读穿缓存，不存在时返回None）"""
+    def load():
+        profile = db.query(user_model.UserProfile).filter(user_model.UserProfile.user_id == user_id).first()
+        return user_model.UserProfileResponse.model_validate(profile).model_dump(mode="json") if profile else None
+    return get_cache().get_or_load(user_cache_key(user_id, tenant_id, "profile"), load, get_tenant_registry().cache_ttl(tenant_id))
+
+def update_user_profile(db: Session, user_id: str, profile_data: user_model.UserProfileResponse, tenant_id: str = "default"):
+    """更新用户资料并写穿缓存，资料不存在时返回None"""
+    user_profile = db.query(user_model.UserProfile).filter(user_model.UserProfile.user_id == user_id).first()
+    if not user_profile:
+        return None
+
+    for key, value in profile_data.model_dump(exclude_unset=True).items():
+        if key == "user_id":
+            continue
+        setattr(user_profile, key, value)
+
+    db.commit()
+    db.refresh(user_profile)
+    _write_through(user_id, tenant_id, "profile", user_model.UserProfileResponse.model_validate(user_profile).model_dump(mode="json"))
+    # 名片包含昵称与头像，删除后由批量查询重新加载
+    get_cache().delete(user_cache_key(user_id, tenant_id, "card"))
+    return user_profile
+
+def get_user_cards(db: Session, user_ids: List[str], tenant_id: str = "default") -> List[Optional[dict]]:
+    """
+    批量获取用户名片（昵称、头像），按请求顺序返回，不存在或已删除的用户为None
+    命中部分一次MGET读取，未命中部分一次IN查询并以流水线回填（不存在的写入负缓存）
+    """
+    cache = get_cache()
+    unique_ids = list(dict.fromkeys(user_ids))
+    keys = [user_cache_key(user_id, tenant_id, "card") for user_id in unique_ids]
+    cards: Dict[str, Optional[dict]] = {}
+    misses = []
+    for user_id, entry in zip(unique_ids, cache.get_entries(keys)):
+        if entry is None:
+            misses.append(user_id)
+        else:
+            cards[user_id] = entry["value"]
+
+    if misses:
+        start_time = time.perf_counter()
+        rows = db.query(
+            user_model.UserCore.user_id, user_model.UserProfile.nickname, user_model.UserProfile.avatar_url
+        ).outerjoin(
+            user_model.UserProfile, user_model.UserProfile.user_id == user_model.UserCore.user_id
+        ).filter(
+            user_model.UserCore.tenant_id == tenant_id,
+            user_model.UserCore.user_id.in_(misses),
+            user_model.UserCore.status != user_model.UserStatus.DELETED
+        ).all()
+        loaded = {row.user_id: {"nickname": row.nickname, "avatar_url": row.avatar_url} for row in rows}
+        cache.set_entries(
+            {user_cache_key(user_id, tenant_id, "card"): loaded.get(user_id) for user_id in misses},
+            get_tenant_registry().cache_ttl(tenant_id),
+            delta=time.perf_counter() - start_time
+        )
+        for user_id in misses:
+            cards[user_id] = loaded.get(user_id)
+
+    return [cards[user_id] for user_id in user_ids]
+
 def get_user_interests(db: Session, user_id: str):
     return db.query(user_model.UserInterests).filter(user_model.UserInterests.user_id == user_id).first()
 
-def create_or_update_user_interests(db: Session, user_id: str, interests_data: user_model.UserInterestsCreate):
+def get_cached_user_interests(db: Session, user_id: str, tenant_id: str = "default") -> Optional[dict]:
+    """读取兴趣画像（读穿缓存，不存在时返回None）"""
+    def load():
+        interests = get_user_interests(db, user_id)
+        return user_model.UserInterestsResponse.model_validate(interests).model_dump(mode="json") if interests else None
+    return get_cache().get_or_load(user_cache_key(user_id, tenant_id, "interests"), load, get_tenant_registry().cache_ttl(tenant_id))
+
+def create_or_update_user_interests(db: Session, user_id: str, interests_data: user_model.UserInterestsCreate, tenant_id: str = "default"):
     db_interests = db.query(user_model.UserInterests).filter(user_model.UserInterests.user_id == user_id).first()
     if db_interests:
         for key, value in interests_data.model_dump(exclude_unset=True).items():
             setattr(db_interests, key, value)
         db_interests.collected_at = datetime.utcnow()
     else:
-        db_interests = user_model.UserInterests(user_id=user_id, **interests_data.model_dump())
+        db_interests = user_model.UserInterests(user_id=user_id, tenant_id=tenant_id, **interests_data.model_dump())
     db.add(db_interests)
     db.commit()
     db.refresh(db_interests)
+    _write_through(user_id, tenant_id, "interests", user_model.UserInterestsResponse.model_validate(db_interests).model_dump(mode="json"))
     return db_interests
 
-def record_app_usage(db: Session, user_id: str, app_usage_data: user_model.UserAppUsageCreate):
-    db_app_usage = user_model.UserAppUsage(user_id=user_id, **app_usage_data.model_dump())
+def record_app_usage(db: Session, user: user_model.UserCore, app_usage_data: user_model.UserAppUsageCreate):
+    db_app_usage = user_model.UserAppUsage(user_id=user.user_id, tenant_id=user.tenant_id, **app_usage_data.model_dump())
     db.add(db_app_usage)
     db.commit()
     db.refresh(db_app_usage)
+    analytics.record_activity(user.user_id, user.tenant_id, user.register_channel.value)
     return db_app_usage
 
-
-
-
-
-
+def delete_account(db: Session, user: user_model.UserCore) -> Optional[datetime]:
+    """
+    注销账号：标记为deleted并记录注销时间，解绑登录身份（同一身份再次登录时注册为新用户），
+    归还租户用户名额并清理缓存
+    数据在保留期满后由清理任务（scripts/purge_deleted_users.py）删除；已注销时返回None
+    """
+    deleted_at = datetime.utcnow()
+    updated = db.query(user_model.UserCore).filter(
+        user_model.UserCore.user_id == user.user_id,
+        user_model.UserCore.status != user_model.UserStatus.DELETED
+    ).update({
+        user_model.UserCore.status: user_model.UserStatus.DELETED,
+        user_model.UserCore.deleted_at: deleted_at
+    }, synchronize_session=False)
+    if updated:
+        db.query(user_model.UserIdentity).filter(
+            user_model.UserIdentity.user_id == user.user_id
+        ).delete(synchronize_session=False)
+    db.commit()
+    if not updated:
+        return None
+    get_tenant_registry().release_users(user.tenant_id)
+    get_cache().clear_users_cache([(user.user_id, user.tenant_id)])
+    return deleted_at
@@ -0,0 +1,107 @@
+"""
+聚合接口基准测试：/verify + /profile + /interests 三次调用 vs 单次 /me
+
+在进程内通过 httpx.ASGITransport 驱动完整应用（默认临时SQLite库），
+统计每个“客户端启动屏”的耗时与SQL条数（来自 X-DB-Queries 响应头）。
+读穿缓存依赖Redis；未启动Redis时 /profile、/interests 每次都会查库，可反映冷缓存情况。
+
+用法：
+    python benchmarks/bench_me.py --users 200 --screens 2000 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+os.environ.setdefault("DB_DEBUG_HEADERS", "true")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_me.db")
+
+import httpx
+
+from app.core.database import engine
+from app.core.logging import setup_logging
+from app.main import app
+from app.models.user import Base
+
+SEQUENCES = {
+    "three_calls": [("POST", "/api/user/verify"), ("GET", "/api/user/profile"), ("GET", "/api/user/interests")],
+    "me": [("GET", "/api/user/me")],
+}
+
+
+async def seed_users(client: httpx.AsyncClient, count: int) -> list:
+    tokens = []
+    for index in range(count):
+        response = await client.post("/api/user/login", json={"device_id": f"bench-me-device-{index:06d}"})
+        token = response.json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # 一半用户填写兴趣画像，覆盖有/无关联数据两种情况
+        if index % 2 == 0:
+            await client.post("/api/user/interests", headers=headers, json={"interest_data": {"topics": ["bench"]}})
+        tokens.append(token)
+    return tokens
+
+
+async def run_sequence(client: httpx.AsyncClient, calls: list, tokens: list, screens: int, concurrency: int) -> dict:
+    latencies, queries = [], []
+    remaining = screens
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            headers = {"Authorization": f"Bearer {tokens[remaining % len(tokens)]}"}
+            start = time.perf_counter()
+            screen_queries = 0
+            for method, path in calls:
+                response = await client.request(method, path, headers=headers)
+                assert response.status_code in (200, 404), response.text
+                screen_queries += int(response.headers.get("x-db-queries", 0))
+            latencies.append(time.perf_counter() - start)
+            queries.append(screen_queries)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "screens_per_second": round(screens / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "queries_per_screen": round(statistics.mean(queries), 2),
+        "round_trips_per_screen": len(calls),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--screens", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_logging()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    Base.metadata.create_all(bind=engine)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        tokens = await seed_users(client, args.users)
+        results = {}
+        for name, calls in SEQUENCES.items():
+            # 预热
+            await run_sequence(client, calls, tokens, min(50, args.screens), 1)
+            results[name] = await run_sequence(client, calls, tokens, args.screens, args.concurrency)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""
+中间件栈基准测试：BaseHTTPMiddleware（旧） vs 纯ASGI（新）
+
+在进程内通过 httpx.ASGITransport 驱动应用，排除网络开销，只比较中间件栈本身：
+- hello-world: GET /
+- verify: POST /api/user/verify（get_current_user 替换为固定用户，隔离数据库耗时）
+
+用法：
+    python benchmarks/bench_middleware.py --requests 5000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.api import user_api
+from app.core.cache import get_cache
+from app.core.config import settings
+from app.core.logging import RequestLogger, setup_logging
+from app.core.metrics import observe_request
+from app.core.middleware import CacheMiddleware, RequestLoggingMiddleware
+from app.core.query_stats import begin_request_stats, end_request_stats
+from app.core.security import get_current_user
+from app.models import user as user_model
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    """基于BaseHTTPMiddleware的旧实现（对照组）"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        query_stats, stats_token = begin_request_stats()
+        try:
+            response = await call_next(request)
+            processing_time = time.time() - start_time
+            route = request.url.path
+            RequestLogger.log_access(
+                request.method, route, request.url.path, response.status_code, processing_time,
+                getattr(request.state, "user_id", None), getattr(request.state, "tenant_id", None)
+            )
+            observe_request(request.method, route, response.status_code, processing_time)
+            response.headers["X-Process-Time"] = str(processing_time)
+            return response
+        finally:
+            end_request_stats(query_stats, stats_token, request.url.path)
+
+
+class LegacyCacheMiddleware(BaseHTTPMiddleware):
+    """基于BaseHTTPMiddleware的旧缓存实现（对照组），整体读取body_iterator"""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method != "GET":
+            return await call_next(request)
+        cache = get_cache()
+        cache_key = f"response:{request.method}:{request.url}"
+        cached_response = cache.get(cache_key)
+        if cached_response:
+            return Response(
+                content=cached_response["content"],
+                status_code=cached_response["status_code"],
+                headers={"X-Cache": "HIT", **cached_response.get("headers", {})}
+            )
+        response = await call_next(request)
+        if response.status_code == 200:
+            response_body = b""
+            async for chunk in response.body_iterator:
+                response_body += chunk
+            cache.set(cache_key, {
+                "content": response_body.decode(),
+                "status_code": response.status_code,
+                "headers": dict(response.headers)
+            }, ttl=settings.cache_ttl_seconds)
+            return Response(content=response_body, status_code=response.status_code,
+                            headers={"X-Cache": "MISS", **dict(response.headers)})
+        return response
+
+
+def _fake_user() -> user_model.UserCore:
+    return user_model.UserCore(
+        user_id="bench-user",
+        tenant_id="default",
+        register_channel=user_model.RegisterChannel.DEVICE_ID,
+        status=user_model.UserStatus.ACTIVE,
+        device_id="bench-device",
+    )
+
+
+def build_app(logging_middleware, cache_middleware=None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(logging_middleware)
+    if cache_middleware is not None:
+        app.add_middleware(cache_middleware)
+    app.include_router(user_api.router, prefix=f"{settings.api_prefix}/user")
+    app.dependency_overrides[get_current_user] = _fake_user
+
+    @app.get("/")
+    def read_root():
+        return {"status": "running"}
+
+    return app
+
+
+async def run_case(app: FastAPI, method: str, path: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": "Bearer bench"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 预热
+        for _ in range(50):
+            await client.request(method, path, headers=headers)
+
+        remaining = total
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.request(method, path, headers=headers)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--with-cache", action="store_true", help="同时挂载缓存中间件（需要Redis）")
+    args = parser.parse_args()
+
+    setup_logging()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    stacks = {
+        "base_http": build_app(LegacyRequestLoggingMiddleware, LegacyCacheMiddleware if args.with_cache else None),
+        "pure_asgi": build_app(RequestLoggingMiddleware, CacheMiddleware if args.with_cache else None),
+    }
+    cases = [("hello_world", "GET", "/"), ("verify", "POST", "/api/user/verify")]
+
+    results = {}
+    for stack_name, app in stacks.items():
+        for case_name, method, path in cases:
+            rps = await run_case(app, method, path, args.requests, args.concurrency)
+            results[f"{stack_name}.{case_name}"] = round(rps, 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+响应序列化基准测试：服务端每请求CPU时间（默认路径 vs fast_serialization）
+
+分别以 FAST_SERIALIZATION=false / true 启动 app.main:app（uvicorn子进程），
+对 /verify、/profile、/login（已有设备）各顺序发送N个请求，
+读取服务进程 /proc/<pid>/stat 中的 utime+stime 差值，得到每请求CPU毫秒数（仅Linux）。
+
+用法：
+    python benchmarks/bench_serialization.py --requests 2000
+    python benchmarks/bench_serialization.py --redis-url redis://localhost:6379
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest.run import REPO_ROOT, _free_port, _spawn, _terminate, _wait_http
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _cpu_seconds(pid: int) -> float:
+    """进程累计用户态+内核态CPU时间"""
+    with open(f"/proc/{pid}/stat") as stat_file:
+        fields = stat_file.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+def _cpu_per_request(pid: int, send, count: int) -> float:
+    for _ in range(min(200, count)):
+        send()
+    start = _cpu_seconds(pid)
+    for _ in range(count):
+        send()
+    return (_cpu_seconds(pid) - start) / count * 1000
+
+
+def run_mode(args, fast: bool) -> dict:
+    with tempfile.TemporaryDirectory() as work_dir:
+        port = _free_port()
+        env = dict(os.environ)
+        env.update({
+            "DATABASE_URL": args.database_url or f"sqlite:///{work_dir}/serialization.db",
+            "REDIS_URL": args.redis_url,
+            "LOG_SAMPLE_RATE": "0",
+            "ENVIRONMENT": "development",
+            "ADMISSION_ENABLED": "false",
+            "FAST_SERIALIZATION": "true" if fast else "false",
+        })
+        process = _spawn(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+            env, os.path.join(work_dir, "server.log")
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_http(f"{base_url}/api/ready")
+            with httpx.Client(base_url=base_url, timeout=10.0) as client:
+                login = {"device_id": "bench-serialization"}
+                token = client.post("/api/user/login", json=login).json()["token"]
+                headers = {"Authorization": f"Bearer {token}"}
+
+                def check(response):
+                    response.raise_for_status()
+
+                return {
+                    "verify_cpu_ms": round(_cpu_per_request(
+                        process.pid, lambda: check(client.post("/api/user/verify", headers=headers)), args.requests
+                    ), 3),
+                    "profile_cpu_ms": round(_cpu_per_request(
+                        process.pid, lambda: check(client.get("/api/user/profile", headers=headers)), args.requests
+                    ), 3),
+                    "login_cpu_ms": round(_cpu_per_request(
+                        process.pid, lambda: check(client.post("/api/user/login", json=login)), args.requests
+                    ), 3),
+                }
+        finally:
+            _terminate(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--database-url", default=None, help="默认每种模式使用独立的临时SQLite")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379"))
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    results = {
+        "default": run_mode(args, fast=False),
+        "fast_serialization": run_mode(args, fast=True),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
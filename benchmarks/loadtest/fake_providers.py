@@ -0,0 +1,71 @@
+"""
+压测用第三方认证提供商替身（微信 / QQ / Google）
+
+对外暴露与真实接口路径一致的最小实现，通过 WECHAT_API_BASE / QQ_API_BASE /
+GOOGLE_API_BASE 指向本服务即可。可选的 FAKE_PROVIDER_LATENCY_MS 用于模拟上游耗时。
+
+凭据约定（便于压测脚本构造可复现的用户）：
+- 微信 code=wx-<id>           → openid=wx-<id>
+- QQ access_token=qq-<id>     → openid=qq-<id>
+- Google id_token=g-<id>      → sub=g-<id>，email=<id>@loadtest.local
+
+用法：
+    uvicorn benchmarks.loadtest.fake_providers:app --port 9100
+"""
+
+import asyncio
+import json
+import os
+
+from fastapi import FastAPI, Response
+
+app = FastAPI(title="Fake Auth Providers")
+
+LATENCY_SECONDS = float(os.getenv("FAKE_PROVIDER_LATENCY_MS", "0")) / 1000
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "loadtest-client")
+
+
+async def _simulate_latency():
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+
+
+# 微信
+@app.get("/wechat/sns/oauth2/access_token")
+async def wechat_access_token(code: str, appid: str = "", secret: str = "", grant_type: str = ""):
+    await _simulate_latency()
+    return {"access_token": f"at-{code}", "openid": code, "expires_in": 7200}
+
+
+@app.get("/wechat/sns/userinfo")
+async def wechat_userinfo(access_token: str, openid: str, lang: str = "zh_CN"):
+    await _simulate_latency()
+    return {"openid": openid, "nickname": f"微信用户{openid[-4:]}", "headimgurl": f"https://img.local/{openid}.png"}
+
+
+# QQ（/oauth2.0/me 返回JSONP）
+@app.get("/qq/oauth2.0/me")
+async def qq_me(access_token: str):
+    await _simulate_latency()
+    body = "callback(" + json.dumps({"client_id": "loadtest", "openid": access_token}) + ");"
+    return Response(content=body, media_type="text/plain")
+
+
+@app.get("/qq/user/get_user_info")
+async def qq_userinfo(access_token: str, openid: str, oauth_consumer_key: str = ""):
+    await _simulate_latency()
+    return {"ret": 0, "nickname": f"QQ用户{openid[-4:]}", "figureurl_qq_1": f"https://img.local/{openid}.png"}
+
+
+# Google
+@app.get("/google/tokeninfo")
+async def google_tokeninfo(id_token: str):
+    await _simulate_latency()
+    user_key = id_token.removeprefix("g-")
+    return {
+        "sub": id_token,
+        "aud": GOOGLE_CLIENT_ID,
+        "email": f"{user_key}@loadtest.local",
+        "name": f"Google User {user_key}",
+        "picture": f"https://img.local/{id_token}.png",
+    }
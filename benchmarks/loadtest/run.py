@@ -0,0 +1,357 @@
+"""
+端到端压测脚本
+
+启动 app.main:app（uvicorn子进程），连接本地数据库（默认临时SQLite，可指定Postgres）、
+本地Redis（自动拉起 redis-server，或通过 --redis-url 指定）以及第三方认证替身服务，
+按权重混合驱动以下场景：
+
+    new_device_login   新设备登录（注册）
+    returning_login    已有设备登录
+    provider_auth      微信/QQ/Google 第三方登录
+    verify             令牌验证
+    profile_get        获取资料
+    profile_put        更新资料
+    app_usage          记录App使用会话
+
+结果以JSON输出（每个场景的RPS与p50/p95/p99），可用 compare 子命令对比两次提交：
+
+    python benchmarks/loadtest/run.py run --duration 30 --concurrency 32 --output before.json
+    python benchmarks/loadtest/run.py run --duration 30 --concurrency 32 --output after.json
+    python benchmarks/loadtest/run.py compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MIX = {
+    "new_device_login": 5,
+    "returning_login": 15,
+    "provider_auth": 10,
+    "verify": 30,
+    "profile_get": 20,
+    "profile_put": 5,
+    "app_usage": 15,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _spawn(args: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log_file = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def _terminate(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _wait_http(url: str, timeout: float = 30.0) -> float:
+    """等待服务就绪，返回等待耗时（秒）"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError(f"Service at {url} did not become ready within {timeout}s")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Workload:
+    """混合场景压测驱动"""
+
+    def __init__(self, client: httpx.AsyncClient, mix: Dict[str, int], seed: int, seed_users: int, provider_users: int):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.scenarios = list(mix.keys())
+        self.weights = list(mix.values())
+        self.provider_users = provider_users
+        self.seed_users = seed_users
+        self.tokens: List[str] = []
+        self.new_device_counter = 0
+        self.latencies: Dict[str, List[float]] = {name: [] for name in mix}
+        self.errors: Dict[str, int] = {name: 0 for name in mix}
+
+    async def seed(self) -> None:
+        """预先注册一批用户，用于已登录场景"""
+        for index in range(self.seed_users):
+            response = await self.client.post("/api/user/login", json={"device_id": f"seed-{index}"})
+            response.raise_for_status()
+            self.tokens.append(response.json()["token"])
+
+    def _auth(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+    async def _request(self, scenario: str) -> httpx.Response:
+        if scenario == "new_device_login":
+            self.new_device_counter += 1
+            return await self.client.post(
+                "/api/user/login", json={"device_id": f"new-{os.getpid()}-{self.new_device_counter}"}
+            )
+        if scenario == "returning_login":
+            return await self.client.post(
+                "/api/user/login", json={"device_id": f"seed-{self.rng.randrange(self.seed_users)}"}
+            )
+        if scenario == "provider_auth":
+            provider = self.rng.choice(["wechat", "qq", "google"])
+            user_key = self.rng.randrange(self.provider_users)
+            credentials = {
+                "wechat": {"code": f"wx-{user_key}"},
+                "qq": {"access_token": f"qq-{user_key}"},
+                "google": {"id_token": f"g-{user_key}"},
+            }[provider]
+            return await self.client.post(
+                "/api/user/auth", json={"provider": provider, "credentials": credentials}
+            )
+        if scenario == "verify":
+            return await self.client.post("/api/user/verify", headers=self._auth())
+        if scenario == "profile_get":
+            return await self.client.get("/api/user/profile", headers=self._auth())
+        if scenario == "profile_put":
+            return await self.client.put("/api/user/profile", headers=self._auth(), json={
+                "user_id": "ignored",
+                "nickname": f"loadtest-{self.rng.randrange(1000)}",
+                "avatar_url": None,
+                "gender": "other",
+                "birth_year": 1990,
+                "region": "global",
+                "language_preference": "en",
+            })
+        if scenario == "app_usage":
+            return await self.client.post("/api/user/app_usage", headers=self._auth(), json={
+                "device_type": self.rng.choice(["iOS", "Android", "Web"]),
+                "app_version": "1.0.0",
+                "duration_seconds": self.rng.randrange(10, 3600),
+            })
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    async def worker(self, deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(self.scenarios, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await self._request(scenario)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                self.latencies[scenario].append(elapsed)
+            else:
+                self.errors[scenario] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        results = {}
+        for scenario in self.scenarios:
+            values = sorted(self.latencies[scenario])
+            results[scenario] = {
+                "count": len(values),
+                "errors": self.errors[scenario],
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(_percentile(values, 50) * 1000, 2),
+                "p95_ms": round(_percentile(values, 95) * 1000, 2),
+                "p99_ms": round(_percentile(values, 99) * 1000, 2),
+            }
+        all_values = sorted(v for values in self.latencies.values() for v in values)
+        results["_total"] = {
+            "count": len(all_values),
+            "errors": sum(self.errors.values()),
+            "rps": round(len(all_values) / elapsed, 2),
+            "p50_ms": round(_percentile(all_values, 50) * 1000, 2),
+            "p95_ms": round(_percentile(all_values, 95) * 1000, 2),
+            "p99_ms": round(_percentile(all_values, 99) * 1000, 2),
+        }
+        return results
+
+
+async def _drive(base_url: str, args, mix: Dict[str, int]) -> Dict[str, Dict[str, float]]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        workload = Workload(client, mix, args.seed, args.seed_users, args.provider_users)
+        await workload.seed()
+        if args.warmup:
+            await asyncio.gather(*(workload.worker(time.perf_counter() + args.warmup) for _ in range(args.concurrency)))
+            workload.latencies = {name: [] for name in mix}
+            workload.errors = {name: 0 for name in mix}
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(workload.worker(deadline) for _ in range(args.concurrency)))
+        return workload.report(time.perf_counter() - start)
+
+
+def run(args) -> Dict:
+    mix = dict(DEFAULT_MIX)
+    for item in args.mix or []:
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown scenario in --mix: {name}")
+        mix[name] = int(weight)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+
+    workdir = tempfile.mkdtemp(prefix="auth-loadtest-")
+    env = dict(os.environ)
+    with ExitStack() as stack:
+        # 第三方认证替身
+        provider_port = _free_port()
+        provider_base = f"http://127.0.0.1:{provider_port}"
+        env.update({
+            "GOOGLE_CLIENT_ID": "loadtest-client",
+            "FAKE_PROVIDER_LATENCY_MS": str(args.provider_latency_ms),
+        })
+        providers = _spawn(
+            [sys.executable, "-m", "uvicorn", "benchmarks.loadtest.fake_providers:app",
+             "--port", str(provider_port), "--log-level", "warning"],
+            env, os.path.join(workdir, "providers.log"),
+        )
+        stack.callback(_terminate, providers)
+
+        # Redis
+        redis_url = args.redis_url
+        if redis_url is None and shutil.which("redis-server"):
+            redis_port = _free_port()
+            redis_process = _spawn(
+                ["redis-server", "--port", str(redis_port), "--save", "", "--appendonly", "no"],
+                env, os.path.join(workdir, "redis.log"),
+            )
+            stack.callback(_terminate, redis_process)
+            redis_url = f"redis://127.0.0.1:{redis_port}"
+        if redis_url is None:
+            print("warning: redis-server not found and --redis-url not given; cache calls will fail fast", file=sys.stderr)
+            redis_url = f"redis://127.0.0.1:{_free_port()}"
+
+        # 被测服务
+        database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+        app_port = _free_port()
+        env.update({
+            "ENVIRONMENT": "development",
+            "DATABASE_URL": database_url,
+            "REDIS_URL": redis_url,
+            "WECHAT_API_BASE": f"{provider_base}/wechat",
+            "QQ_API_BASE": f"{provider_base}/qq",
+            "GOOGLE_API_BASE": f"{provider_base}/google",
+            "LOG_SAMPLE_RATE": str(args.log_sample_rate),
+        })
+        _wait_http(f"{provider_base}/docs")
+        app_process = _spawn(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env, os.path.join(workdir, "app.log"),
+        )
+        stack.callback(_terminate, app_process)
+        startup_seconds = _wait_http(f"http://127.0.0.1:{app_port}/api/ready", timeout=60)
+
+        results = asyncio.run(_drive(f"http://127.0.0.1:{app_port}", args, mix))
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "database": "postgresql" if database_url.startswith("postgres") else "sqlite",
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "seed": args.seed,
+            "mix": mix,
+            "startup_seconds": round(startup_seconds, 3),
+            "logs": workdir,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    with open(candidate_path) as f:
+        candidate = json.load(f)["results"]
+
+    print(f"{'scenario':<18}{'metric':<8}{'baseline':>12}{'candidate':>12}{'delta':>10}")
+    for scenario in sorted(set(baseline) | set(candidate)):
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            before = baseline.get(scenario, {}).get(metric)
+            after = candidate.get(scenario, {}).get(metric)
+            if before is None or after is None:
+                continue
+            delta = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"{scenario:<18}{metric:<8}{before:>12.2f}{after:>12.2f}{delta:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="执行压测")
+    run_parser.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    run_parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒），不计入结果")
+    run_parser.add_argument("--concurrency", type=int, default=32)
+    run_parser.add_argument("--workers", type=int, default=1, help="uvicorn worker数")
+    run_parser.add_argument("--database-url", help="默认使用临时SQLite；Postgres需为空库")
+    run_parser.add_argument("--redis-url", help="默认自动启动本地redis-server")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--seed-users", type=int, default=200)
+    run_parser.add_argument("--provider-users", type=int, default=500)
+    run_parser.add_argument("--provider-latency-ms", type=float, default=20, help="第三方认证替身模拟耗时")
+    run_parser.add_argument("--log-sample-rate", type=float, default=0.0)
+    run_parser.add_argument("--mix", nargs="*", help="覆盖场景权重，如 verify=50 app_usage=0")
+    run_parser.add_argument("--output", help="结果输出文件（默认stdout）")
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次压测结果")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args.baseline, args.candidate)
+        return
+
+    report = json.dumps(run(args), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
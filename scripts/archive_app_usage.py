@@ -0,0 +1,60 @@
+"""
+App使用记录归档工具
+
+archive  将会话开始时间早于保留期的记录流式写入本机压缩文件（按租户/日期分区），
+         校验行数与sha256后分批从数据库删除；建议通过cron定时执行，中断后重新执行即可继续
+read     流式输出租户（可选指定用户）的归档记录（NDJSON）
+
+用法：
+    python scripts/archive_app_usage.py archive --after-days 180 --batch-size 5000
+    python scripts/archive_app_usage.py read --tenant acme --user 6f1c... --start 2025-01-01 --end 2025-03-31
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.serialization import dumps
+from app.services.usage_archive import UsageArchiver, iter_archived_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", default=None, help="归档目录，默认 APP_USAGE_ARCHIVE_DIR")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="归档并删除过期记录")
+    archive.add_argument("--after-days", type=int, default=None, help="默认 APP_USAGE_ARCHIVE_AFTER_DAYS")
+    archive.add_argument("--batch-size", type=int, default=None, help="游标每次读取的行数与每条DELETE的行数上限")
+    archive.add_argument("--pause", type=float, default=None, help="删除批间暂停秒数")
+
+    read = commands.add_parser("read", help="读取归档记录")
+    read.add_argument("--tenant", required=True)
+    read.add_argument("--user", default=None)
+    read.add_argument("--start", type=date.fromisoformat, default=None)
+    read.add_argument("--end", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    if args.command == "read":
+        out = sys.stdout.buffer
+        for record in iter_archived_sessions(args.tenant, args.user, args.start, args.end, args.archive_dir):
+            out.write(dumps(record) + b"\n")
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    archiver = UsageArchiver(
+        archive_dir=args.archive_dir,
+        after_days=args.after_days,
+        batch_size=args.batch_size,
+        pause_seconds=args.pause
+    )
+    print(json.dumps(archiver.run(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
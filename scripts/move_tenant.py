@@ -0,0 +1,45 @@
+"""
+租户分片迁移工具
+
+在线将租户数据复制到目标分片并切换映射，中断后重新执行同一命令即可从检查点继续。
+分片通过 DATABASE_SHARDS 配置，动态映射写入 Redis（需所有实例共享同一Redis）。
+
+用法：
+    python scripts/move_tenant.py --tenant acme --target shard2 --chunk-size 2000 --pause 0.05
+    python scripts/move_tenant.py --tenant acme --target shard2 --delete-source
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.tenant_migration import TenantMover
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--target", required=True, help="目标分片名称（DATABASE_SHARDS 中的键）")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.0, help="每批之间的暂停秒数，用于限制对源库的压力")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件路径")
+    parser.add_argument("--delete-source", action="store_true", help="切换完成后删除源分片数据")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    mover = TenantMover(
+        args.tenant,
+        args.target,
+        chunk_size=args.chunk_size,
+        checkpoint_path=args.checkpoint,
+        pause_seconds=args.pause
+    )
+    print(json.dumps(mover.run(delete_source=args.delete_source), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+注销账号数据清理工具
+
+删除注销超过保留期的用户数据（各分片依次处理），建议通过cron定时执行；
+中断后重新执行同一命令即可从检查点继续。先用 --dry-run 查看待删除的行数。
+
+用法：
+    python scripts/purge_deleted_users.py --dry-run
+    python scripts/purge_deleted_users.py --grace-days 30 --batch-size 500 --pause 0.1
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.account_purge import AccountPurger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--grace-days", type=int, default=None, help="注销后保留天数，默认 ACCOUNT_PURGE_GRACE_DAYS")
+    parser.add_argument("--batch-size", type=int, default=None, help="每批用户数与每条DELETE的行数上限")
+    parser.add_argument("--pause", type=float, default=None, help="每批之间的暂停秒数，用于限制对数据库的压力")
+    parser.add_argument("--checkpoint", default=None, help="检查点文件路径")
+    parser.add_argument("--dry-run", action="store_true", help="只统计待删除的行数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    purger = AccountPurger(
+        grace_days=args.grace_days,
+        batch_size=args.batch_size,
+        pause_seconds=args.pause,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run
+    )
+    print(json.dumps(purger.run(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+测试公共配置
+在导入应用前将数据库指向临时SQLite文件；测试环境不依赖Redis：默认连接失败（缓存按未命中处理），需要时使用 fake_redis 夹具
+"""
+
+import fnmatch
+import os
+import tempfile
+import threading
+import time
+
+_test_dir = tempfile.mkdtemp(prefix="auth-service-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_dir, 'auth.db')}"
+os.environ.setdefault("ENVIRONMENT", "development")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("WARMUP_ENABLED", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import cache as cache_module
+from app.core import idempotency
+from app.core.auth_providers import AuthUserInfo
+from app.core.cache import get_cache
+from app.main import app
+from app.services import auth_service
+
+
+class FakeRedis:
+    """
+    进程内的Redis替身，只实现测试涉及的键值命令
+    其他命令抛出ConnectionError，与Redis不可用时的行为一致
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.RLock()
+        self.scripts = {
+            cache_module._REPLACE_SCRIPT: self._replace_script,
+            idempotency._COMPLETE_SCRIPT: self._complete_script,
+            idempotency._RELEASE_SCRIPT: self._release_script,
+        }
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self.lock:
+            return self._live(key)
+
+    def mget(self, keys):
+        with self.lock:
+            return [self._live(key) for key in keys]
+
+    def exists(self, *keys):
+        with self.lock:
+            return sum(self._live(key) is not None for key in keys)
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self.lock:
+            if nx and self._live(key) is not None:
+                return None
+            expires_at = time.time() + ex if ex else (time.time() + px / 1000 if px else None)
+            self.data[key] = (str(value), expires_at)
+            return True
+
+    def setex(self, key, ttl, value):
+        return self.set(key, value, ex=ttl)
+
+    def hset(self, name, key, value):
+        with self.lock:
+            mapping = self.data.setdefault(name, ({}, None))[0]
+            created = key not in mapping
+            mapping[key] = str(value)
+            return int(created)
+
+    def hgetall(self, name):
+        with self.lock:
+            return dict(self._live(name) or {})
+
+    def keys(self, pattern):
+        with self.lock:
+            return [key for key in list(self.data) if fnmatch.fnmatchcase(key, pattern) and self._live(key) is not None]
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def register_script(self, script):
+        """以Python实现模拟应用中已知的Lua脚本"""
+        handler = self.scripts.get(script)
+        if handler is None:
+            raise ConnectionError("FakeRedis does not support this script")
+        return lambda keys, args: handler(keys, args)
+
+    def _replace_script(self, keys, args):
+        with self.lock:
+            if self._live(keys[0]) != args[0]:
+                return None
+            return self.set(keys[0], args[1], ex=int(args[2]))
+
+    def _complete_script(self, keys, args):
+        with self.lock:
+            if self._live(keys[1]) != args[0]:
+                return 0
+            self.set(keys[0], args[1], ex=int(args[2]))
+            self.delete(keys[1])
+            return 1
+
+    def _release_script(self, keys, args):
+        with self.lock:
+            return self.delete(keys[0]) if self._live(keys[0]) == args[0] else 0
+
+    def __getattr__(self, name):
+        raise ConnectionError(f"FakeRedis does not support {name}")
+
+
+@pytest.fixture(scope="session")
+def client():
+    """应用测试客户端（启动时建表）"""
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+class StubProvider:
+    """以凭据中的openid作为第三方用户ID的认证提供商"""
+
+    async def authenticate(self, credentials):
+        return AuthUserInfo(
+            provider="wechat",
+            provider_user_id=credentials["openid"],
+            nickname="stub"
+        )
+
+
+@pytest.fixture
+def stub_provider(monkeypatch):
+    """所有认证方式都使用StubProvider，不访问第三方接口"""
+    monkeypatch.setattr(
+        auth_service.AuthProviderFactory, "create_provider",
+        staticmethod(lambda provider, config: StubProvider())
+    )
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """以进程内的FakeRedis替换缓存服务的Redis连接"""
+    redis = FakeRedis()
+    monkeypatch.setattr(get_cache(), "redis_client", redis)
+    return redis
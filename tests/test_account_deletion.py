@@ -0,0 +1,79 @@
+"""注销账号后重新登录，以及冻结账号的登录"""
+
+import uuid
+
+from app.core.database import SessionLocal
+from app.models import user as user_model
+
+
+def _device_login(client, device_id):
+    return client.post("/api/user/login", json={"device_id": device_id})
+
+
+def _provider_login(client, openid):
+    return client.post("/api/user/auth", json={"provider": "wechat", "credentials": {"openid": openid}})
+
+
+def _auth(response):
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def _set_status(user_id, status):
+    with SessionLocal() as db:
+        db.query(user_model.UserCore).filter(user_model.UserCore.user_id == user_id).update({"status": status})
+        db.commit()
+
+
+def test_device_relogin_after_deletion_registers_new_user(client):
+    device_id = f"del-{uuid.uuid4().hex}"
+    first = _device_login(client, device_id)
+    assert client.delete("/api/user/account", headers=_auth(first)).status_code == 200
+
+    second = _device_login(client, device_id)
+    assert second.status_code == 200
+    assert second.json()["user_id"] != first.json()["user_id"]
+    assert client.post("/api/user/verify", headers=_auth(second)).status_code == 200
+    # 再次登录仍是新用户，不会匹配到已注销的账号
+    assert _device_login(client, device_id).json()["user_id"] == second.json()["user_id"]
+
+
+def test_provider_relogin_after_deletion_registers_new_user(client, stub_provider):
+    openid = uuid.uuid4().hex
+    first = _provider_login(client, openid)
+    assert client.delete("/api/user/account", headers=_auth(first)).status_code == 200
+    with SessionLocal() as db:
+        assert db.query(user_model.UserIdentity).filter(
+            user_model.UserIdentity.user_id == first.json()["user_id"]
+        ).count() == 0
+
+    second = _provider_login(client, openid)
+    assert second.status_code == 200
+    assert second.json()["user_id"] != first.json()["user_id"]
+    assert client.post("/api/user/verify", headers=_auth(second)).status_code == 200
+    assert _provider_login(client, openid).json()["user_id"] == second.json()["user_id"]
+
+
+def test_provider_relogin_with_identity_left_on_deleted_user(client, stub_provider):
+    openid = uuid.uuid4().hex
+    first = _provider_login(client, openid)
+    # 注销时未解绑身份的账号
+    _set_status(first.json()["user_id"], user_model.UserStatus.DELETED)
+
+    second = _provider_login(client, openid)
+    assert second.status_code == 200
+    assert second.json()["user_id"] != first.json()["user_id"]
+    assert client.post("/api/user/verify", headers=_auth(second)).status_code == 200
+
+
+def test_frozen_account_cannot_log_in(client, stub_provider):
+    device_id = f"frz-{uuid.uuid4().hex}"
+    user_id = _device_login(client, device_id).json()["user_id"]
+    _set_status(user_id, user_model.UserStatus.FROZEN)
+    response = _device_login(client, device_id)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Account is frozen"
+
+    openid = uuid.uuid4().hex
+    user_id = _provider_login(client, openid).json()["user_id"]
+    _set_status(user_id, user_model.UserStatus.FROZEN)
+    assert _provider_login(client, openid).status_code == 403
@@ -0,0 +1,126 @@
+"""注销账号数据清理：分批删除、中断后从检查点继续、dry_run只统计"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core import database
+from app.core.cache import USER_CACHE_NAMES, get_cache, user_cache_key
+from app.core.sharding import DEFAULT_SHARD, shard_router
+from app.models import user as user_model
+from app.services.account_purge import PURGE_TABLES, AccountPurger
+
+TENANT = "purge"
+TABLES = [table_name for table_name, _ in PURGE_TABLES] + ["user_core"]
+
+
+@pytest.fixture
+def shard(tmp_path, monkeypatch, fake_redis):
+    """清理任务只处理一个临时SQLite分片"""
+    engine = database._create_engine(f"sqlite:///{tmp_path / 'purge.db'}")
+    user_model.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(shard_router, "engines", {DEFAULT_SHARD: engine})
+    yield engine
+    engine.dispose()
+
+
+def _add_user(db: Session, status: user_model.UserStatus, deleted_days_ago=None) -> str:
+    user = user_model.UserCore(tenant_id=TENANT, status=status)
+    if deleted_days_ago is not None:
+        user.deleted_at = datetime.utcnow() - timedelta(days=deleted_days_ago)
+    db.add(user)
+    db.flush()
+    db.add(user_model.UserProfile(user_id=user.user_id, tenant_id=TENANT))
+    db.add(user_model.UserInterests(user_id=user.user_id, tenant_id=TENANT))
+    db.add(user_model.UserIdentity(
+        tenant_id=TENANT, provider="device_id", provider_user_id=f"dev-{user.user_id}", user_id=user.user_id
+    ))
+    for _ in range(3):
+        db.add(user_model.UserAppUsage(user_id=user.user_id, tenant_id=TENANT, device_type=user_model.DeviceType.IOS))
+    for name in USER_CACHE_NAMES:
+        get_cache().set(user_cache_key(user.user_id, TENANT, name), {"cached": True})
+    return user.user_id
+
+
+@pytest.fixture
+def accounts(shard):
+    """超过保留期的注销用户（按注销时间排序）、保留期内的注销用户与正常用户"""
+    with Session(shard) as db:
+        expired = [_add_user(db, user_model.UserStatus.DELETED, days) for days in (60, 50, 40)]
+        kept = [
+            _add_user(db, user_model.UserStatus.DELETED, 5),
+            _add_user(db, user_model.UserStatus.ACTIVE),
+        ]
+        db.commit()
+    return expired, kept
+
+
+def _row_counts(engine, user_ids):
+    counts = {}
+    with engine.connect() as conn:
+        for table_name in TABLES:
+            table = user_model.Base.metadata.tables[table_name]
+            counts[table_name] = conn.execute(
+                select(func.count()).select_from(table).where(table.c.user_id.in_(user_ids))
+            ).scalar()
+    return counts
+
+
+def _cached(user_id):
+    return [get_cache().get(user_cache_key(user_id, TENANT, name)) is not None for name in USER_CACHE_NAMES]
+
+
+def _purger(tmp_path, **kwargs):
+    return AccountPurger(grace_days=30, batch_size=2, pause_seconds=0, checkpoint_path=str(tmp_path / "purge.json"), **kwargs)
+
+
+def test_interrupted_purge_resumes_from_checkpoint(shard, accounts, tmp_path, monkeypatch):
+    expired, kept = accounts
+    kept_rows = _row_counts(shard, kept)
+    save = AccountPurger._save_checkpoint
+
+    def save_then_stop(self):
+        save(self)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(AccountPurger, "_save_checkpoint", save_then_stop)
+    first = _purger(tmp_path)
+    with pytest.raises(KeyboardInterrupt):
+        first.run()
+    monkeypatch.setattr(AccountPurger, "_save_checkpoint", save)
+
+    # 第一批（注销最早的两个用户）已删除并写入检查点
+    assert set(_row_counts(shard, expired[:2]).values()) == {0}
+    assert _row_counts(shard, expired[2:]) == {**dict.fromkeys(TABLES, 1), "user_app_usage": 3}
+    assert not any(_cached(expired[0])) and all(_cached(expired[2]))
+    with open(tmp_path / "purge.json") as f:
+        assert json.load(f)["users"] == 2
+
+    resumed = _purger(tmp_path)
+    assert resumed.cutoff == first.cutoff
+    result = resumed.run()
+    assert result["users"] == 3
+    assert result["rows"] == {**dict.fromkeys(TABLES, 3), "user_app_usage": 9}
+    assert set(_row_counts(shard, expired).values()) == {0}
+    assert not any(any(_cached(user_id)) for user_id in expired)
+    assert not (tmp_path / "purge.json").exists()
+
+    # 保留期内的注销用户与正常用户不受影响
+    assert _row_counts(shard, kept) == kept_rows
+    assert all(all(_cached(user_id)) for user_id in kept)
+
+
+def test_dry_run_counts_without_deleting(shard, accounts, tmp_path):
+    expired, kept = accounts
+    before = _row_counts(shard, expired + kept)
+
+    result = _purger(tmp_path, dry_run=True).run()
+    assert result["dry_run"] is True
+    assert result["users"] == 3
+    assert result["rows"] == {**dict.fromkeys(TABLES, 3), "user_app_usage": 9}
+    assert _row_counts(shard, expired + kept) == before
+    assert all(all(_cached(user_id)) for user_id in expired)
+    assert not (tmp_path / "purge.json").exists()
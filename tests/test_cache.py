@@ -0,0 +1,60 @@
+"""读穿缓存：未命中回填与提前刷新不覆盖并发写入"""
+
+import pytest
+
+from app.core.cache import get_cache
+
+
+@pytest.fixture
+def cache(fake_redis, monkeypatch):
+    service = get_cache()
+    monkeypatch.setattr(service, "_should_refresh", lambda entry: False)
+    return service
+
+
+def test_miss_loads_and_fills(cache):
+    calls = []
+    assert cache.get_or_load("k:miss", lambda: calls.append(1) or {"v": 1}) == {"v": 1}
+    assert cache.get_or_load("k:miss", lambda: calls.append(1) or {"v": 2}) == {"v": 1}
+    assert len(calls) == 1
+
+
+def test_miss_does_not_overwrite_concurrent_write(cache):
+    def loader():
+        cache.set_entry("k:fill", {"v": "written"})
+        return {"v": "stale"}
+
+    assert cache.get_or_load("k:fill", loader) == {"v": "stale"}
+    assert cache.get("k:fill")["value"] == {"v": "written"}
+
+
+def test_early_refresh_replaces_unchanged_entry(cache, monkeypatch):
+    cache.set_entry("k:refresh", {"v": "old"})
+    monkeypatch.setattr(cache, "_should_refresh", lambda entry: True)
+    assert cache.get_or_load("k:refresh", lambda: {"v": "reloaded"}) == {"v": "reloaded"}
+    assert cache.get("k:refresh")["value"] == {"v": "reloaded"}
+
+
+def test_early_refresh_keeps_newer_write_through(cache, monkeypatch):
+    cache.set_entry("k:refresh", {"v": "old"})
+    monkeypatch.setattr(cache, "_should_refresh", lambda entry: True)
+
+    def loader():
+        # 重建期间其他请求写穿了新值
+        cache.set_entry("k:refresh", {"v": "written"})
+        return {"v": "stale"}
+
+    cache.get_or_load("k:refresh", loader)
+    assert cache.get("k:refresh")["value"] == {"v": "written"}
+
+
+def test_early_refresh_does_not_restore_invalidated_entry(cache, monkeypatch):
+    cache.set_entry("k:refresh", {"v": "old"})
+    monkeypatch.setattr(cache, "_should_refresh", lambda entry: True)
+
+    def loader():
+        cache.delete("k:refresh")
+        return {"v": "stale"}
+
+    cache.get_or_load("k:refresh", loader)
+    assert cache.get("k:refresh") is None
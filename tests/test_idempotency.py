@@ -0,0 +1,144 @@
+"""幂等键：重放、请求体不一致、并发重复请求、未认证请求的作用域、用户停用后不重放、存储调用不阻塞事件循环"""
+
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.security import principal_cache
+from app.main import app
+from app.models import user as user_model
+from app.services import user_service
+
+
+def _login(client):
+    response = client.post("/api/user/login", json={"device_id": f"idem-{uuid.uuid4().hex}"})
+    return response.json()["user_id"], {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+def _usage_count(user_id):
+    with SessionLocal() as db:
+        return db.query(user_model.UserAppUsage).filter(user_model.UserAppUsage.user_id == user_id).count()
+
+
+def test_retry_replays_first_response(client, fake_redis):
+    user_id, headers = _login(client)
+    headers["Idempotency-Key"] = "usage-1"
+    first = client.post("/api/user/app_usage", json={"device_type": "iOS"}, headers=headers)
+    second = client.post("/api/user/app_usage", json={"device_type": "iOS"}, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json() == first.json()
+    assert _usage_count(user_id) == 1
+
+    mismatch = client.post("/api/user/app_usage", json={"device_type": "Web"}, headers=headers)
+    assert mismatch.status_code == 422
+
+
+def _post_concurrently(headers, count=2):
+    """同时发起多个相同的写请求（后发的请求在首个请求执行期间到达）"""
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            async def post(delay):
+                await asyncio.sleep(delay)
+                return await http.post("/api/user/app_usage", json={"device_type": "iOS"}, headers=headers)
+
+            return await asyncio.gather(*(post(0.1 * i) for i in range(count)))
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def slow_usage(monkeypatch):
+    record = user_service.record_app_usage
+
+    def slow_record(*args, **kwargs):
+        time.sleep(0.4)
+        return record(*args, **kwargs)
+
+    monkeypatch.setattr(user_service, "record_app_usage", slow_record)
+
+
+def test_concurrent_duplicate_waits_for_first_response(client, fake_redis, slow_usage):
+    user_id, headers = _login(client)
+    headers["Idempotency-Key"] = "usage-concurrent"
+    responses = _post_concurrently(headers)
+    assert [response.status_code for response in responses] == [200, 200]
+    # 后到的请求等待首个请求完成后重放其响应（到达顺序由调度决定）
+    assert sorted(response.headers.get("idempotent-replayed", "") for response in responses) == ["", "true"]
+    assert responses[0].json() == responses[1].json()
+    assert _usage_count(user_id) == 1
+
+
+def test_concurrent_duplicate_times_out_as_in_progress(client, fake_redis, slow_usage, monkeypatch):
+    monkeypatch.setattr(settings, "idempotency_wait_seconds", 0.1)
+    user_id, headers = _login(client)
+    headers["Idempotency-Key"] = "usage-in-progress"
+    responses = sorted(_post_concurrently(headers), key=lambda response: response.status_code)
+    assert [response.status_code for response in responses] == [200, 409]
+    assert "retry-after" in responses[1].headers
+    assert _usage_count(user_id) == 1
+
+
+def test_anonymous_clients_do_not_share_keys(client, fake_redis):
+    headers = {"Idempotency-Key": "login-1"}
+    first = client.post("/api/user/login", json={"device_id": f"idem-{uuid.uuid4().hex}"}, headers=headers)
+    other = client.post("/api/user/login", json={"device_id": f"idem-{uuid.uuid4().hex}"}, headers=headers)
+    assert first.status_code == other.status_code == 200
+    assert "idempotent-replayed" not in other.headers
+    assert other.json()["user_id"] != first.json()["user_id"]
+
+
+def test_no_replay_for_frozen_user(client, fake_redis):
+    user_id, headers = _login(client)
+    headers["Idempotency-Key"] = "usage-1"
+    assert client.post("/api/user/app_usage", json={"device_type": "iOS"}, headers=headers).status_code == 200
+
+    with SessionLocal() as db:
+        db.query(user_model.UserCore).filter(user_model.UserCore.user_id == user_id).update(
+            {"status": user_model.UserStatus.FROZEN}
+        )
+        db.commit()
+    principal_cache.invalidate(user_id)
+
+    retry = client.post("/api/user/app_usage", json={"device_type": "iOS"}, headers=headers)
+    assert retry.status_code == 401
+    assert "idempotent-replayed" not in retry.headers
+
+
+def test_store_calls_do_not_block_event_loop(client, fake_redis, monkeypatch):
+    _, headers = _login(client)
+    headers["Idempotency-Key"] = "usage-slow"
+    get = fake_redis.get
+
+    def slow_get(key):
+        if key.startswith("idem:"):
+            time.sleep(0.5)
+        return get(key)
+
+    monkeypatch.setattr(fake_redis, "get", slow_get)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            start = time.perf_counter()
+
+            async def timed_live():
+                # 写请求进入存储调用后再发起
+                await asyncio.sleep(0.05)
+                response = await http.get("/api/live")
+                return response, time.perf_counter() - start
+
+            write, (live, live_seconds) = await asyncio.gather(
+                http.post("/api/user/app_usage", json={"device_type": "iOS"}, headers=headers),
+                timed_live()
+            )
+        return write, live, live_seconds
+
+    write, live, live_seconds = asyncio.run(scenario())
+    assert write.status_code == 200
+    assert live.status_code == 200
+    assert live_seconds < 0.3
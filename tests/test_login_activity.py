@@ -0,0 +1,141 @@
+"""登录后置操作：批量写入、定时与满额触发、关闭时刷新，登录不清理用户缓存"""
+
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.core.cache import get_cache, user_cache_key
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import user as user_model
+from app.services import login_activity
+from app.services.login_activity import LoginActivityBuffer
+
+OLD_LOGIN = datetime(2000, 1, 1)
+
+
+@pytest.fixture
+def users(client):
+    """新建若干用户并将最后登录时间重置为很早的时间"""
+    user_ids = []
+    for _ in range(3):
+        response = client.post("/api/user/login", json={"device_id": f"flush-{uuid.uuid4().hex}"})
+        user_ids.append(response.json()["user_id"])
+    login_activity.get_login_activity().flush()
+    with SessionLocal() as db:
+        db.query(user_model.UserCore).filter(user_model.UserCore.user_id.in_(user_ids)).update(
+            {"last_login_time": OLD_LOGIN}, synchronize_session=False
+        )
+        db.commit()
+    return user_ids
+
+
+@pytest.fixture
+def buffer():
+    activity = LoginActivityBuffer()
+    yield activity
+    activity.stop(timeout=1)
+
+
+def _record(activity, user_ids):
+    with SessionLocal() as db:
+        for user_id in user_ids:
+            activity.record(db, user_id)
+
+
+def _last_logins(user_ids):
+    with SessionLocal() as db:
+        return [
+            row.last_login_time for row in db.query(user_model.UserCore.last_login_time)
+            .filter(user_model.UserCore.user_id.in_(user_ids))
+        ]
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_flush_writes_in_batches_and_keeps_user_cache(users, buffer, fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "login_flush_interval_seconds", 60)
+    monkeypatch.setattr(settings, "login_flush_batch_size", 2)
+    calls = []
+    write = login_activity._write_last_login
+    monkeypatch.setattr(
+        login_activity, "_write_last_login",
+        lambda db_engine, updates: calls.append(dict(updates)) or write(db_engine, updates)
+    )
+    profile_key = user_cache_key(users[0], "default", "profile")
+    get_cache().set(profile_key, {"nickname": "cached"})
+
+    _record(buffer, users)
+    _record(buffer, users[:1])
+    assert buffer.pending_count() == len(users)
+    assert buffer.flush() == len(users)
+
+    # 同一用户合并为一条，全部用户在一次事务中写入
+    assert len(calls) == 1 and sorted(calls[0]) == sorted(users)
+    assert all(login_time > OLD_LOGIN for login_time in _last_logins(users))
+    assert buffer.pending_count() == 0
+    assert get_cache().get(profile_key) == {"nickname": "cached"}
+
+
+def test_flush_runs_on_interval(users, buffer, monkeypatch):
+    monkeypatch.setattr(settings, "login_flush_interval_seconds", 0.05)
+    _record(buffer, users)
+    assert _wait_until(lambda: all(login_time > OLD_LOGIN for login_time in _last_logins(users)))
+    assert buffer.pending_count() == 0
+
+
+def test_flush_runs_when_buffer_is_full(users, buffer, monkeypatch):
+    monkeypatch.setattr(settings, "login_flush_interval_seconds", 60)
+    monkeypatch.setattr(settings, "login_buffer_max_users", 2)
+    _record(buffer, users[:1])
+    time.sleep(0.1)
+    assert buffer.pending_count() == 1
+
+    _record(buffer, users[1:2])
+    assert _wait_until(lambda: buffer.pending_count() == 0)
+    assert all(login_time > OLD_LOGIN for login_time in _last_logins(users[:2]))
+
+
+def test_stop_drains_pending_updates(users, buffer, monkeypatch):
+    monkeypatch.setattr(settings, "login_flush_interval_seconds", 60)
+    _record(buffer, users)
+    assert all(login_time == OLD_LOGIN for login_time in _last_logins(users))
+
+    buffer.stop(timeout=1)
+    assert all(login_time > OLD_LOGIN for login_time in _last_logins(users))
+    assert buffer.pending_count() == 0
+    assert buffer._thread is None
+
+
+def test_failed_flush_is_retried(users, buffer, monkeypatch):
+    monkeypatch.setattr(settings, "login_flush_interval_seconds", 60)
+    write = login_activity._write_last_login
+
+    def fail(db_engine, updates):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(login_activity, "_write_last_login", fail)
+    _record(buffer, users)
+    assert buffer.flush() == 0
+    assert buffer.pending_count() == len(users)
+
+    monkeypatch.setattr(login_activity, "_write_last_login", write)
+    assert buffer.flush() == len(users)
+    assert all(login_time > OLD_LOGIN for login_time in _last_logins(users))
+
+
+def test_restart_after_stop_waits_for_interval(users, buffer, monkeypatch):
+    monkeypatch.setattr(settings, "login_flush_interval_seconds", 60)
+    buffer.stop(timeout=1)
+    _record(buffer, users[:1])
+    time.sleep(0.1)
+    assert buffer.pending_count() == 1
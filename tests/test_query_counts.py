@@ -0,0 +1,54 @@
+"""登录接口的SQL语句数上限（防止引入N+1查询或多余的往返）"""
+
+import uuid
+
+import pytest
+
+from app.core.config import settings
+from app.core.query_stats import assert_max_queries
+from app.services.login_activity import get_login_activity
+
+
+@pytest.fixture(autouse=True)
+def no_background_flush(monkeypatch):
+    """assert_max_queries 统计所有线程的语句，测试期间暂停最后登录时间的后台写入"""
+    activity = get_login_activity()
+    monkeypatch.setattr(settings, "login_flush_interval_seconds", 60)
+    activity.stop()
+    yield
+    activity.stop()
+
+
+def test_device_login_register(client):
+    device_id = f"qc-{uuid.uuid4().hex}"
+    # 查询设备 + 同一事务写入用户与资料（含提交后的刷新）
+    with assert_max_queries(5):
+        response = client.post("/api/user/login", json={"device_id": device_id})
+    assert response.status_code == 200
+
+
+def test_device_login_existing(client):
+    device_id = f"qc-{uuid.uuid4().hex}"
+    client.post("/api/user/login", json={"device_id": device_id})
+    # 用户与资料一次查询带出，最后登录时间在后台批量更新
+    with assert_max_queries(1):
+        response = client.post("/api/user/login", json={"device_id": device_id})
+    assert response.status_code == 200
+
+
+def test_provider_login_register(client, stub_provider):
+    credentials = {"openid": uuid.uuid4().hex}
+    # 查询身份 + 同一事务写入用户、身份与资料（含提交后的刷新）
+    with assert_max_queries(6):
+        response = client.post("/api/user/auth", json={"provider": "wechat", "credentials": credentials})
+    assert response.status_code == 200
+
+
+def test_provider_login_existing(client, stub_provider):
+    credentials = {"openid": uuid.uuid4().hex}
+    first = client.post("/api/user/auth", json={"provider": "wechat", "credentials": credentials})
+    # 按登录身份一次查询带出用户与资料
+    with assert_max_queries(1):
+        response = client.post("/api/user/auth", json={"provider": "wechat", "credentials": credentials})
+    assert response.status_code == 200
+    assert response.json()["user_id"] == first.json()["user_id"]
@@ -0,0 +1,115 @@
+"""只读副本路由：get_read_db 的副本选择、写后读主库与延迟回退"""
+
+import uuid
+
+import pytest
+from starlette.requests import Request
+
+from app.api import health
+from app.core import database
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.models import user as user_model
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch, fake_redis):
+    """以独立的SQLite文件作为只读副本"""
+    replica_engine = database._create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    user_model.Base.metadata.create_all(bind=replica_engine)
+    router = database.ReplicaRouter([replica_engine])
+    monkeypatch.setattr(database, "replica_router", router)
+    monkeypatch.setattr(database, "_recent_writes", {})
+    yield router
+    replica_engine.dispose()
+
+
+def _request(user_id=None, tenant_id="default"):
+    headers = []
+    if user_id is not None:
+        token = create_access_token({"sub": user_id, "tenant_id": tenant_id})
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return Request({"type": "http", "headers": headers})
+
+
+def _read_bind(request):
+    sessions = database.get_read_db(request)
+    db = next(sessions)
+    try:
+        return db.get_bind()
+    finally:
+        sessions.close()
+
+
+def test_reads_go_to_replica(replica):
+    assert _read_bind(_request(str(uuid.uuid4()))) is replica.engines[0]
+    assert _read_bind(_request()) is replica.engines[0]
+
+
+def test_replica_does_not_see_primary_rows(replica):
+    user_id = str(uuid.uuid4())
+    with database.SessionLocal() as db:
+        db.add(user_model.UserCore(user_id=user_id, device_id=f"rr-{user_id}"))
+        db.commit()
+    sessions = database.get_read_db(_request(user_id))
+    db = next(sessions)
+    try:
+        assert db.get(user_model.UserCore, user_id) is None
+    finally:
+        sessions.close()
+
+
+def test_recent_write_sticks_to_primary(replica, fake_redis):
+    user_id = str(uuid.uuid4())
+    database.mark_primary_write(user_id)
+    assert _read_bind(_request(user_id)) is database.engine
+    # 其他用户不受影响
+    assert _read_bind(_request(str(uuid.uuid4()))) is replica.engines[0]
+
+
+def test_recent_write_shared_through_redis(replica, fake_redis):
+    user_id = str(uuid.uuid4())
+    database.mark_primary_write(user_id)
+    # 其他进程：本地没有记录，从Redis得知刚写入
+    database._recent_writes.clear()
+    assert _read_bind(_request(user_id)) is database.engine
+    fake_redis.data.clear()
+    assert _read_bind(_request(user_id)) is replica.engines[0]
+
+
+def test_recent_write_unknown_without_redis(replica, monkeypatch):
+    monkeypatch.setattr(database.get_cache(), "redis_client", None)
+    # 无法确认是否刚写入时保守地读主库
+    assert _read_bind(_request(str(uuid.uuid4()))) is database.engine
+
+
+def test_lagging_replica_falls_back_to_primary(replica, monkeypatch):
+    monkeypatch.setattr(replica, "_measure_lag", lambda engine: settings.replica_max_lag_seconds + 1)
+    assert _read_bind(_request(str(uuid.uuid4()))) is database.engine
+
+
+def test_unavailable_replica_falls_back_to_primary(replica, monkeypatch):
+    monkeypatch.setattr(replica, "_measure_lag", lambda engine: None)
+    assert _read_bind(_request(str(uuid.uuid4()))) is database.engine
+    assert replica.status()[0]["lag_seconds"] is None
+
+
+def test_lag_rechecked_after_interval(replica, monkeypatch):
+    lags = iter([settings.replica_max_lag_seconds + 1, 0.0])
+    monkeypatch.setattr(replica, "_measure_lag", lambda engine: next(lags))
+    assert _read_bind(_request()) is database.engine
+    # 检查间隔内沿用上次的测量结果
+    assert _read_bind(_request()) is database.engine
+    monkeypatch.setattr(settings, "replica_lag_check_interval", 0)
+    assert _read_bind(_request()) is replica.engines[0]
+
+
+def test_health_checks_primary_and_reports_replicas(client, replica, monkeypatch):
+    monkeypatch.setattr(health, "replica_router", replica)
+    monkeypatch.setattr(replica, "_measure_lag", lambda engine: None)
+    response = client.get("/api/health")
+    assert response.status_code == 200
+    checks = response.json()["checks"]
+    assert checks["database"]["status"] == "healthy"
+    assert checks["replicas"]["status"] == "degraded"
+    assert response.json()["status"] == "degraded"
@@ -0,0 +1,55 @@
+"""响应缓存中间件：按密钥鉴权的接口与当前用户信息不缓存"""
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.middleware import CacheMiddleware
+from app.main import app
+from app.services import analytics
+
+ADMIN_HEADERS = {"X-Admin-Key": "admin-secret"}
+
+
+@pytest.fixture
+def cached_client(client, fake_redis, monkeypatch):
+    """生产环境的中间件顺序：响应缓存位于最外层（建表由client夹具完成）"""
+    monkeypatch.setattr(settings, "admin_api_key", ADMIN_HEADERS["X-Admin-Key"])
+    return TestClient(CacheMiddleware(app))
+
+
+@pytest.mark.parametrize("path", ["/api/admin/tenants", "/api/admin/users?tenant_id=default"])
+def test_admin_response_not_served_without_key(cached_client, path):
+    assert cached_client.get(path, headers=ADMIN_HEADERS).status_code == 200
+    response = cached_client.get(path)
+    assert response.status_code == 403
+    assert "x-cache" not in response.headers
+
+
+def test_analytics_response_not_served_without_key(cached_client, monkeypatch):
+    monkeypatch.setattr(analytics, "summary", lambda tenant_id, day, providers: {
+        "tenant_id": tenant_id, "date": day, "dau": 1, "wau": 1, "mau": 1,
+        "logins": {"wechat": 1}, "registrations": {"wechat": 1},
+    })
+    path = "/api/analytics/summary?tenant_id=default"
+    assert cached_client.get(path, headers=ADMIN_HEADERS).status_code == 200
+    response = cached_client.get(path)
+    assert response.status_code == 403
+    assert "x-cache" not in response.headers
+
+
+def test_me_reflects_profile_update(cached_client):
+    login = cached_client.post("/api/user/login", json={"device_id": f"cache-{uuid.uuid4().hex}"})
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+    before = cached_client.get("/api/user/me?fields=profile", headers=headers)
+    assert before.status_code == 200
+
+    profile = dict(before.json()["profile"], nickname="renamed")
+    assert cached_client.put("/api/user/profile", json=profile, headers=headers).status_code == 200
+
+    after = cached_client.get("/api/user/me?fields=profile", headers=headers)
+    assert after.status_code == 200
+    assert after.json()["profile"]["nickname"] == "renamed"
+    assert "x-cache" not in after.headers
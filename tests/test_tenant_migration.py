@@ -0,0 +1,144 @@
+"""租户分片迁移：在两个临时SQLite分片之间复制、切换并清理租户数据"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import database
+from app.core.config import settings
+from app.core.sharding import DEFAULT_SHARD, shard_router
+from app.models import user as user_model
+from app.services import tenant_migration
+from app.services.tenant_migration import TENANT_TABLES, TenantMover
+
+TENANT = "acme"
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch, fake_redis):
+    """源分片（default）与目标分片（shard2）各为一个临时SQLite文件"""
+    engines = {
+        DEFAULT_SHARD: database._create_engine(f"sqlite:///{tmp_path / 'source.db'}"),
+        "shard2": database._create_engine(f"sqlite:///{tmp_path / 'target.db'}"),
+    }
+    for shard_engine in engines.values():
+        user_model.Base.metadata.create_all(bind=shard_engine)
+    monkeypatch.setattr(shard_router, "engines", engines)
+    monkeypatch.setattr(shard_router, "sessions", {name: sessionmaker(bind=e) for name, e in engines.items()})
+    monkeypatch.setattr(shard_router, "_dynamic_map", {})
+    monkeypatch.setattr(settings, "shard_map_refresh_seconds", 0)
+    monkeypatch.setattr(tenant_migration.time, "sleep", lambda seconds: None)
+    yield engines
+    for shard_engine in engines.values():
+        shard_engine.dispose()
+
+
+def _add_user(db: Session, tenant_id: str, sessions: int = 2) -> user_model.UserCore:
+    user = user_model.UserCore(tenant_id=tenant_id, device_id=f"dev-{tenant_id}", email=None)
+    db.add(user)
+    db.flush()
+    db.add(user_model.UserProfile(user_id=user.user_id, tenant_id=tenant_id))
+    db.add(user_model.UserIdentity(
+        tenant_id=tenant_id, provider="device_id", provider_user_id=f"dev-{user.user_id}", user_id=user.user_id
+    ))
+    for _ in range(sessions):
+        db.add(user_model.UserAppUsage(
+            user_id=user.user_id, tenant_id=tenant_id, device_type=user_model.DeviceType.IOS
+        ))
+    return user
+
+
+def _seed(source) -> None:
+    with Session(source) as db:
+        for _ in range(3):
+            _add_user(db, TENANT)
+        _add_user(db, "other")
+        db.commit()
+
+
+def _tenant_rows(db_engine, tenant_id=TENANT):
+    rows = {}
+    with db_engine.connect() as conn:
+        for table_name, pk in TENANT_TABLES:
+            table = user_model.Base.metadata.tables[table_name]
+            rows[table_name] = [
+                dict(row._mapping)
+                for row in conn.execute(select(table).where(table.c.tenant_id == tenant_id).order_by(table.c[pk]))
+            ]
+    return rows
+
+
+def _write_during_copy(source) -> None:
+    """复制期间源库上的写入：修改状态与邮箱、客户端上报的旧会话、新用户、删除行"""
+    with Session(source) as db:
+        users = db.scalars(select(user_model.UserCore).where(user_model.UserCore.tenant_id == TENANT)).all()
+        users[0].status = user_model.UserStatus.FROZEN
+        users[1].email = "changed@example.com"
+        db.add(user_model.UserAppUsage(
+            user_id=users[1].user_id, tenant_id=TENANT, device_type=user_model.DeviceType.WEB,
+            session_start_time=datetime.utcnow() - timedelta(days=30)
+        ))
+        _add_user(db, TENANT, sessions=1)
+        for row in db.scalars(select(user_model.UserAppUsage).where(user_model.UserAppUsage.user_id == users[2].user_id)):
+            db.delete(row)
+        db.delete(db.scalars(select(user_model.UserIdentity).where(user_model.UserIdentity.user_id == users[2].user_id)).one())
+        db.commit()
+
+
+def test_move_tenant_with_writes_during_copy(shards, tmp_path, monkeypatch):
+    source, target = shards[DEFAULT_SHARD], shards["shard2"]
+    _seed(source)
+    mover = TenantMover(TENANT, "shard2", chunk_size=2, checkpoint_path=str(tmp_path / "move.json"))
+
+    copy_rows = mover._copy_rows
+    calls = []
+
+    def copy_then_write(table_name, pk, rows):
+        copy_rows(table_name, pk, rows)
+        calls.append(table_name)
+        # 所有表都已复制了一部分后写入
+        if table_name == "user_app_usage" and calls.count(table_name) == 1:
+            _write_during_copy(source)
+
+    monkeypatch.setattr(mover, "_copy_rows", copy_then_write)
+    checkpoint = mover.run()
+
+    assert checkpoint["phase"] == "cleanup"
+    assert shard_router.shard_for_tenant(TENANT) == "shard2"
+    source_rows = _tenant_rows(source)
+    assert _tenant_rows(target) == source_rows
+    assert len(source_rows["user_core"]) == 4
+    assert sum(row["status"] == user_model.UserStatus.FROZEN for row in source_rows["user_core"]) == 1
+    assert _tenant_rows(target, "other") == {table_name: [] for table_name, _ in TENANT_TABLES}
+
+    # 清理源分片，只删除被迁移的租户
+    assert mover.run(delete_source=True)["phase"] == "done"
+    assert _tenant_rows(source) == {table_name: [] for table_name, _ in TENANT_TABLES}
+    assert len(_tenant_rows(source, "other")["user_core"]) == 1
+    assert _tenant_rows(target) == source_rows
+
+
+def test_failed_cutover_restores_mapping_and_delta(shards, tmp_path, monkeypatch):
+    source = shards[DEFAULT_SHARD]
+    _seed(source)
+    checkpoint_path = str(tmp_path / "move.json")
+    mover = TenantMover(TENANT, "shard2", chunk_size=2, checkpoint_path=checkpoint_path)
+    mover.copy()
+
+    count = mover._count
+    monkeypatch.setattr(mover, "_count", lambda db_engine, table_name: count(db_engine, table_name) + (db_engine is source))
+    with pytest.raises(RuntimeError, match="Row count mismatch"):
+        mover.cutover()
+    assert shard_router.shard_for_tenant(TENANT) == DEFAULT_SHARD
+    assert not [key for key in mover.checkpoint["tables"] if ":" in key]
+
+    # 租户恢复写入后重新执行cutover，从头比对
+    _write_during_copy(source)
+    resumed = TenantMover(TENANT, "shard2", chunk_size=2, checkpoint_path=checkpoint_path)
+    assert resumed.checkpoint["phase"] == "cutover"
+    assert not [key for key in resumed.checkpoint["tables"] if ":" in key]
+    resumed.run()
+    assert shard_router.shard_for_tenant(TENANT) == "shard2"
+    assert _tenant_rows(shards["shard2"]) == _tenant_rows(source)
@@ -0,0 +1,63 @@
+"""租户用户数配额：登记时的统计与注册失败时归还名额"""
+
+import uuid
+
+from sqlalchemy import func
+
+from app.core.database import SessionLocal
+from app.models import user as user_model
+from app.services import tenant_service
+
+
+def _register(client, tenant_id):
+    return client.post("/api/user/login", json={"device_id": f"dev-{uuid.uuid4().hex}", "tenant_id": tenant_id})
+
+
+def _user_count(tenant_id):
+    with SessionLocal() as db:
+        return tenant_service.get_tenant(db, tenant_id).user_count
+
+
+def test_register_counts_existing_users_after_commit(client, monkeypatch):
+    tenant_id = f"t-{uuid.uuid4().hex[:8]}"
+    for _ in range(2):
+        assert _register(client, tenant_id).status_code == 200
+
+    count = tenant_service._count_existing_users
+
+    def count_after_commit(counted_tenant):
+        # 统计时租户登记已提交，其他会话可见
+        with SessionLocal() as db:
+            assert tenant_service.get_tenant(db, counted_tenant) is not None
+        return count(counted_tenant)
+
+    monkeypatch.setattr(tenant_service, "_count_existing_users", count_after_commit)
+    with SessionLocal() as db:
+        tenant_service.save_tenant(db, tenant_id, user_model.TenantSettings(max_users=3))
+    assert _user_count(tenant_id) == 2
+
+    assert _register(client, tenant_id).status_code == 200
+    assert _user_count(tenant_id) == 3
+    assert _register(client, tenant_id).status_code == 403
+
+
+def test_failed_registration_releases_slot(client, monkeypatch):
+    tenant_id = f"t-{uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        tenant_service.save_tenant(db, tenant_id, user_model.TenantSettings(max_users=1))
+
+    def failing_profile(**kwargs):
+        raise RuntimeError("profile insert failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(user_model, "UserProfile", failing_profile)
+        assert _register(client, tenant_id).status_code == 500
+
+    # 用户未写入，名额已归还
+    assert _user_count(tenant_id) == 0
+    with SessionLocal() as db:
+        assert db.query(func.count(user_model.UserCore.user_id)).filter(
+            user_model.UserCore.tenant_id == tenant_id
+        ).scalar() == 0
+    assert _register(client, tenant_id).status_code == 200
+    assert _user_count(tenant_id) == 1
@@ -0,0 +1,112 @@
+"""App使用记录归档：写入gzip NDJSON、校验后删除源数据，以及归档读取接口"""
+
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core import database
+from app.core.config import settings
+from app.core.sharding import DEFAULT_SHARD, shard_router
+from app.models import user as user_model
+from app.services.usage_archive import UsageArchiver
+
+TODAY = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+DAY_A = TODAY - timedelta(days=200)
+DAY_B = TODAY - timedelta(days=190)
+ADMIN_HEADERS = {"X-Admin-Key": "admin-secret"}
+
+
+@pytest.fixture
+def shard(tmp_path, monkeypatch):
+    """归档任务只处理一个临时SQLite分片"""
+    engine = database._create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    user_model.Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(shard_router, "engines", {DEFAULT_SHARD: engine})
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sessions(shard):
+    """acme：第A天2条、第B天1条、今天1条；other：第A天1条。返回 {会话: (租户, 用户, 开始时间)}"""
+    seeded = {}
+    with Session(shard) as db:
+        for tenant_id, starts in (("acme", [DAY_A, DAY_A + timedelta(hours=1), DAY_B, TODAY]), ("other", [DAY_A])):
+            user = user_model.UserCore(tenant_id=tenant_id)
+            db.add(user)
+            db.flush()
+            for start in starts:
+                usage = user_model.UserAppUsage(
+                    user_id=user.user_id, tenant_id=tenant_id, device_type=user_model.DeviceType.IOS,
+                    session_start_time=start
+                )
+                db.add(usage)
+                db.flush()
+                seeded[usage.session_id] = (tenant_id, user.user_id, start)
+        db.commit()
+    return seeded
+
+
+def _remaining(shard):
+    table = user_model.Base.metadata.tables["user_app_usage"]
+    with shard.connect() as conn:
+        return set(conn.execute(select(table.c.session_id)).scalars())
+
+
+def _archiver(archive_dir):
+    return UsageArchiver(archive_dir=str(archive_dir), after_days=180, batch_size=2, pause_seconds=0)
+
+
+def test_archive_writes_verified_files_and_deletes_rows(shard, sessions, tmp_path):
+    archive_dir = tmp_path / "archive"
+    summary = _archiver(archive_dir).run()
+    assert summary["shards"][DEFAULT_SHARD] == {"days": 2, "files": 3, "rows": 4}
+
+    partition = archive_dir / "tenant=acme" / f"date={DAY_A.date().isoformat()}"
+    [manifest_path] = partition.glob("part-*.json")
+    manifest = json.loads(manifest_path.read_text())
+    with gzip.open(partition / manifest["file"], "rb") as f:
+        lines = f.readlines()
+    records = [json.loads(line) for line in lines]
+    assert manifest["rows"] == len(records) == 2
+    assert manifest["state"] == "deleted" and manifest["deleted"] == 2
+    assert manifest["sha256"] == hashlib.sha256(b"".join(lines)).hexdigest()
+    expected = {session_id for session_id, (tenant_id, _, start) in sessions.items()
+                if tenant_id == "acme" and start.date() == DAY_A.date()}
+    assert {record["session_id"] for record in records} == expected
+    assert all(record["tenant_id"] == "acme" for record in records)
+
+    # 只删除已归档的旧会话
+    recent = {session_id for session_id, (_, _, start) in sessions.items() if start == TODAY}
+    assert _remaining(shard) == recent
+
+    # 再次执行没有可归档的行
+    assert _archiver(archive_dir).run()["shards"][DEFAULT_SHARD]["rows"] == 0
+
+
+def test_archived_sessions_endpoint(client, shard, sessions, tmp_path, monkeypatch):
+    archive_dir = tmp_path / "archive"
+    _archiver(archive_dir).run()
+    monkeypatch.setattr(settings, "app_usage_archive_dir", str(archive_dir))
+    monkeypatch.setattr(settings, "admin_api_key", ADMIN_HEADERS["X-Admin-Key"])
+
+    def read(**params):
+        response = client.get("/api/admin/app_usage/archive", params=params, headers=ADMIN_HEADERS)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    assert len(read(tenant_id="acme")) == 3
+    day_b = DAY_B.date().isoformat()
+    assert [record["session_id"] for record in read(tenant_id="acme", start=day_b, end=day_b)] == [
+        session_id for session_id, (_, _, start) in sessions.items() if start == DAY_B
+    ]
+    other_user = next(user_id for tenant_id, user_id, _ in sessions.values() if tenant_id == "other")
+    assert len(read(tenant_id="other", user_id=other_user)) == 1
+    assert read(tenant_id="acme", user_id=other_user) == []
+    assert client.get("/api/admin/app_usage/archive", params={"tenant_id": "acme"}).status_code == 403
@@ -0,0 +1,64 @@
+"""令牌校验套接字：多worker绑定与遗留套接字文件处理"""
+
+import asyncio
+import os
+import socket
+import uuid
+
+from app.core.security import create_access_token
+from app.core.verify_socket import VerifySocketServer, encode_frame, read_frame
+
+
+async def _verify(path, token):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(encode_frame({"id": 1, "token": token}))
+    await writer.drain()
+    response = await read_frame(reader, 65536)
+    writer.close()
+    return response
+
+
+def test_only_one_worker_binds(client, tmp_path):
+    path = str(tmp_path / "verify.sock")
+    user_id = client.post("/api/user/login", json={"device_id": f"vs-{uuid.uuid4().hex}"}).json()["user_id"]
+    token = create_access_token({"sub": user_id, "tenant_id": "default"})
+
+    async def scenario():
+        first, second = VerifySocketServer(), VerifySocketServer()
+        await first.start(path)
+        await second.start(path)
+        assert first._server is not None
+        assert second._server is None
+        assert (await _verify(path, token))["principal"]["user_id"] == user_id
+
+        # 未持锁的worker停止时不删除他人的套接字文件
+        await second.stop()
+        assert os.path.exists(path)
+        assert (await _verify(path, "not-a-token"))["error"] == "invalid_token"
+
+        # 持锁的worker退出后，其他worker可以接管
+        await first.stop()
+        assert not os.path.exists(path)
+        await second.start(path)
+        assert second._server is not None
+        assert (await _verify(path, token))["ok"] is True
+        await second.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stale_socket_file_is_replaced(tmp_path):
+    path = str(tmp_path / "verify.sock")
+    # 上次异常退出遗留的套接字文件（无进程监听）
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+
+    async def scenario():
+        server = VerifySocketServer()
+        await server.start(path)
+        assert server._server is not None
+        assert (await _verify(path, "not-a-token"))["error"] == "invalid_token"
+        await server.stop()
+
+    asyncio.run(scenario())